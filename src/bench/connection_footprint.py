@@ -0,0 +1,106 @@
+"""
+Per-connection memory footprint of AlarmHost.
+
+Opens N idle node connections from a child process, waits until the host
+has registered all of them, and reports the host process's resident memory
+and Python heap growth per connection, the size of one registry record, and
+how long a quorum count over the registry takes.
+
+Run from src/:  python -m bench.connection_footprint --nodes 10000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+import tracemalloc
+from common.comms.host_server import AlarmHost
+from common.comms.protocol import AlarmEvent, EventType
+from common.comms.registry import Connection
+from common.log import configure_logging
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def run_nodes(port, count, ready, done):
+    """Child process: hold `count` idle connections open until told to stop"""
+    async def main():
+        writers = []
+        for i in range(count):
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            hello = AlarmEvent(EventType.HEARTBEAT, {"node_id": f"node-{i}"})
+            writer.write(hello.to_frame())
+            writers.append(writer)
+            if i % 500 == 0:
+                await writer.drain()
+        ready.set()
+        while not done.is_set():
+            await asyncio.sleep(0.2)
+        for writer in writers:
+            writer.close()
+    asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--nodes", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=5931)
+    args = parser.parse_args()
+    configure_logging(level="ERROR")
+
+    host = AlarmHost(port=args.port, backlog=4096, accept_rate=1e6, accept_burst=args.nodes)
+    host.running = True
+    host.start_server()
+    time.sleep(0.2)
+
+    tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0]
+    rss_before = rss_bytes()
+
+    ready, done = multiprocessing.Event(), multiprocessing.Event()
+    child = multiprocessing.Process(target=run_nodes, args=(args.port, args.nodes, ready, done))
+    child.start()
+    deadline = time.time() + 300
+    while len(host.registry) < args.nodes and time.time() < deadline:
+        time.sleep(0.1)
+    time.sleep(1)  # Let the receive loops read their hellos
+
+    connected = len(host.registry)
+    heap_per_conn = (tracemalloc.get_traced_memory()[0] - heap_before) / connected
+    rss_per_conn = (rss_bytes() - rss_before) / connected
+    tracemalloc.stop()
+
+    samples = []
+    for _ in range(200):
+        start = time.perf_counter()
+        host.get_connected_nodes_count()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+
+    record = next(iter(host.registry.snapshot().values()))
+    as_dict = {slot: getattr(record, slot) for slot in Connection.__slots__}
+
+    done.set()
+    child.join()
+    host.running = False
+
+    print(json.dumps({
+        "connections": connected,
+        "rss_bytes_per_connection": round(rss_per_conn),
+        "python_heap_bytes_per_connection": round(heap_per_conn),
+        "record_bytes": sys.getsizeof(record),
+        "record_bytes_as_dict": sys.getsizeof(as_dict),
+        "receive_buffer_bytes": host.buffers.size,
+        "quorum_count_median_us": round(samples[len(samples) // 2] * 1e6, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
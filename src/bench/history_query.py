@@ -0,0 +1,66 @@
+"""
+Query speed of the alarm history store.
+
+Fills a fresh store with one alarm a day for the given number of years, each
+snoozed by every node and then cleared, and times the time-to-clear query
+over the last month, the last year and the whole history.
+
+Run from src/:  python -m bench.history_query --years 5 --nodes 20
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from common.clock import VirtualClock
+from common.log import configure_logging
+from host.history import CLEARED, FIRED, SNOOZED, AlarmHistory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--nodes", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    configure_logging(level="ERROR")
+
+    rng = random.Random(1)
+    start = 1_700_000_000.0
+    days = args.years * 365
+    clock = VirtualClock(start + days * 86400)
+    with tempfile.TemporaryDirectory() as directory:
+        history = AlarmHistory(directory, clock=clock)
+        began = time.perf_counter()
+        for day in range(days):
+            fired = start + day * 86400
+            history.record(FIRED, ts=fired)
+            delays = sorted(rng.expovariate(1 / 30) for _ in range(args.nodes))
+            for node, delay in enumerate(delays):
+                history.record(SNOOZED, node=f"node-{node}", ts=fired + delay)
+            history.record(CLEARED, ts=fired + delays[-1])
+        write_s = time.perf_counter() - began
+        records = sum(segment.count for segment in history.segments)
+
+        results = {}
+        for window in (30, 365, days):
+            samples = []
+            for _ in range(args.runs):
+                began = time.perf_counter()
+                summary = history.time_to_clear(days=window)
+                samples.append(time.perf_counter() - began)
+            samples.sort()
+            results[f"last_{window}_days_ms"] = round(samples[len(samples) // 2] * 1000, 2)
+        history.close()
+
+    print(json.dumps({
+        "records": records,
+        "record_bytes": records * 24,
+        "append_us": round(write_s / records * 1e6, 2),
+        "query_median": results,
+        "alarms_in_full_query": summary["alarms"],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
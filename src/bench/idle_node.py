@@ -0,0 +1,109 @@
+"""
+Wakeups and CPU time of an idle node process.
+
+Starts a host in this process on a Unix socket with an alarm set for later,
+then runs `client.app` against it with gossip off, so the node process has
+no Zeroconf or gossip threads. Once the node has said hello, it is left
+alone for the given time; the kernel's context-switch counts over all its
+threads are its wakeups. Wakeups and CPU time are scaled to an hour.
+Linux only (reads /proc).
+
+Run from src/:  python -m bench.idle_node --seconds 3600
+"""
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from common.comms.host_server import AlarmHost
+from common.comms.protocol import Alarm, EventType
+from common.comms.transport import UnixTransport
+from common.log import configure_logging
+from host.alarm_manager import AlarmManager
+
+
+def wakeups(pid) -> int:
+    """Context switches so far, summed over the process's threads"""
+    total = 0
+    for path in glob.glob(f"/proc/{pid}/task/*/status"):
+        try:
+            with open(path) as f:
+                for line in f:
+                    if line.startswith(("voluntary_ctxt_switches", "nonvoluntary_ctxt_switches")):
+                        total += int(line.split()[1])
+        except FileNotFoundError:
+            pass  # Thread exited
+    return total
+
+
+def cpu_seconds(pid) -> float:
+    """User plus system CPU time so far"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def thread_count(pid) -> int:
+    return len(os.listdir(f"/proc/{pid}/task"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seconds", type=float, default=3600,
+                        help="How long to watch the idle node (default: an hour)")
+    parser.add_argument("--settle", type=float, default=15,
+                        help="Seconds after the hello before counting starts")
+    args = parser.parse_args()
+    configure_logging(level="ERROR")
+
+    heartbeats = []
+    hello = threading.Event()
+    manager = AlarmManager(event_callback=lambda event: None)
+    manager.set_alarm(Alarm.from_24hr((time.localtime().tm_hour + 12) % 24, 0))  # Far off
+
+    def handle_event(event, addr):
+        if event.type == EventType.HEARTBEAT:
+            heartbeats.append(time.monotonic())
+            if "version" in (event.data or {}):
+                host.send_raw(addr, manager.get_sync_frame(event.data.get("epoch"), event.data["version"]))
+                hello.set()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "host.sock")
+        host = AlarmHost(transports=[UnixTransport(path)], event_handler=handle_event)
+        host.running = True
+        host.start_server()
+        node = subprocess.Popen([sys.executable, "-m", "client.app", "--host-socket", path,
+                                 "--gossip-port", "0", "--node-id", "idle-bench"],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not hello.wait(60):
+                raise RuntimeError("node never said hello")
+            time.sleep(args.settle)
+            began, wakeups_before, cpu_before = time.monotonic(), wakeups(node.pid), cpu_seconds(node.pid)
+            counted = len(heartbeats)
+            time.sleep(args.seconds)
+            elapsed = time.monotonic() - began
+            woke, cpu = wakeups(node.pid) - wakeups_before, cpu_seconds(node.pid) - cpu_before
+            results = {
+                "watched_s": round(elapsed, 1),
+                "threads": thread_count(node.pid),
+                "wakeups": woke,
+                "wakeups_per_s": round(woke / elapsed, 4),
+                "wakeups_per_hour": round(woke * 3600 / elapsed),
+                "cpu_ms_per_hour": round(cpu * 3600 / elapsed * 1000, 1),
+                "heartbeats_per_hour": round((len(heartbeats) - counted) * 3600 / elapsed, 1),
+            }
+        finally:
+            node.terminate()
+            node.wait()
+            host.stop()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
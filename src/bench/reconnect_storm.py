@@ -0,0 +1,178 @@
+"""
+Reconnect-storm benchmark for AlarmHost admission control.
+
+Simulates every node in a building reconnecting at once after a power cut and
+reports how long the host takes to admit all of them, how many connection
+attempts were deferred with RETRY_AFTER, and the peak host thread count.
+--compare also runs the storm against the accept path AlarmHost had before
+admission control: listen(5) and a new thread per accepted connection.
+
+Run from src/:  python -m bench.reconnect_storm --nodes 1000
+"""
+import argparse
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+from common.comms.host_server import AlarmHost
+from common.comms.protocol import AlarmEvent, EventType
+from common.log import configure_logging
+
+
+async def simulated_node(port, stats):
+    """Connect until admitted, honouring RETRY_AFTER like AlarmNode does"""
+    while True:
+        stats["attempts"] += 1
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        except OSError:
+            stats["refused"] += 1
+            await asyncio.sleep(random.uniform(0.5, 1.5))
+            continue
+        try:
+            line = await asyncio.wait_for(reader.readline(), timeout=30)
+        except asyncio.TimeoutError:
+            line = b""
+        event = AlarmEvent.from_json(line.decode()) if line else None
+        if event and event.type == EventType.RETRY_AFTER:
+            stats["deferred"] += 1
+            writer.close()
+            await asyncio.sleep(event.data["retry_after"] * (1 + random.uniform(0, 0.2)))
+            continue
+        if event is None:
+            writer.close()
+            continue
+        stats["admitted"] += 1
+        return writer
+
+
+async def storm(port, nodes, stats):
+    start = time.perf_counter()
+    writers = await asyncio.gather(*(simulated_node(port, stats) for _ in range(nodes)))
+    elapsed = time.perf_counter() - start
+    for writer in writers:
+        writer.close()
+    return elapsed
+
+
+class BaselineAcceptor:
+    """
+    The accept path AlarmHost had before admission control, kept here as
+    the comparison point: listen(5), and for every accepted connection a
+    receive thread plus a thread for on_node_connected.
+    """
+
+    def __init__(self, port, on_node_connected):
+        self.port = port
+        self.on_node_connected = on_node_connected
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.running = False
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("", self.port))
+        self.sock.listen(5)
+        self.running = True
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                conn, addr = self.sock.accept()
+            except OSError:
+                continue
+            with self.lock:
+                self.clients[addr] = {"conn": conn, "last_heartbeat": time.time()}
+            threading.Thread(target=self._recv_loop, args=(conn, addr), daemon=True).start()
+            threading.Thread(target=self.on_node_connected, args=(addr, conn), daemon=True).start()
+
+    def _recv_loop(self, conn, addr):
+        while self.running:
+            try:
+                if not conn.recv(4096):
+                    break
+            except OSError:
+                break
+        conn.close()
+        with self.lock:
+            self.clients.pop(addr, None)
+
+    def stop(self):
+        self.running = False
+        self.sock.close()
+
+
+def on_node_connected(addr, conn):
+    try:
+        conn.sendall((AlarmEvent(EventType.ACK, {}).to_json() + "\n").encode())
+    except OSError:
+        pass  # The node gave up waiting and closed before its thread ran
+
+
+def measure(port, nodes):
+    """Run the storm while sampling the thread count"""
+    peak_threads = [threading.active_count()]
+    done = threading.Event()
+
+    def sample_threads():
+        while not done.is_set():
+            peak_threads[0] = max(peak_threads[0], threading.active_count())
+            time.sleep(0.01)
+
+    threading.Thread(target=sample_threads, daemon=True).start()
+    stats = {"attempts": 0, "admitted": 0, "deferred": 0, "refused": 0}
+    elapsed = asyncio.run(storm(port, nodes, stats))
+    done.set()
+    return {"settle_s": round(elapsed, 2), "peak_threads": peak_threads[0], **stats}
+
+
+def run_baseline(nodes, port):
+    acceptor = BaselineAcceptor(port, on_node_connected)
+    acceptor.start()
+    try:
+        result = measure(port, nodes)
+    finally:
+        acceptor.stop()
+    return {"nodes": nodes, "path": "baseline listen(5), thread per accept", **result}
+
+
+def run(nodes, port, backlog, rate, burst):
+    host = AlarmHost(port=port, on_node_connected=on_node_connected,
+                     backlog=backlog, accept_rate=rate, accept_burst=burst)
+    host.running = True
+    host.start_server()
+    result = measure(port, nodes)
+    host.running = False
+    for listener in host.listeners:
+        try:
+            listener.close()
+        except Exception:
+            pass
+    return {"nodes": nodes, "backlog": backlog, "rate": rate, "burst": burst, **result}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=500)
+    parser.add_argument("--port", type=int, default=5901)
+    parser.add_argument("--backlog", type=int, default=128)
+    parser.add_argument("--rate", type=float, default=50.0)
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--compare", action="store_true",
+                        help="Also run against the old listen(5), thread-per-accept path")
+    args = parser.parse_args()
+    configure_logging("ERROR")
+
+    results = [run(args.nodes, args.port, args.backlog, args.rate, args.burst)]
+    if args.compare:
+        results.append(run_baseline(args.nodes, args.port + 1))
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Cold-start-to-ready benchmark for the host and node processes.
+
+Starts `host.app` and polls its /ready endpoint until it answers 200, then
+starts `client.app` against it and waits for its "Ready in" log line.
+Reports the wall time from process spawn to ready for both, plus the host's
+per-phase timings, as the median over several runs.
+
+Run from src/:  python -m bench.startup --runs 5
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+READY_URL = "http://127.0.0.1:5000/ready"
+
+
+def start_host():
+    """Returns (process, seconds to ready, /ready report)"""
+    began = time.monotonic()
+    process = subprocess.Popen([sys.executable, "-m", "host.app"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while True:
+        try:
+            with urllib.request.urlopen(READY_URL, timeout=1) as response:
+                return process, time.monotonic() - began, json.load(response)
+        except (urllib.error.URLError, ConnectionError):
+            if process.poll() is not None:
+                raise RuntimeError("host exited before becoming ready")
+            time.sleep(0.02)
+
+
+def start_node(timeout=60):
+    """Returns (process, seconds to ready)"""
+    began = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "client.app", "--node-id", "bench-node", "--gossip-port", "0"],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+        env={**os.environ, "ALARM_LOG_LEVEL": "INFO"},
+    )
+    for line in process.stdout:
+        if "Ready in" in line:
+            return process, time.monotonic() - began
+        if time.monotonic() - began > timeout:
+            break
+    process.kill()
+    raise RuntimeError("node did not become ready")
+
+
+def stop(process):
+    process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+def median(values):
+    values = sorted(values)
+    return round(values[len(values) // 2], 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    host_times, node_times, reports = [], [], []
+    for _ in range(args.runs):
+        host, host_seconds, report = start_host()
+        try:
+            node, node_seconds = start_node()
+            stop(node)
+        finally:
+            stop(host)
+        host_times.append(host_seconds)
+        node_times.append(node_seconds)
+        reports.append(report)
+        time.sleep(1)  # Let the ports free up
+
+    print(json.dumps({
+        "runs": args.runs,
+        "host_spawn_to_ready_s": median(host_times),
+        "node_spawn_to_ready_s": median(node_times),
+        "host_phases_last_run": reports[-1]["phases"],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Delivery latency of each host transport, and many in-process nodes at once.
+
+For TCP over loopback, a Unix-domain socket and the in-process transport,
+one node pings the host with heartbeats and the host answers each with an
+ACK; half the round trip is the one-way delivery latency. Then the given
+number of in-process nodes join one host and an alarm is broadcast to all.
+
+Run from src/:  python -m bench.transport_latency --pings 2000 --nodes 2000
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from common.comms.host_server import AlarmHost
+from common.comms.protocol import AlarmEvent, EventType
+from common.comms.transport import InProcTransport, TcpTransport, UnixTransport
+from common.log import configure_logging
+
+PING = AlarmEvent(EventType.HEARTBEAT, {"node_id": "bench"}).to_frame()
+
+
+def start_host(transport, **kwargs) -> AlarmHost:
+    host = AlarmHost(transports=[transport], accept_rate=1e6, accept_burst=100_000,
+                     backlog=4096, **kwargs)
+    host.running = True
+    host.start_server()
+    return host
+
+
+def read_frame(conn, pending: bytearray) -> bytes:
+    while b"\n" not in pending:
+        chunk = conn.recv(4096)
+        if not chunk:
+            raise ConnectionError("host closed the connection")
+        pending += chunk
+    end = pending.index(b"\n")
+    frame = bytes(pending[:end])
+    del pending[:end + 1]
+    return frame
+
+
+def ping(transport, pings) -> dict:
+    ack = AlarmEvent(EventType.ACK, {}).to_frame()
+    host = start_host(transport, event_handler=lambda event, addr: host.send_raw(addr, ack))
+    conn = transport.connect(("127.0.0.1", transport.port) if transport.discoverable else None,
+                             timeout=2)
+    pending = bytearray()
+    samples = []
+    for _ in range(pings):
+        began = time.perf_counter()
+        conn.sendall(PING)
+        read_frame(conn, pending)
+        samples.append(time.perf_counter() - began)
+    conn.close()
+    host.stop()
+    samples.sort()
+    return {
+        "one_way_median_us": round(samples[len(samples) // 2] / 2 * 1e6, 1),
+        "one_way_p99_us": round(samples[int(len(samples) * 0.99)] / 2 * 1e6, 1),
+    }
+
+
+def fan_out(nodes) -> dict:
+    transport = InProcTransport("bench-fan-out")
+    host = start_host(transport)
+    began = time.perf_counter()
+    conns = [transport.connect() for _ in range(nodes)]
+    while len(host.registry) < nodes:
+        time.sleep(0.01)
+    join_s = time.perf_counter() - began
+
+    arrived = []
+    lock = threading.Lock()
+    all_arrived = threading.Event()
+
+    def receive(conn):
+        read_frame(conn, bytearray())
+        with lock:
+            arrived.append(time.perf_counter())
+            if len(arrived) == nodes:
+                all_arrived.set()
+
+    for conn in conns:
+        threading.Thread(target=receive, args=(conn,), daemon=True).start()
+    sent = time.perf_counter()
+    host.broadcast(AlarmEvent(EventType.ALARM_TRIGGERED, {"alarm": "07:00"}))
+    all_arrived.wait(60)
+    arrived.sort()
+    host.stop()
+    return {
+        "nodes": nodes,
+        "join_s": round(join_s, 2),
+        "delivered": len(arrived),
+        "broadcast_to_last_ms": round((arrived[-1] - sent) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pings", type=int, default=2000)
+    parser.add_argument("--nodes", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=5911)
+    args = parser.parse_args()
+    configure_logging(level="ERROR")
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = {
+            "tcp": ping(TcpTransport(args.port), args.pings),
+            "unix": ping(UnixTransport(os.path.join(directory, "host.sock")), args.pings),
+            "inproc": ping(InProcTransport("bench-ping"), args.pings),
+        }
+    results["inproc_fan_out"] = fan_out(args.nodes)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
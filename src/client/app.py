@@ -1,136 +1,294 @@
+from common.comms.gossip import GossipPeer
 from common.comms.node_client import AlarmNode
-from common.comms.protocol import AlarmEvent, EventType, Alarm
-from common.io.button import SnoozeButton
-from common.io.led import LedController
-import time
+from common.comms.relay import AlarmRelay
+from common.comms.transport import UnixTransport
+from common.comms.protocol import DEFAULT_TENANT, AlarmEvent, EventType, Alarm
+from client.station import Station
+from common.log import configure_logging, get_logger
+from common.startup import Readiness
+from zeroconf import Zeroconf
+import argparse
+import socket
 import threading
 
+log = get_logger("NODE")
+log_app = get_logger("NODE APP")
+
 node = None
-button = None
-led = None
+relay = None
+gossip = None
+stations = []  # Buttons and LEDs served over this node's connection
+zones = []     # Zones this node rings for; empty means every zone
+node_id = socket.gethostname()
+trace_id = None  # Trace of the ringing alarm, echoed back with snoozes
+ringing = threading.Event()   # Set while an alarm rings; polled buttons only run then
+snooze_lock = threading.Lock()
+RECONNECT_INTERVAL = 1  # Seconds between attempts to reach the host while disconnected
 
-def handle_events():
-    """Handle incoming events from the host"""
+def handle_events(sock):
+    """Handle incoming events from the host on one connection"""
+    global trace_id
     buffer = ""
-    while node and node.connected:
+    while node and node.connected and sock is node.socket:
         try:
-            data = node.socket.recv(4096).decode()
+            data = sock.recv(4096).decode()
             if not data:
                 break
             buffer += data
-            
+            node.mark_received()
+            received_at = node.clock.time()
+
             # Messages separated by newline
             while "\n" in buffer:
                 packet, buffer = buffer.split("\n", 1)
                 event = AlarmEvent.from_json(packet)
-                print(f"[NODE] Received: {event.type.name}")
-                
-                if event.type == EventType.ALARM_SET:
-                    # Alarm scheduled: steady LED on
-                    print("[NODE] Alarm set received")
-                    try:
-                        if led:
-                            led.on()
-                        else:
-                            print("[NODE] LED not initialized")
-                    except Exception as e:
-                        print(f"[NODE] Failed to turn on LED: {e}")
+                log.debug("Received: %s", event.type.name)
+                if not node.accept_state_event(event):
+                    log.debug("Skipping stale %s", event.type.name)
+                    continue
+                if relay:
+                    relay.forward(event)
+                if zones and event.data and event.data.get("zone") not in (None, *zones):
+                    if event.type != EventType.ALARM_SET:
+                        continue  # Alarm for another zone (sent as part of a catch-up)
+                    # The mesh has one alarm; set for another zone, none is left here
+                    event = AlarmEvent(EventType.ALARM_CLEARED, event.data)
+
+                if event.type == EventType.RETRY_AFTER:
+                    node.defer_reconnect(event.data["retry_after"])
+                elif event.type == EventType.ACK and "heartbeat_interval" in event.data:
+                    node.apply_heartbeat_grant(event.data)
+                elif event.type == EventType.ALARM_SET:
+                    # Alarm scheduled: steady LED on, and any ringing one is over
+                    log.info("Alarm set received")
+                    node.alarm_triggered = False
+                    ringing.clear()
+                    if gossip:
+                        gossip.set_local(node.state_version, alarm_active=False)
+                    for station in stations:
+                        station.led_on()
+                elif event.type == EventType.ALARM_PREPARE:
+                    # Alarm fires soon: start the LED threads now so the
+                    # trigger only has to let them go, and confirm over the
+                    # connection (a failed send reconnects right away)
+                    for station in stations:
+                        station.arm()
+                    node.send(AlarmEvent(EventType.ACK, {
+                        "node_id": node_id, "prepared": event.data["fire_at"]
+                    }))
+                    log.info("Armed for the alarm in %.0fs", event.data["fire_at"] - node.clock.time())
                 elif event.type == EventType.ALARM_TRIGGERED:
+                    for station in stations:
+                        station.snoozed = False
                     node.alarm_triggered = True
-                    print("[NODE] ALARM TRIGGERED!")
-                    # Start blinking LED
-                    try:
-                        if led:
-                            led.blink()
-                    except Exception as e:
-                        print(f"[NODE] Failed to blink LED: {e}")
+                    ringing.set()
+                    node.wakeup.set()  # Heartbeats speed up while ringing
+                    log.warning("ALARM TRIGGERED!")
+                    if gossip:
+                        gossip.set_local(node.state_version, alarm_active=True)
+                    # Start blinking LEDs
+                    for station in stations:
+                        station.led_blink()
+                    trace_id = event.data.get("trace_id")
+                    if trace_id:
+                        # Report where the time went on this node
+                        node.send(AlarmEvent(EventType.ACK, {
+                            "trace_id": trace_id, "node_id": node_id,
+                            "spans": [["node.receive", received_at], ["node.led", node.clock.time()]]
+                        }))
                 elif event.type == EventType.ALARM_CLEARED:
                     node.alarm_triggered = False
-                    print("[NODE] Alarm cleared")
-                    # Turn off LED
-                    try:
-                        if led:
-                            led.off()
-                    except Exception:
-                        pass
+                    ringing.clear()
+                    log.info("Alarm cleared")
+                    if gossip:
+                        gossip.set_local(node.state_version, alarm_active=False)
+                    # Turn off LEDs
+                    for station in stations:
+                        station.led_off()
         except Exception as e:
-            print(f"[NODE] Error receiving events: {e}")
+            log.error("Error receiving events: %s", e)
             break
+    node.disconnect(sock)
+
 
+def snooze(station: Station):
+    """A station's button was pressed: snooze the ringing alarm, once per station"""
+    with snooze_lock:
+        if not node.is_alarm_triggered() or station.snoozed or not node.connected:
+            return
+        log.info("Snooze button pressed on %s!", station.station_id)
+        # Send snooze event to host
+        snooze_event = AlarmEvent(EventType.SNOOZE_PRESSED, {
+            "node": "client", "node_id": node_id, "station": station.station_id
+        })
+        if trace_id:
+            snooze_event.data.update(trace_id=trace_id, pressed_at=node.clock.time())
+        node.send(snooze_event)
+        station.snoozed = True
+        if gossip:
+            gossip.set_local(node.state_version, snoozed=all(st.snoozed for st in stations))
 
-def button_monitor():
-    """Monitor button presses while alarm is triggered"""
+
+def button_monitor(polled):
+    """
+    Poll the buttons that can't report presses themselves, only while an
+    alarm rings; the thread sleeps on `ringing` otherwise
+    """
     while node:
+        ringing.wait()
         try:
-            if node.is_alarm_triggered() and button:
-                if button.is_pressed():
-                    print("[NODE] Snooze button pressed!")
-                    # Send snooze event to host
-                    snooze_event = AlarmEvent(EventType.SNOOZE_PRESSED, {"node": "client"})
-                    node.send(snooze_event)
-                    # Debounce: wait for release
-                    time.sleep(0.5)
-            time.sleep(0.05)  # Poll every 50ms
+            for station in polled:
+                if station.is_pressed():
+                    snooze(station)
         except Exception as e:
-            print(f"[NODE] Error in button monitor: {e}")
-            time.sleep(0.05)
+            log.error("Error in button monitor: %s", e)
+        node.clock.sleep(0.05)  # Poll every 50ms
+
+
+def show_snooze_progress(snoozed, total):
+    """Gossip callback - blink faster as more of the mesh has snoozed"""
+    if not (node and node.is_alarm_triggered() and total):
+        return
+    period = 1.0 - 0.8 * snoozed / total
+    for station in stations:
+        station.led_blink(on_time=period / 2, off_time=period / 2)
+
+
+def heartbeat_data() -> dict:
+    """
+    Heartbeat payload: the stations and zones this connection speaks for,
+    plus the downstream device count for relays
+    """
+    if relay:
+        return relay.heartbeat_data()
+    return {"node_id": node_id, "stations": [station.station_id for station in stations], "zones": zones}
+
+
+def hello() -> AlarmEvent:
+    """
+    First heartbeat on a new connection: negotiates the heartbeat interval,
+    tells the host which state version we have, so it only sends what we
+    missed, and that we arm on ALARM_PREPARE
+    """
+    return AlarmEvent(EventType.HEARTBEAT, {
+        **heartbeat_data(), **node.heartbeat_request(), **node.sync_request(), "prepare": True
+    })
 
 
 def main():
-    global node, button, led
-    node = AlarmNode()
-    node.start_discovery()  # Zeroconf discovery
+    global node, relay, gossip, stations, zones, node_id
+    parser = argparse.ArgumentParser(description="Alarm mesh node")
+    parser.add_argument("--relay", action="store_true",
+                        help="Also accept downstream nodes and relay alarm events to them")
+    parser.add_argument("--relay-port", type=int, default=5002,
+                        help="TCP port for downstream nodes when running as a relay")
+    parser.add_argument("--node-id", default=node_id,
+                        help="Unique name of this node (default: hostname)")
+    parser.add_argument("--gossip-port", type=int, default=5003,
+                        help="UDP port for snooze-status gossip with other nodes (0 disables it)")
+    parser.add_argument("--station", action="append", default=None, metavar="ID:BUTTON_PIN:LED_PIN",
+                        help="Serve a button/LED station; repeat for several on one Pi "
+                             "(default: one station named after the node on pins 23/24)")
+    parser.add_argument("--host-socket", metavar="PATH",
+                        help="Reach a host on this machine through its Unix socket instead of the network")
+    parser.add_argument("--zone", action="append", default=[],
+                        help="Only ring for alarms in this zone; repeat for several (default: every zone)")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT,
+                        help="Alarm mesh this node belongs to on a shared host (default: %(default)s)")
+    args = parser.parse_args()
+    node_id = args.node_id
+    zones = args.zone
+    if args.station:
+        stations = [Station.parse(spec) for spec in args.station]
+    else:
+        stations = [Station(node_id, button_pin=23, led_pin=24)]
+
+    configure_logging()
+    readiness = Readiness()
+    # Stations initialize in the background while we look for the host
+    hardware = readiness.start_parallel({
+        f"station {station.station_id}": station.init_hardware for station in stations
+    })
+
+    transport = UnixTransport(args.host_socket) if args.host_socket else None
+    if args.relay:
+        relay = AlarmRelay(port=args.relay_port, relay_id=node_id, upstream=transport,
+                            tenant=args.tenant, stations=[station.station_id for station in stations],
+                            zones=zones)
+        node = relay.node
+    else:
+        node = AlarmNode(transport=transport, tenant=args.tenant)
+    node.start_discovery()  # Zeroconf discovery, unless the host's socket was given
 
-    print("[NODE APP] Waiting for host...")
+    if args.gossip_port:
+        gossip = GossipPeer(node.zeroconf or Zeroconf(), node_id, port=args.gossip_port,
+                            on_progress=show_snooze_progress, clock=node.clock)
+        gossip.start()
+
+    log_app.info("Waiting for host...")
 
     # Wait until the node connects
-    while not node.connected:
-        time.sleep(0.2)
+    with readiness.phase("discovery"):
+        node.wait_connected()
 
-    print("[NODE APP] Connected to host!")
+    log_app.info("Connected to host!")
 
-    # Send a heartbeat to host
-    hb = AlarmEvent(EventType.HEARTBEAT, {"node_id": "demo"})
-    node.send(hb)
+    # Introduce ourselves and negotiate the heartbeat interval
+    node.send(hello())
 
-    # Initialize button
-    try:
-        button = SnoozeButton(button_pin=23)
-        print("[NODE APP] Button initialized")
-    except Exception as e:
-        print(f"[NODE APP] Failed to initialize button: {e}")
+    if relay:
+        relay.start()
 
-    # Initialize LED
-    try:
-        led = LedController(pin=24)
-        print(f"[NODE APP] LED initialized")
-    except Exception as e:
-        print(f"[NODE APP] Failed to initialize LED: {e}")
-        led = None
+    # LEDs must be ready before the catch-up from the host is applied
+    for future in hardware.values():
+        future.result()
 
     # Start event handler thread
-    event_thread = threading.Thread(target=handle_events, daemon=True)
+    event_sock = node.socket
+    event_thread = threading.Thread(target=handle_events, args=(event_sock,), daemon=True)
     event_thread.start()
 
-    # Start button monitor thread
-    button_thread = threading.Thread(target=button_monitor, daemon=True)
-    button_thread.start()
+    # Buttons report presses through GPIO edge detection; any that can't
+    # are polled, but only while an alarm rings
+    polled = [station for station in stations
+              if station.button and not station.watch_button(snooze)]
+    if polled:
+        threading.Thread(target=button_monitor, args=(polled,), daemon=True).start()
+    readiness.mark_ready()
+    log_app.debug("Startup phases: %s", readiness.report()["phases"])
 
     try:
         while True:
-            time.sleep(10)
+            # Sleep until a heartbeat is due, or until the connection drops
+            # or an alarm starts ringing; an idle node stays asleep
+            node.wakeup.wait(max(0, node.heartbeat_wait()) if node.connected else RECONNECT_INTERVAL)
+            node.wakeup.clear()
+
+            # Reattach if the host went away (e.g. a standby took over)
+            if not node.connected:
+                if not node.reconnect():
+                    continue
+                log_app.info("Reconnected to host")
+                node.send(hello())
+            if node.socket is not event_sock:
+                event_sock = node.socket
+                threading.Thread(target=handle_events, args=(event_sock,), daemon=True).start()
 
-            # Send a heartbeat
-            hb = AlarmEvent(EventType.HEARTBEAT)
-            node.send(hb)
+            # Send a heartbeat unless other traffic already covers it
+            if node.heartbeat_due():
+                hb = AlarmEvent(EventType.HEARTBEAT, heartbeat_data() if relay else None)
+                node.send(hb)
 
     except KeyboardInterrupt:
-        print("[NODE APP] Shutting down")
-        if button:
-            button.close()
-        if led:
-            led.close()
-        node.stop()
+        log_app.info("Shutting down")
+        for station in stations:
+            station.close()
+        if gossip:
+            gossip.stop()
+        if relay:
+            relay.stop()
+        else:
+            node.stop()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,93 @@
+from common.io.button import SnoozeButton
+from common.io.led import LedController
+from common.log import get_logger
+
+log = get_logger("NODE APP")
+
+
+class Station:
+    """
+    One logical node: a snooze button and an LED wired to this Pi.
+
+    A node process can drive several stations over its single host
+    connection. Each one counts as a device in the host's snooze quorum and
+    snoozes at most once per alarm.
+    """
+
+    def __init__(self, station_id: str, button_pin=23, led_pin=24):
+        self.station_id = station_id
+        self.button_pin = button_pin
+        self.led_pin = led_pin
+        self.button = None
+        self.led = None
+        self.snoozed = False  # Already snoozed the ringing alarm
+
+    @staticmethod
+    def parse(spec: str) -> "Station":
+        """Build a station from "ID:BUTTON_PIN:LED_PIN" """
+        station_id, button_pin, led_pin = spec.split(":")
+        return Station(station_id, int(button_pin), int(led_pin))
+
+    def init_hardware(self):
+        # Initialize button
+        try:
+            self.button = SnoozeButton(button_pin=self.button_pin)
+            log.info("Button initialized for %s", self.station_id)
+        except Exception as e:
+            log.error("Failed to initialize button for %s: %s", self.station_id, e)
+
+        # Initialize LED
+        try:
+            self.led = LedController(pin=self.led_pin)
+            log.info("LED initialized for %s", self.station_id)
+        except Exception as e:
+            log.error("Failed to initialize LED for %s: %s", self.station_id, e)
+            self.led = None
+
+    def is_pressed(self) -> bool:
+        return bool(self.button and self.button.is_pressed())
+
+    def watch_button(self, on_press) -> bool:
+        """
+        Have on_press(station) called when the button is pressed.
+
+        Returns:
+            False if the button can't report presses by itself and has to
+            be polled with is_pressed()
+        """
+        return bool(self.button and self.button.on_press(lambda: on_press(self)))
+
+    def led_on(self):
+        try:
+            if self.led:
+                self.led.on()
+        except Exception as e:
+            log.error("Failed to turn on LED for %s: %s", self.station_id, e)
+
+    def led_blink(self, **kwargs):
+        try:
+            if self.led:
+                self.led.blink(**kwargs)
+        except Exception as e:
+            log.error("Failed to blink LED for %s: %s", self.station_id, e)
+
+    def arm(self):
+        """Ready the LED to blink the moment the alarm triggers"""
+        try:
+            if self.led:
+                self.led.arm()
+        except Exception as e:
+            log.error("Failed to arm LED for %s: %s", self.station_id, e)
+
+    def led_off(self):
+        try:
+            if self.led:
+                self.led.off()
+        except Exception:
+            pass
+
+    def close(self):
+        if self.button:
+            self.button.close()
+        if self.led:
+            self.led.close()
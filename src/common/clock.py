@@ -0,0 +1,72 @@
+import heapq
+import threading
+import time
+from datetime import datetime
+
+
+class Clock:
+    """
+    Source of time for the host and nodes.
+
+    Code takes a clock instead of calling time.time(), datetime.now() or
+    time.sleep() directly, so a VirtualClock can stand in for it when
+    simulating days of alarms in milliseconds.
+    """
+
+    def time(self) -> float:
+        """Seconds since the epoch"""
+        return time.time()
+
+    def now(self) -> datetime:
+        """Local wall-clock time"""
+        return datetime.now()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+SYSTEM_CLOCK = Clock()
+
+
+class VirtualClock(Clock):
+    """
+    Clock that only moves when advanced.
+
+    sleep() doesn't block: a sleeping thread waits until some other party
+    advances the clock past its wake-up time. With a single thread (as in
+    the simulator) time is simply moved forward with advance() or
+    advance_to().
+    """
+
+    def __init__(self, start: float = 0.0):
+        """
+        Args:
+            start: Initial time, in seconds since the epoch
+        """
+        self._now = start
+        self._sleepers = []  # heap of (wake time, seq, threading.Event)
+        self._seq = 0
+        self.lock = threading.Lock()
+
+    def time(self) -> float:
+        return self._now
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self._now)
+
+    def sleep(self, seconds: float):
+        wake = threading.Event()
+        with self.lock:
+            self._seq += 1
+            heapq.heappush(self._sleepers, (self._now + seconds, self._seq, wake))
+        wake.wait()
+
+    def advance_to(self, t: float):
+        """Move time forward to t, waking threads whose sleep has ended"""
+        with self.lock:
+            self._now = max(self._now, t)
+            while self._sleepers and self._sleepers[0][0] <= self._now:
+                heapq.heappop(self._sleepers)[2].set()
+
+    def advance(self, seconds: float):
+        self.advance_to(self._now + seconds)
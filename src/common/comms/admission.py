@@ -0,0 +1,45 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to pace admission of new connections"""
+
+    def __init__(self, rate: float, burst: int):
+        """
+        Args:
+            rate: Tokens added per second
+            burst: Maximum tokens held (connections admitted back-to-back)
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last = time.monotonic()
+        self.next_slot = 0.0  # Retry time handed to the most recently rejected caller
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available"""
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def retry_after(self) -> float:
+        """
+        Suggest how long a rejected caller should wait, in seconds.
+
+        Every rejected caller is given its own slot, one token interval after
+        the previous one, so a burst of rejections comes back spread out at
+        the refill rate instead of all retrying at once.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.next_slot = max(self.next_slot, now) + 1.0 / self.rate
+            return self.next_slot - now
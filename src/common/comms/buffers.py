@@ -0,0 +1,99 @@
+import select
+import threading
+
+
+class BufferPool:
+    """
+    Arena of fixed-size receive buffers shared by connection readers.
+
+    Buffers are carved out of large bytearrays, BLOCK at a time, and handed
+    out as memoryview slices. A released buffer goes back on the free list
+    for the next connection, so connection churn doesn't allocate.
+    """
+
+    BLOCK = 256  # Buffers allocated together when the pool runs dry
+
+    def __init__(self, size=4096):
+        """
+        Args:
+            size: Bytes per buffer (the most a single recv can return)
+        """
+        self.size = size
+        self.free = []
+        self.allocated = 0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> memoryview:
+        with self.lock:
+            if not self.free:
+                arena = memoryview(bytearray(self.size * self.BLOCK))
+                self.free = [arena[i * self.size:(i + 1) * self.size] for i in range(self.BLOCK)]
+                self.allocated += self.BLOCK
+            return self.free.pop()
+
+    def release(self, buffer: memoryview):
+        with self.lock:
+            self.free.append(buffer)
+
+
+class FrameReader:
+    """
+    Splits a socket's byte stream into newline-terminated frames.
+
+    Reads go into a buffer borrowed from a BufferPool with recv_into, so no
+    new bytes object is made per read; only complete frames are copied out.
+    """
+
+    def __init__(self, sock, pool: BufferPool, wakeup=None, partial=b""):
+        """
+        Args:
+            sock: Connected socket to read from
+            pool: Pool to borrow the receive buffer from
+            wakeup: Optional file descriptor; once it becomes readable, read()
+                    returns None without reading the socket, leaving any
+                    pending data in the kernel for whoever reads it next.
+                    Ignored for connections without a descriptor (in-process).
+            partial: Bytes of an unfinished frame already received
+        """
+        self.sock = sock
+        self.pool = pool
+        self.buffer = pool.acquire()
+        self.partial = bytearray(partial)  # Bytes of a frame still being received
+        self.wakeup = wakeup
+        self.poller = None
+        if wakeup is not None and sock.fileno() >= 0:
+            self.poller = select.poll()
+            self.poller.register(sock, select.POLLIN)
+            self.poller.register(wakeup, select.POLLIN)
+
+    def read(self):
+        """
+        Block for the next chunk of data.
+
+        Returns:
+            List of complete frames (possibly empty), or None once the peer
+            closed the connection or the wakeup fd fired
+        """
+        if self.poller is not None:
+            if any(fd == self.wakeup for fd, _ in self.poller.poll()):
+                return None
+        n = self.sock.recv_into(self.buffer)
+        if not n:
+            return None
+        chunk = self.buffer[:n]
+        end = n - 1
+        if not self.partial and chunk[end] == 0x0A:
+            # Common case: whole frames only
+            return bytes(chunk[:end]).split(b"\n")
+        self.partial += chunk
+        end = self.partial.rfind(b"\n")
+        if end < 0:
+            return []
+        frames = bytes(self.partial[:end]).split(b"\n")
+        del self.partial[:end + 1]
+        return frames
+
+    def close(self):
+        if self.buffer is not None:
+            self.pool.release(self.buffer)
+            self.buffer = None
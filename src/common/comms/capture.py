@@ -0,0 +1,175 @@
+import itertools
+import json
+import struct
+import threading
+from common.clock import SYSTEM_CLOCK
+from common.log import get_logger
+
+log = get_logger("CAPTURE")
+
+# Record kinds
+OPEN = 1    # Connection registered; payload is its address
+CLOSE = 2   # Connection gone
+NAME = 3    # Node ID learned; payload is the ID
+IN = 4      # Frame received from a node
+OUT = 5     # Frames sent to a connection, or broadcast
+LOCAL = 6   # Change made on the host itself (web, button, scheduler); payload is JSON
+
+BROADCAST = 0                   # Connection number of broadcasts to nodes
+STANDBY_BROADCAST = 0xFFFFFFFF  # Connection number of broadcasts to standby hosts
+
+MAGIC = b"ACAP"
+VERSION = 2
+HEADER = struct.Struct("<4sHI")   # magic, format version, initial state length
+RECORD = struct.Struct("<dBII")   # ts, kind, connection, payload length
+# Version 1 numbered connections with 16 bits, standby broadcasts as 0xFFFF
+RECORD_V1 = struct.Struct("<dBHI")
+
+
+class FrameCapture:
+    """
+    Records a host's wire traffic to a compact binary file.
+
+    Every record is a 17-byte header (timestamp, kind, connection number,
+    payload length) followed by the raw frame bytes, so capturing costs a
+    struct pack and a buffered write per frame; nothing is decoded. The
+    file starts with the alarm state at the time capture began, so a replay
+    (see host/replay.py) can start from the same state.
+
+    Connections are numbered in the order they are first seen, starting at
+    1; broadcasts are recorded once, under BROADCAST or STANDBY_BROADCAST.
+
+    Capturing never takes the host down: if a record can't be written, the
+    error is logged and capture stops.
+    """
+
+    FLUSH_INTERVAL = 1.0  # Seconds between flushes to disk
+
+    def __init__(self, target, state=None, clock=SYSTEM_CLOCK):
+        """
+        Args:
+            target: Path of the capture file, or a writable binary file
+            state: Alarm state (AlarmManager.get_state()) the capture starts from
+            clock: Time source for record timestamps
+        """
+        self.file = open(target, "wb", buffering=1 << 16) if isinstance(target, str) else target
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.connections = {}  # addr -> connection number, while open
+        self.numbers = itertools.count(1)
+        self.names = {}        # connection number -> node ID
+        self.last_flush = clock.time()
+        self.failed = False
+        initial = json.dumps(state).encode()
+        self.file.write(HEADER.pack(MAGIC, VERSION, len(initial)) + initial)
+
+    def _write(self, kind, number, payload=b""):
+        # Called with the lock held
+        if self.failed:
+            return
+        now = self.clock.time()
+        try:
+            self.file.write(RECORD.pack(now, kind, number, len(payload)))
+            self.file.write(payload)
+            if now - self.last_flush >= self.FLUSH_INTERVAL:
+                self.file.flush()
+                self.last_flush = now
+        except (OSError, ValueError, struct.error) as e:
+            self.failed = True
+            log.error("Capture stopped: %s", e)
+
+    def _number(self, addr) -> int:
+        # Called with the lock held; connections adopted in a handoff are
+        # first seen here rather than at registration
+        number = self.connections.get(addr)
+        if number is None:
+            number = self.connections[addr] = next(self.numbers)
+            self._write(OPEN, number, str(addr).encode())
+        return number
+
+    def opened(self, addr):
+        with self.lock:
+            self._number(addr)
+
+    def closed(self, addr):
+        with self.lock:
+            number = self.connections.pop(addr, None)
+            if number is not None:
+                self._write(CLOSE, number)
+
+    def named(self, addr, node_id):
+        with self.lock:
+            number = self._number(addr)
+            if self.names.get(number) != node_id:
+                self.names[number] = node_id
+                self._write(NAME, number, str(node_id).encode())
+
+    def inbound(self, addr, frame: bytes):
+        with self.lock:
+            self._write(IN, self._number(addr), frame)
+
+    def outbound(self, addr, frames: bytes):
+        """
+        Args:
+            addr: Connection the frames went to
+            frames: Newline-terminated frames as sent
+        """
+        with self.lock:
+            self._write(OUT, self._number(addr), frames)
+
+    def broadcast(self, role, frames: bytes):
+        """
+        Args:
+            role: "node" or "standby", whom the broadcast went to
+            frames: Newline-terminated frames as sent
+        """
+        with self.lock:
+            self._write(OUT, BROADCAST if role == "node" else STANDBY_BROADCAST, frames)
+
+    def local(self, change: dict):
+        """Record a change made on the host itself, e.g. {"op": "set", "alarm": {...}}"""
+        with self.lock:
+            self._write(LOCAL, BROADCAST, json.dumps(change).encode())
+
+    def close(self):
+        with self.lock:
+            try:
+                self.file.flush()
+                self.file.close()
+            except (OSError, ValueError) as e:
+                log.error("Failed to close capture: %s", e)
+
+
+def read_capture(source):
+    """
+    Read a capture file.
+
+    Args:
+        source: Path of the capture file, or a readable binary file
+
+    Returns:
+        (initial alarm state, list of (ts, kind, connection, payload))
+    """
+    f = open(source, "rb") if isinstance(source, str) else source
+    try:
+        data = f.read()
+    finally:
+        f.close()
+    magic, version, state_len = HEADER.unpack_from(data)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError("not a frame capture")
+    record = RECORD if version == VERSION else RECORD_V1
+    offset = HEADER.size
+    state = json.loads(data[offset:offset + state_len])
+    offset += state_len
+    records = []
+    while offset + record.size <= len(data):
+        ts, kind, number, length = record.unpack_from(data, offset)
+        offset += record.size
+        if version == 1 and number == 0xFFFF:
+            number = STANDBY_BROADCAST
+        if offset + length > len(data):
+            break  # Cut off mid-record (the host stopped without closing)
+        records.append((ts, kind, number, data[offset:offset + length]))
+        offset += length
+    return state, records
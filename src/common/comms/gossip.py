@@ -0,0 +1,207 @@
+import json
+import random
+import socket
+import threading
+from zeroconf import ServiceBrowser, ServiceInfo, ServiceStateChange
+from common.clock import SYSTEM_CLOCK
+from common.comms.host_server import get_lan_ip
+from common.log import get_logger
+
+log = get_logger("GOSSIP")
+
+
+class GossipPeer:
+    """
+    Epidemic spread of alarm version and snooze status between nodes.
+
+    Every node keeps an entry per known node: {"version", "snoozed", "beat"}.
+    "version" is the host's alarm state version the entry refers to and
+    "beat" a counter the owning node bumps every round, so newer information
+    always wins a merge. Each round the node sends its whole table over UDP to
+    at most FANOUT random peers found through Zeroconf, which spreads an
+    update to every node in O(log n) rounds without involving the host.
+    Entries whose beat stops advancing are dropped after STALE_AFTER seconds.
+    """
+
+    SERVICE_TYPE = "_alarmpeer._udp.local."
+    FANOUT = 3
+    ACTIVE_INTERVAL = 1.0   # Seconds between rounds while an alarm is ringing
+    IDLE_INTERVAL = None    # No rounds otherwise; set_local() still sends one per change
+    STALE_AFTER = 30.0
+    MAX_DATAGRAM = 8192
+
+    def __init__(self, zeroconf, node_id, port=5003, on_progress=None, clock=SYSTEM_CLOCK):
+        """
+        Args:
+            zeroconf: Zeroconf instance to advertise and browse with
+            node_id: Unique name of this node
+            port: UDP port to gossip on
+            on_progress: Optional callback taking (snoozed, total) whenever
+                         the snooze progress for the current alarm changes
+            clock: Time source for entry ages. Rounds are still paced by
+                   wall time, as they wait on `wakeup`.
+        """
+        self.zeroconf = zeroconf
+        self.node_id = node_id
+        self.port = port
+        self.on_progress = on_progress
+        self.clock = clock
+        self.peers = {}    # {service name: (ip, port)}
+        self.entries = {}  # {node_id: {"version": v, "snoozed": bool, "beat": n}}
+        self.updated = {}  # {node_id: local time the entry last changed}
+        self.alarm_active = False
+        self.last_progress = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.sock = None
+        self.service_info = None
+        self.browser = None
+
+    # ------------------------------
+    # Local state
+    # ------------------------------
+    def set_local(self, version, snoozed=False, alarm_active=None):
+        """Update this node's own entry and gossip it right away"""
+        with self.lock:
+            entry = self.entries.get(self.node_id, {"beat": 0})
+            self.entries[self.node_id] = {
+                "version": version, "snoozed": snoozed, "beat": entry["beat"] + 1
+            }
+            self.updated[self.node_id] = self.clock.time()
+            if alarm_active is not None:
+                self.alarm_active = alarm_active
+        self.wakeup.set()
+        self._report_progress()
+
+    def snooze_progress(self) -> tuple[int, int]:
+        """Return (snoozed, total) over the nodes on the newest alarm version"""
+        with self.lock:
+            if not self.entries:
+                return 0, 0
+            version = max(e["version"] for e in self.entries.values())
+            current = [e for e in self.entries.values() if e["version"] == version]
+            return sum(1 for e in current if e["snoozed"]), len(current)
+
+    def _report_progress(self):
+        progress = self.snooze_progress()
+        if progress != self.last_progress:
+            self.last_progress = progress
+            if self.on_progress:
+                try:
+                    self.on_progress(*progress)
+                except Exception as e:
+                    log.error("Progress callback failed: %s", e)
+
+    # ------------------------------
+    # Gossip rounds
+    # ------------------------------
+    def _merge(self, entries: dict) -> bool:
+        changed = False
+        now = self.clock.time()
+        with self.lock:
+            for node_id, entry in entries.items():
+                if node_id == self.node_id:
+                    continue
+                mine = self.entries.get(node_id)
+                if mine is None or (entry["version"], entry["beat"]) > (mine["version"], mine["beat"]):
+                    if mine is None or (mine["version"], mine["snoozed"]) != (entry["version"], entry["snoozed"]):
+                        changed = True
+                    self.entries[node_id] = entry
+                    self.updated[node_id] = now
+        return changed
+
+    def _expire(self):
+        cutoff = self.clock.time() - self.STALE_AFTER
+        with self.lock:
+            for node_id in [n for n, t in self.updated.items() if t < cutoff and n != self.node_id]:
+                del self.entries[node_id]
+                del self.updated[node_id]
+
+    def _round(self):
+        with self.lock:
+            own = self.entries.get(self.node_id)
+            if own:
+                own["beat"] += 1
+                self.updated[self.node_id] = self.clock.time()
+            payload = json.dumps({"from": self.node_id, "entries": self.entries}).encode()
+            targets = random.sample(list(self.peers.values()), min(self.FANOUT, len(self.peers)))
+        for target in targets:
+            try:
+                self.sock.sendto(payload, target)
+            except Exception as e:
+                log.debug("Gossip to %s failed: %s", target, e)
+
+    def _send_loop(self):
+        while self.running:
+            interval = self.ACTIVE_INTERVAL if self.alarm_active else self.IDLE_INTERVAL
+            self.wakeup.wait(interval)
+            self.wakeup.clear()
+            if not self.running:
+                break
+            self._expire()
+            self._round()
+            self._report_progress()
+
+    def _recv_loop(self):
+        while self.running:
+            try:
+                data, _ = self.sock.recvfrom(self.MAX_DATAGRAM)
+                message = json.loads(data)
+            except Exception:
+                continue
+            if self._merge(message.get("entries", {})):
+                self._report_progress()
+
+    # ------------------------------
+    # Peer discovery
+    # ------------------------------
+    def _on_service_state_change(self, zeroconf, service_type, name, state_change):
+        if state_change == ServiceStateChange.Added:
+            info = zeroconf.get_service_info(service_type, name)
+            if info and info.properties.get(b"node_id", b"").decode() != self.node_id:
+                ip = ".".join(str(b) for b in info.addresses[0])
+                with self.lock:
+                    self.peers[name] = (ip, info.port)
+        elif state_change == ServiceStateChange.Removed:
+            with self.lock:
+                self.peers.pop(name, None)
+
+    # ------------------------------
+    # Control
+    # ------------------------------
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("", self.port))
+        self.running = True
+
+        self.service_info = ServiceInfo(
+            type_=self.SERVICE_TYPE,
+            name=f"{self.node_id}.{self.SERVICE_TYPE}",
+            addresses=[socket.inet_aton(get_lan_ip())],
+            port=self.port,
+            properties={"node_id": self.node_id}
+        )
+        self.zeroconf.register_service(self.service_info)
+        self.browser = ServiceBrowser(
+            self.zeroconf, self.SERVICE_TYPE, handlers=[self._on_service_state_change]
+        )
+
+        threading.Thread(target=self._recv_loop, daemon=True).start()
+        threading.Thread(target=self._send_loop, daemon=True).start()
+        log.info("Gossiping as %s on UDP port %d", self.node_id, self.port)
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.browser:
+            self.browser.cancel()
+        try:
+            if self.service_info:
+                self.zeroconf.unregister_service(self.service_info)
+        except Exception:
+            pass
+        try:
+            self.sock.close()
+        except Exception:
+            pass
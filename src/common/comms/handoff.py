@@ -0,0 +1,163 @@
+import json
+import os
+import socket
+import threading
+from common.log import get_logger
+
+log = get_logger("HANDOFF")
+
+HANDOFF_PATH = "/tmp/alarm-host.handoff"  # Unix socket the running host listens on
+FDS_PER_MESSAGE = 200     # Kernel caps descriptors per message at 253
+MAX_MESSAGE = 1 << 20
+
+_held = []  # Channels of completed handoffs, open until this process exits
+
+
+def _send(channel, message: dict, fds=()):
+    socket.send_fds(channel, [json.dumps(message).encode()], list(fds))
+
+
+def _recv(channel, max_fds=FDS_PER_MESSAGE):
+    """Receive one message; returns (message or None on EOF, fds)"""
+    data, fds, flags, _ = socket.recv_fds(channel, MAX_MESSAGE, max_fds)
+    if flags & socket.MSG_CTRUNC:
+        for fd in fds:
+            os.close(fd)
+        raise RuntimeError("descriptors truncated in transit")
+    if not data:
+        return None, fds
+    return json.loads(data), fds
+
+
+def _adopt_fd(fd) -> socket.socket:
+    sock = socket.socket(fileno=fd)
+    sock.setblocking(True)
+    return sock
+
+
+# ------------------------------
+# Running host: hands over
+# ------------------------------
+def serve_handoff(on_request, path=HANDOFF_PATH):
+    """
+    Listen for a new host process asking to take over.
+
+    Args:
+        on_request: Called with the channel (a connected Unix socket) for
+                    each request. Returns True once it has handed off; the
+                    channel is then left open until this process exits, so
+                    the new process can tell when everything was released.
+        path: Unix socket path to listen on
+    """
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    server.bind(path)
+    os.chmod(path, 0o600)
+    server.listen(1)
+    log.info("Accepting takeover requests on %s", path)
+
+    def serve():
+        while True:
+            channel, _ = server.accept()
+            try:
+                request, _ = _recv(channel)
+                if request and request.get("type") == "takeover" and on_request(channel):
+                    _held.append(channel)
+                    server.close()
+                    return
+            except Exception as e:
+                log.error("Takeover request failed: %s", e)
+            channel.close()
+
+    threading.Thread(target=serve, name="handoff", daemon=True).start()
+
+
+def send_handoff(channel, listeners, connections, state: dict, timeout=10):
+    """
+    Pass the listening sockets, node connections and state to the new process.
+
+    Sockets travel as descriptors (SCM_RIGHTS), so the TCP connections stay
+    up: both processes hold the same kernel socket until this one exits.
+    Returns once the new process confirms it is serving them.
+
+    Args:
+        channel: Channel from serve_handoff()
+        listeners: Listening sockets, one per transport
+        connections: List of (socket, metadata dict) per node connection
+        state: JSON-serializable host state
+        timeout: Seconds to wait for the new process to confirm
+
+    Raises:
+        Exception if the new process did not take over; nothing was given up
+    """
+    _send(channel, {"state": state, "connections": len(connections)},
+          [listener.fileno() for listener in listeners])
+    for i in range(0, len(connections), FDS_PER_MESSAGE):
+        chunk = connections[i:i + FDS_PER_MESSAGE]
+        _send(channel, {"connections": [meta for _, meta in chunk]},
+              [sock.fileno() for sock, _ in chunk])
+    channel.settimeout(timeout)
+    reply, _ = _recv(channel, max_fds=0)
+    if not reply or reply.get("type") != "adopted":
+        raise RuntimeError("new host process did not take over")
+    log.info("Handed off %d connection(s)", len(connections))
+
+
+# ------------------------------
+# New host: takes over
+# ------------------------------
+class Handoff:
+    """What a new host process received from the one it replaces"""
+
+    def __init__(self, channel, listeners, connections, state):
+        self.channel = channel
+        self.listeners = listeners      # Listening sockets, one per transport
+        self.connections = connections  # [(socket, metadata dict)]
+        self.state = state
+
+    def complete(self, timeout=30):
+        """
+        Tell the old process its connections are being served, then wait for
+        it to exit so its web port and hardware are free.
+        """
+        _send(self.channel, {"type": "adopted"})
+        self.channel.settimeout(timeout)
+        try:
+            while _recv(self.channel, max_fds=0)[0] is not None:
+                pass
+        except socket.timeout:
+            log.warning("Old host process still running after %ss", timeout)
+        self.channel.close()
+
+
+def request_handoff(path=HANDOFF_PATH, timeout=30) -> Handoff:
+    """
+    Ask the running host to hand over its sockets and state.
+
+    Args:
+        path: Unix socket path the running host listens on
+        timeout: Seconds to wait for the handoff
+
+    Returns:
+        Handoff; call complete() once the connections are being served
+    """
+    channel = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    channel.settimeout(timeout)
+    channel.connect(path)
+    _send(channel, {"type": "takeover"})
+
+    header, fds = _recv(channel)
+    if header is None or not fds:
+        raise RuntimeError("running host refused to hand off")
+    listeners = [_adopt_fd(fd) for fd in fds]
+    connections = []
+    while len(connections) < header["connections"]:
+        message, fds = _recv(channel)
+        if message is None:
+            raise RuntimeError("running host stopped mid-handoff")
+        connections.extend(zip((_adopt_fd(fd) for fd in fds), message["connections"]))
+    log.info("Received %d connection(s)", len(connections))
+    return Handoff(channel, listeners, connections, header["state"])
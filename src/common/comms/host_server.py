@@ -1,22 +1,111 @@
 # alarm_host.py
+import logging
+import os
+import select
 import socket
 import threading
-import time
 from zeroconf import Zeroconf, ServiceInfo
-from common.comms.protocol import AlarmEvent, EventType
+from common.clock import SYSTEM_CLOCK
+from common.comms.admission import TokenBucket
+from common.comms.buffers import BufferPool, FrameReader
+from common.comms.keepalive import enable_keepalive
+from common.comms.liveness import PhiAccrualDetector
+from common.comms.protocol import DEFAULT_TENANT, AlarmEvent, EventType
+from common.comms.registry import NO_ZONES, Connection, ConnectionRegistry
+from common.comms.transport import TcpTransport
+from common.log import get_logger, kv
+
+log = get_logger("HOST")
+
+
+def get_lan_ip() -> str:
+    """Find the LAN IP other devices can reach this machine on"""
+    # Try to find a non-loopback LAN IP. socket.gethostbyname(hostname)
+    # often returns 127.0.1.1 on some systems, which makes the advertised
+    # address unreachable for other devices. Use a UDP trick to discover
+    # the primary outbound IP and fall back gracefully.
+    ip = None
+    s = None
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # This doesn't need to be reachable; no packets are sent.
+        s.connect(("8.8.8.8", 80))
+        ip = s.getsockname()[0]
+    except Exception:
+        try:
+            ip = socket.gethostbyname(socket.gethostname())
+        except Exception:
+            ip = "127.0.0.1"
+    finally:
+        try:
+            if s:
+                s.close()
+        except:
+            pass
+    return ip
+
 
 class AlarmHost:
     SERVICE_TYPE = "_alarmhost._tcp.local."
     SERVICE_NAME = "AlarmHostService._alarmhost._tcp.local."
-    HEARTBEAT_TIMEOUT = 60  # Remove node if no heartbeat for 60 seconds
+    HEARTBEAT_TIMEOUT = 60  # Remove node if nothing heard for 60 seconds (unless negotiated)
+    MIN_HEARTBEAT_INTERVAL = 5
+    MAX_HEARTBEAT_INTERVAL = 30            # Without kernel keepalive
+    MAX_KEEPALIVE_HEARTBEAT_INTERVAL = 300  # With kernel keepalive watching the link
+    RINGING_HEARTBEAT_INTERVAL = 1  # Nodes heartbeat this often while an alarm rings
 
-    def __init__(self, port=5001, event_handler=None, on_node_connected=None):
-        self.port = port
-        self.zeroconf = Zeroconf()
+    def __init__(self, port=5001, event_handler=None, on_node_connected=None,
+                 service_name=None, properties=None,
+                 backlog=128, accept_rate=50.0, accept_burst=100, tracer=None,
+                 clock=SYSTEM_CLOCK, transports=None, capture=None, accept_tenant=None):
+        """
+        Args:
+            port: TCP port to listen on (when transports isn't given)
+            event_handler: Callback taking (event, addr) for received events
+            on_node_connected: Callback taking (addr, conn) for new nodes
+            service_name: Zeroconf service name to advertise under
+            properties: Zeroconf TXT properties to advertise
+            backlog: Listen backlog for pending connections
+            accept_rate: Connections admitted per second once the burst is used
+            accept_burst: Connections admitted back-to-back before pacing starts
+            tracer: Optional TraceRecorder; broadcasts of traced events
+                    record a "host.send" span per node
+            clock: Time source for heartbeat bookkeeping
+            transports: Transports to listen on (see transport.py); defaults
+                        to TCP on `port`. Only discoverable ones are
+                        advertised through Zeroconf.
+            capture: Optional FrameCapture recording every frame in and out
+            accept_tenant: Optional function taking the tenant a node names in
+                           its hello; returning False disconnects the node.
+                           Any tenant is accepted without it.
+        """
+        self.transports = transports or [TcpTransport(port)]
+        advertised = [t for t in self.transports if t.discoverable]
+        self.port = advertised[0].port if advertised else None
+        self.listeners = []  # One per transport, in the same order
+        self.backlog = backlog
+        self.admission = TokenBucket(rate=accept_rate, burst=accept_burst)
+        self.rejected_count = 0  # Connections told to retry later
+        self.pending = []        # Accepted connections waiting to be registered
+        self.pending_cond = threading.Condition()
+        self.tracer = tracer
+        self.clock = clock
+        self.capture = capture
+        self.accept_tenant = accept_tenant
+        self.zeroconf = Zeroconf() if advertised else None
         self.service_info = None
-        self.clients = {}      # {addr: {"conn": conn, "last_heartbeat": timestamp}}
+        self.service_name = service_name or self.SERVICE_NAME
+        self.properties = properties or {"role": "host"}
+        self.registry = ConnectionRegistry()  # Registered node connections
+        self.detector = PhiAccrualDetector()  # Which nodes are likely dead
+        self.buffers = BufferPool()  # Receive buffers for the connection readers
         self.running = False
-        self.lock = threading.Lock()
+        self.frozen = False  # Paused for a handoff: nothing accepted or read
+        self.wakeup_r, self.wakeup_w = os.pipe()  # Readable while frozen
+        self.readers = 0     # Receive loops running
+        self.readers_cond = threading.Condition()
+        self.partials = {}   # addr -> unfinished frame bytes, kept when frozen
+        self.write_locks = {}  # tenant -> Lock serializing writes to its nodes' sockets
         self.event_handler = event_handler  # Callback for handling received events
         self.on_node_connected = on_node_connected  # Callback when a node connects
 
@@ -24,172 +113,601 @@ class AlarmHost:
     # Zeroconf Service Announce
     # ------------------------------
     def start_advertising(self):
-        # Try to find a non-loopback LAN IP. socket.gethostbyname(hostname)
-        # often returns 127.0.1.1 on some systems, which makes the advertised
-        # address unreachable for other devices. Use a UDP trick to discover
-        # the primary outbound IP and fall back gracefully.
-        ip = None
-        s = None
-        try:
-            s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-            # This doesn't need to be reachable; no packets are sent.
-            s.connect(("8.8.8.8", 80))
-            ip = s.getsockname()[0]
-        except Exception:
-            try:
-                ip = socket.gethostbyname(socket.gethostname())
-            except Exception:
-                ip = "127.0.0.1"
-        finally:
-            try:
-                if s:
-                    s.close()
-            except:
-                pass
+        if self.zeroconf is None:
+            return  # Nothing discoverable to advertise
+        ip = get_lan_ip()
 
         self.service_info = ServiceInfo(
             type_=self.SERVICE_TYPE,
-            name=self.SERVICE_NAME,
+            name=self.service_name,
             addresses=[socket.inet_aton(ip)],
             port=self.port,
-            properties={"role": "host"}
+            properties=self.properties
         )
 
         self.zeroconf.register_service(self.service_info)
-        print(f"[HOST] Advertised service at {ip}:{self.port}")
+        log.info("Advertised service at %s:%s", ip, self.port)
 
     # ------------------------------
-    # TCP Server
+    # Server
     # ------------------------------
-    def start_tcp_server(self):
-        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.sock.bind(("", self.port))
-        self.sock.listen(5)
-        print(f"[HOST] TCP server listening on port {self.port}")
+    def start_server(self):
+        """Listen on every transport"""
+        self.listeners = [transport.listen(self.backlog) for transport in self.transports]
+        log.info("Listening on %s", ", ".join(str(t) for t in self.transports))
 
-        threading.Thread(target=self._accept_loop, daemon=True).start()
+        self._start_loops()
         threading.Thread(target=self._heartbeat_monitor, daemon=True).start()
 
-    def _accept_loop(self):
-        while self.running:
+    def _start_loops(self):
+        self.loops = [threading.Thread(target=self._accept_loop, args=(listener,), daemon=True)
+                      for listener in self.listeners]
+        self.loops.append(threading.Thread(target=self._admission_loop, daemon=True))
+        for thread in self.loops:
+            thread.start()
+
+    def _accept_loop(self, listener):
+        """
+        Accept connections as fast as the kernel hands them over.
+
+        Connections beyond the admission rate are told when to come back
+        (RETRY_AFTER) and closed, so a building-wide reboot turns into a
+        paced queue instead of a thread storm. Admitted ones are handed to
+        the admission loop in batches.
+        """
+        poller = select.poll()
+        poller.register(listener, select.POLLIN)
+        poller.register(self.wakeup_r, select.POLLIN)
+        while self.running and not self.frozen:
             try:
-                conn, addr = self.sock.accept()
-                print(f"[HOST] Node connected from {addr}")
-                with self.lock:
-                    self.clients[addr] = {
-                        "conn": conn,
-                        "last_heartbeat": time.time()
-                    }
-                
-                # Start the client receive loop
-                threading.Thread(
-                    target=self._client_recv_loop, 
-                    args=(conn, addr),
-                    daemon=True
-                ).start()
-                
-                # Call the node connected callback in a separate thread to avoid blocking
-                if self.on_node_connected:
-                    threading.Thread(
-                        target=self.on_node_connected,
-                        args=(addr, conn),
-                        daemon=True
-                    ).start()
+                if any(fd == self.wakeup_r for fd, _ in poller.poll()):
+                    break  # Frozen for a handoff
+                conn, addr = listener.accept()
             except Exception as e:
-                print(f"[HOST] Error in accept loop: {e}")
-                pass
+                if not self.running:
+                    break
+                log.error("Error in accept loop: %s", e)
+                continue
+
+            if not self.admission.try_acquire():
+                self.rejected_count += 1
+                retry_after = self.admission.retry_after()
+                log.debug("Deferring %s for %.1fs", addr, retry_after)
+                try:
+                    event = AlarmEvent(EventType.RETRY_AFTER, {"retry_after": retry_after})
+                    conn.sendall(event.to_frame())
+                except Exception:
+                    pass
+                conn.close()
+                continue
+
+            with self.pending_cond:
+                self.pending.append((conn, addr))
+                self.pending_cond.notify()
+
+    def _admission_loop(self):
+        """Register newly accepted connections in batches"""
+        while self.running and not self.frozen:
+            with self.pending_cond:
+                while not self.pending and self.running and not self.frozen:
+                    self.pending_cond.wait(1)
+                if self.frozen:
+                    return  # freeze() registers what is left
+                batch, self.pending = self.pending, []
+            if not batch:
+                continue
+
+            records = self._register(batch)
+            for record in records:
+                conn, addr = record.sock, record.addr
+                self._start_reader(record)
 
-    def _client_recv_loop(self, conn, addr):
-        buffer = ""
+                # Bring the node up to date. Runs here rather than in its own
+                # thread; it only queues a few small frames on the socket.
+                if self.on_node_connected:
+                    try:
+                        self.on_node_connected(addr, conn)
+                    except Exception as e:
+                        log.error("Error in node connected callback for %s: %s", addr, e)
+
+    def _register(self, batch) -> list:
+        now = self.clock.time()
+        records = [Connection(conn, addr, now, self.HEARTBEAT_TIMEOUT) for conn, addr in batch]
+        self.registry.add_many(records)
+        if self.capture:
+            for record in records:
+                self.capture.opened(record.addr)
+        log.info("Admitted %d node(s): %s", len(batch),
+                 ", ".join(str(addr) for _, addr in batch))
+        return records
+
+    def _start_reader(self, record: Connection, partial=b""):
+        with self.readers_cond:
+            self.readers += 1
+        threading.Thread(
+            target=self._client_recv_loop,
+            args=(record, partial),
+            daemon=True
+        ).start()
+
+    def _client_recv_loop(self, record: Connection, partial=b""):
+        reader = FrameReader(record.sock, self.buffers, wakeup=self.wakeup_r, partial=partial)
+        try:
+            self._read_frames(record, reader)
+        finally:
+            reader.close()
+            with self.readers_cond:
+                self.readers -= 1
+                self.readers_cond.notify_all()
+
+    def _read_frames(self, record: Connection, reader: FrameReader):
+        conn, addr = record.sock, record.addr
         while self.running:
             try:
-                data = conn.recv(4096).decode()
-                if not data:
+                frames = reader.read()
+                if frames is None:
                     break
-                buffer += data
 
-                # Messages separated by newline
-                while "\n" in buffer:
-                    packet, buffer = buffer.split("\n", 1)
+                # Any traffic proves the node is alive, not just heartbeats
+                now = self.clock.time()
+                self.detector.heartbeat(record, now)
+                record.last_heartbeat = now
+
+                for packet in frames:
+                    if self.capture:
+                        self.capture.inbound(addr, packet)
                     event = AlarmEvent.from_json(packet)
-                    print(f"[HOST] Received from {addr}: {event.type.name}")
-                    
-                    # Update heartbeat timestamp if it's a heartbeat
+                    if log.isEnabledFor(logging.DEBUG):
+                        log.debug("Received %s", event.type.name, extra=kv(addr=addr))
+
+                    # Nodes report how many stations they serve and relays how
+                    # many devices sit below them; standby hosts don't count
+                    # towards the snooze quorum.
                     if event.type == EventType.HEARTBEAT:
-                        with self.lock:
-                            if addr in self.clients:
-                                self.clients[addr]["last_heartbeat"] = time.time()
-                    
+                        hb = event.data or {}
+                        if hb.get("tenant", record.tenant) != record.tenant:
+                            if self.accept_tenant and not self.accept_tenant(hb["tenant"]):
+                                log.warning("Refusing tenant %r", hb["tenant"], extra=kv(addr=addr))
+                                raise ConnectionRefusedError("tenant refused")  # Drops the node
+                            self._set_tenant(record, hb["tenant"])
+                        if "node_id" in hb:
+                            record.node_id = hb["node_id"]
+                            if self.capture:
+                                self.capture.named(addr, record.node_id)
+                        if "zones" in hb:
+                            self.registry.set_zones(addr, tuple(hb["zones"]) or NO_ZONES)
+                        if hb.get("role") == "standby":
+                            record.role = "standby"
+                            record.weight = 0
+                            record.zone_weights = None
+                        elif "stations" in hb or "downstream" in hb:
+                            # Heartbeats without these keep the last count
+                            stations = len(hb.get("stations", ())) or 1
+                            record.weight = stations + hb.get("downstream", 0)
+                        if "zone_weights" in hb and record.role != "standby":
+                            # A relay's devices ring for different zones
+                            record.zone_weights = {**hb["zone_weights"],
+                                                   None: hb.get("zone_weight_default", record.weight)}
+                        if "heartbeat_interval" in hb:
+                            self._negotiate_heartbeat(record, hb)
+                        if hb.get("prepare") and record.prepared is None:
+                            record.prepared = 0.0  # Can prepare; hasn't yet
+                    elif event.type == EventType.ACK and "prepared" in (event.data or {}):
+                        record.prepared = event.data["prepared"]
+
                     # Delegate to event handler if provided
                     if self.event_handler:
                         self.event_handler(event, addr)
             except:
                 break
 
-        print(f"[HOST] Node disconnected {addr}")
+        if self.frozen:
+            # Leave the connection to whoever takes over
+            self.partials[addr] = bytes(reader.partial)
+            return
+        log.info("Node disconnected %s", addr)
         conn.close()
-        with self.lock:
-            if addr in self.clients:
-                del self.clients[addr]
+        self.registry.remove_many([addr])
+        if self.capture:
+            self.capture.closed(addr)
+
+    def _set_tenant(self, record: Connection, tenant):
+        """
+        Move a connection to the tenant it named. Both tenants' write locks
+        are held, so no broadcast of either is writing to its socket.
+        """
+        first, second = sorted((record.tenant, tenant))
+        with self._write_lock(first), self._write_lock(second):
+            self.registry.set_tenant(record.addr, tenant)
+        log.debug("Joined tenant %s", tenant, extra=kv(addr=record.addr))
+
+    def _write_lock(self, tenant) -> threading.Lock:
+        lock = self.write_locks.get(tenant)
+        if lock is None:
+            lock = self.write_locks.setdefault(tenant, threading.Lock())
+        return lock
+
+    def _negotiate_heartbeat(self, record: Connection, request: dict):
+        """
+        Grant a node's requested heartbeat interval and tell it with an ACK.
+
+        If the node asks for kernel keepalive and this platform supports it,
+        the host probes the connection too and allows much longer intervals,
+        since a dead link is then detected by TCP rather than by missing
+        heartbeats.
+        """
+        keepalive = False
+        if request.get("keepalive"):
+            keepalive = enable_keepalive(record.sock, idle=30, interval=10, count=3)
+        upper = self.MAX_KEEPALIVE_HEARTBEAT_INTERVAL if keepalive else self.MAX_HEARTBEAT_INTERVAL
+        interval = max(self.MIN_HEARTBEAT_INTERVAL, min(upper, request["heartbeat_interval"]))
+
+        # Allow two missed heartbeats plus slack before giving up
+        record.timeout = interval * 3 + 5
+        record.interval = interval
+        # Nodes that speed up while an alarm rings say how fast
+        ringing = request.get("ringing_heartbeat_interval")
+        record.ringing_interval = max(self.RINGING_HEARTBEAT_INTERVAL, min(interval, ringing)) if ringing else None
+        self.detector.reset(record, interval, self.clock.time())
+        self.send_to(record.addr, AlarmEvent(EventType.ACK, {
+            "heartbeat_interval": interval, "keepalive": keepalive
+        }))
+        log.debug("Granted heartbeat interval %ss", interval, extra=kv(addr=record.addr, keepalive=keepalive))
 
     def _heartbeat_monitor(self):
         """Monitor heartbeats and remove nodes that have timed out"""
         while self.running:
-            time.sleep(10)  # Check every 10 seconds
-            current_time = time.time()
-            
-            with self.lock:
-                dead_nodes = [
-                    addr for addr, info in self.clients.items()
-                    if current_time - info["last_heartbeat"] > self.HEARTBEAT_TIMEOUT
-                ]
-                
-                for addr in dead_nodes:
-                    print(f"[HOST] Node {addr} timed out (no heartbeat). Removing...")
-                    try:
-                        self.clients[addr]["conn"].close()
-                    except:
-                        pass
-                    del self.clients[addr]
+            self.clock.sleep(10)  # Check every 10 seconds
+            if self.frozen:
+                continue
+            current_time = self.clock.time()
+
+            dead_nodes = [
+                record for record in self.registry.members()
+                if current_time - record.last_heartbeat > record.timeout
+            ]
+            for record in dead_nodes:
+                log.warning("Node timed out (no heartbeat). Removing...",
+                            extra=kv(addr=record.addr, silent_for=round(current_time - record.last_heartbeat)))
+                try:
+                    record.sock.close()
+                except:
+                    pass
+            self.registry.remove_many([record.addr for record in dead_nodes])
 
     # ------------------------------
     # Sending events
     # ------------------------------
-    def broadcast(self, event: AlarmEvent):
-        msg = event.to_json() + "\n"
-        print(f"[HOST] Broadcasting: {event.type.name}")
-        with self.lock:
-            for addr, info in self.clients.items():
+    def broadcast(self, event: AlarmEvent, role="node", zone=None, tenant=DEFAULT_TENANT):
+        """
+        Send an event to every connection of a tenant with the given role.
+
+        Args:
+            event: Event to send
+            role: "node" or "standby"
+            zone: Only send to nodes in this zone (and nodes without zones);
+                  None sends to the whole tenant
+            tenant: Tenant whose nodes get the event
+        """
+        frame = event.to_frame()
+        trace_id = (event.data or {}).get("trace_id") if self.tracer else None
+        log.debug("Broadcasting %s", event.type.name)
+        # Only this tenant's lock: broadcasts to other meshes run in parallel
+        with self._write_lock(tenant):
+            members = self.registry.members(zone, tenant)
+            if self.capture:
+                self.capture.broadcast(role, frame)
+            for record in members:
+                if record.role != role:
+                    continue
+                try:
+                    record.sock.sendall(frame)
+                except:
+                    pass
+                if trace_id:
+                    self.tracer.record(trace_id, "host.send", node=record.node_id,
+                                       event=event.type.name)
+
+    def send_to(self, addr, event: AlarmEvent):
+        """Send an event to a single connection"""
+        self.send_raw(addr, event.to_frame())
+
+    def send_raw(self, addr, frame: bytes):
+        """
+        Write pre-encoded frames to a single connection.
+
+        Holds the tenant's lock like broadcast() does, so the frames can't
+        interleave with a concurrent broadcast on the same socket.
+        """
+        if not frame:
+            return
+        record = self.registry.get(addr)
+        if record is None:
+            return
+        while True:
+            tenant = record.tenant
+            with self._write_lock(tenant):
+                if record.tenant != tenant:
+                    continue  # Moved to another tenant meanwhile
+                if self.capture:
+                    self.capture.outbound(addr, frame)
                 try:
-                    info["conn"].sendall(msg.encode())
+                    record.sock.sendall(frame)
                 except:
                     pass
+                return
+
+    def prepare(self, event: AlarmEvent, zone=None, tenant=DEFAULT_TENANT) -> int:
+        """
+        Send an ALARM_PREPARE to the tenant's nodes in the zone that said they
+        can prepare; older nodes don't know the event.
+
+        Returns:
+            Number of nodes it was sent to
+        """
+        frame = event.to_frame()
+        sent = 0
+        with self._write_lock(tenant):
+            for record in self.registry.members(zone, tenant):
+                if record.role != "node" or record.prepared is None:
+                    continue
+                if self.capture:
+                    self.capture.outbound(record.addr, frame)
+                try:
+                    record.sock.sendall(frame)
+                    sent += 1
+                except:
+                    pass
+        return sent
+
+    def unprepared(self, fire_at, zone=None, tenant=DEFAULT_TENANT) -> list:
+        """Nodes that can prepare but haven't confirmed the alarm firing at fire_at"""
+        return [record for record in self.registry.members(zone, tenant)
+                if record.role == "node" and record.prepared is not None and record.prepared != fire_at]
+
+    def drop(self, addr):
+        """Close a connection, so its node reconnects"""
+        record = self.registry.get(addr)
+        if record is None:
+            return
+        try:
+            record.sock.shutdown(socket.SHUT_RDWR)  # The reader sees EOF and cleans up
+        except:
+            pass
+
+    def tenant_of(self, addr):
+        """Tenant of a connection (DEFAULT_TENANT until its node names one)"""
+        record = self.registry.get(addr)
+        return record.tenant if record else DEFAULT_TENANT
+
+    def get_connected_nodes_count(self, zone=None, tenant=DEFAULT_TENANT) -> int:
+        """
+        Get the number of connected devices, including those behind relays.
+        Nodes the failure detector suspects are dead don't count.
+
+        Args:
+            zone: Only count nodes that receive this zone's events
+            tenant: Tenant whose devices are counted
+        """
+        return sum(record.weight_in(zone) for record in self.quorum_members(zone, tenant))
 
-    def get_connected_nodes_count(self) -> int:
-        """Get the number of currently connected nodes"""
-        with self.lock:
-            return len(self.clients)
+    def quorum_members(self, zone=None, tenant=DEFAULT_TENANT) -> list:
+        """Connections counted by get_connected_nodes_count()"""
+        now = self.clock.time()
+        return [record for record in self.registry.members(zone, tenant)
+                if not self.detector.suspected(record, now)]
+
+    def zone_weights(self, tenant=DEFAULT_TENANT) -> tuple[dict, int]:
+        """
+        Connected devices per zone, for a relay to report upstream.
+        Nodes the failure detector suspects are dead don't count.
+
+        Returns:
+            ({zone: devices that ring for it} for every zone some node
+            declared, devices that ring for any other zone)
+        """
+        records = self.quorum_members(tenant=tenant)
+        zones = {zone for record in records
+                 for zone in (*record.zones, *(record.zone_weights or ()))} - {None}
+        weights = {zone: sum(record.weight_in(zone) for record in records
+                             if record.zones == NO_ZONES or zone in record.zones)
+                   for zone in zones}
+        elsewhere = sum(record.zone_weights[None] if record.zone_weights else record.weight
+                        for record in records if record.zones == NO_ZONES)
+        return weights, elsewhere
+
+    # ------------------------------
+    # Liveness
+    # ------------------------------
+    def expect_heartbeats(self, ringing: bool, zone=None, tenant=DEFAULT_TENANT):
+        """
+        Tell the failure detector what rate to expect from nodes.
+
+        While an alarm rings, nodes that advertised a ringing heartbeat
+        interval heartbeat that often (at least RINGING_HEARTBEAT_INTERVAL
+        seconds), so a dead one is suspected within seconds; afterwards they
+        go back to their granted interval. Standbys and nodes that never
+        advertised one keep their usual rate and are left alone.
+
+        Args:
+            ringing: Whether an alarm just started (True) or stopped ringing
+            zone: Zone of the ringing alarm; None for every node of the tenant
+            tenant: Tenant of the alarm
+        """
+        now = self.clock.time()
+        for record in self.registry.members(zone if ringing else None, tenant):
+            if record.ringing_interval:
+                self.detector.reset(record, record.ringing_interval if ringing else record.interval, now)
+
+    def suspicion(self, tenant=None) -> list:
+        """Connections of a tenant (None: every one) with their suspicion level (phi)"""
+        now = self.clock.time()
+        nodes = []
+        for record in self.registry.members(tenant=tenant):
+            phi = self.detector.phi(record, now)
+            nodes.append({
+                "node_id": record.node_id,
+                "tenant": record.tenant,
+                "role": record.role,
+                "weight": record.weight,
+                "silent_for": round(now - record.last_heartbeat, 3),
+                "phi": round(phi, 2) if phi != float("inf") else None,
+                "suspected": phi > self.detector.threshold,
+                "prepared": record.prepared,
+            })
+        return nodes
+
+    # ------------------------------
+    # Live upgrade
+    # ------------------------------
+    def freeze(self):
+        """
+        Stop accepting and reading for a handoff, leaving every socket open.
+
+        Returns once every receive loop has stopped, so no data is read that
+        the next process won't see. Unfinished frames are kept in partials.
+        Writes (broadcasts) still work.
+
+        Raises:
+            RuntimeError if a transport's connections can't be handed off;
+            nothing is frozen then
+        """
+        stuck = [str(t) for t in self.transports if not t.handoff]
+        if stuck:
+            raise RuntimeError(f"can't hand off {', '.join(stuck)} connections")
+        self.frozen = True
+        os.write(self.wakeup_w, b"x")
+        with self.pending_cond:
+            self.pending_cond.notify_all()
+        for thread in self.loops:
+            thread.join()
+        # Accepted but not yet registered: register them without a reader
+        batch, self.pending = self.pending, []
+        if batch:
+            self._register(batch)
+        with self.readers_cond:
+            self.readers_cond.wait_for(lambda: self.readers == 0)
+        log.info("Frozen with %d connection(s)", len(self.registry))
+
+    def resume(self):
+        """Undo freeze() after a handoff that didn't happen"""
+        os.read(self.wakeup_r, 1)
+        self.frozen = False
+        for record in self.registry.members():
+            self._start_reader(record, self.partials.pop(record.addr, b""))
+        self._start_loops()
+        log.info("Resumed")
+
+    def export_listeners(self) -> list:
+        """The listening sockets, in transport order, for adopt()"""
+        return [listener.sock for listener in self.listeners]
+
+    def export_connections(self) -> list:
+        """
+        The frozen node connections with what is known about each.
+
+        Returns:
+            List of (socket, metadata dict) for adopt()
+        """
+        return [(record.sock, {
+            "addr": list(record.addr),
+            "last_heartbeat": record.last_heartbeat,
+            "timeout": record.timeout,
+            "interval": record.interval,
+            "ringing_interval": record.ringing_interval,
+            "hb_mean": record.hb_mean,
+            "hb_var": record.hb_var,
+            "weight": record.weight,
+            "role": record.role,
+            "node_id": record.node_id,
+            "zones": list(record.zones),
+            "tenant": record.tenant,
+            "prepared": record.prepared,
+            "zone_weights": list(record.zone_weights.items()) if record.zone_weights else None,
+            "partial": self.partials.get(record.addr, b"").decode("latin-1"),
+        }) for record in self.registry.members()]
+
+    def adopt(self, listeners, connections):
+        """
+        Serve listening sockets and node connections handed over by another
+        process (see export_listeners() and export_connections()), without
+        the nodes reconnecting. The listeners must be for the same transports
+        as this host's, in the same order.
+        """
+        if len(listeners) != len(self.transports):
+            raise ValueError(f"got {len(listeners)} listener(s) for {len(self.transports)} transport(s)")
+        self.running = True
+        self.listeners = [transport.adopt(sock) for transport, sock in zip(self.transports, listeners)]
+        records = []
+        for sock, meta in connections:
+            addr = tuple(meta["addr"])
+            record = Connection(sock, addr, meta["last_heartbeat"], meta["timeout"])
+            record.interval = meta["interval"]
+            record.ringing_interval = meta.get("ringing_interval")
+            record.hb_mean = meta["hb_mean"]
+            record.hb_var = meta["hb_var"]
+            record.weight = meta["weight"]
+            record.role = meta["role"]
+            record.node_id = meta["node_id"]
+            record.zones = tuple(meta["zones"])
+            record.tenant = meta.get("tenant", DEFAULT_TENANT)
+            record.prepared = meta.get("prepared")
+            if meta.get("zone_weights"):
+                record.zone_weights = dict(map(tuple, meta["zone_weights"]))
+            records.append(record)
+        self.registry.add_many(records)
+        for record, (_, meta) in zip(records, connections):
+            self._start_reader(record, meta["partial"].encode("latin-1"))
+        self._start_loops()
+        threading.Thread(target=self._heartbeat_monitor, daemon=True).start()
+        log.info("Adopted %d listener(s) and %d connection(s)", len(self.listeners), len(records))
+
+    def release(self):
+        """
+        Let go of everything after a handoff.
+
+        Only this process's descriptors are closed; the sockets themselves
+        live on in the process that took over, so nodes see nothing.
+        """
+        self.running = False
+        self._stop_advertising()
+        for record in self.registry.members():
+            record.sock.close()
+        for listener in self.listeners:
+            listener.close()
 
     # ------------------------------
     # Control
     # ------------------------------
     def start(self):
         self.running = True
+        self.start_server()
         self.start_advertising()
-        self.start_tcp_server()
+
+    def _stop_advertising(self):
+        if self.zeroconf is None:
+            return
+        if self.service_info:
+            self.zeroconf.unregister_service(self.service_info)
+        self.zeroconf.close()
 
     def stop(self):
-        print("[HOST] Stopping host...")
+        log.info("Stopping host...")
         self.running = False
-        self.zeroconf.unregister_service(self.service_info)
-        self.zeroconf.close()
-        with self.lock:
-            for addr, info in self.clients.items():
-                try:
-                    info["conn"].close()
-                except:
-                    pass
-        try:
-            self.sock.close()
-        except:
-            pass
+        self._stop_advertising()
+        for record in self.registry.members():
+            try:
+                record.sock.close()
+            except:
+                pass
+        with self.pending_cond:
+            self.pending_cond.notify_all()
+        for listener in self.listeners:
+            try:
+                listener.shutdown(socket.SHUT_RDWR)  # Wakes the accept loop
+            except:
+                pass
+            try:
+                listener.close()
+            except:
+                pass
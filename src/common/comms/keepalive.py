@@ -0,0 +1,38 @@
+import socket
+
+
+def enable_keepalive(sock, idle=30, interval=10, count=3, user_timeout=None) -> bool:
+    """
+    Let the kernel watch a TCP connection's liveness.
+
+    With keepalive probing, a dead peer is detected after roughly
+    idle + interval * count seconds of silence without any application
+    heartbeats. TCP_USER_TIMEOUT additionally bounds how long unacknowledged
+    sends may linger before the connection is dropped.
+
+    Args:
+        sock: Connected TCP socket
+        idle: Seconds of silence before the first probe
+        interval: Seconds between probes
+        count: Unanswered probes before the connection is dropped
+        user_timeout: Optional seconds for TCP_USER_TIMEOUT
+
+    Returns:
+        True if probing is fully configured or the socket is a Unix-domain
+        one, False if the platform lacks the needed options (the caller
+        should keep application heartbeats)
+    """
+    if getattr(sock, "family", None) == socket.AF_UNIX:
+        return True  # The peer's kernel closes its end if it dies; no probing needed
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        options = [("TCP_KEEPIDLE", idle), ("TCP_KEEPINTVL", interval), ("TCP_KEEPCNT", count)]
+        if not all(hasattr(socket, name) for name, _ in options):
+            return False
+        for name, value in options:
+            sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), int(value))
+        if user_timeout and hasattr(socket, "TCP_USER_TIMEOUT"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_USER_TIMEOUT, int(user_timeout * 1000))
+        return True
+    except OSError:
+        return False
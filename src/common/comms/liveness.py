@@ -0,0 +1,63 @@
+import math
+
+
+class PhiAccrualDetector:
+    """
+    Phi-accrual failure detector over the traffic of each node connection.
+
+    Instead of a fixed timeout, each connection keeps an exponentially
+    weighted mean and variance of the gaps between frames from its node.
+    Phi is how unlikely the current silence is under that distribution:
+    phi = -log10(P(a gap at least this long)), so phi 8 means a one in
+    10^8 chance the node is merely late. A node on flaky Wi-Fi builds up a
+    wider distribution and gets more slack than one that is always on time.
+
+    The statistics live on the Connection records (see registry.py); this
+    class only holds the tuning and the maths.
+    """
+
+    THRESHOLD = 8.0       # Phi above which a node is suspected dead
+    ALPHA = 0.1           # Weight of the newest gap in the running statistics
+    MIN_STD = 0.2         # Floor on the standard deviation, in seconds
+    ACCEPTABLE_PAUSE = 0.5  # Extra seconds of silence tolerated on top of the mean
+
+    def __init__(self, threshold=THRESHOLD, alpha=ALPHA, min_std=MIN_STD,
+                 acceptable_pause=ACCEPTABLE_PAUSE):
+        self.threshold = threshold
+        self.alpha = alpha
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+
+    def reset(self, record, interval: float, now: float):
+        """
+        Expect frames every `interval` seconds from now on, forgetting what
+        was learned about the old rate.
+        """
+        record.hb_mean = interval
+        record.hb_var = (interval / 4) ** 2
+        record.expect_from = now
+
+    def heartbeat(self, record, now: float):
+        """Fold the gap since the previous frame into the statistics"""
+        gap = now - max(record.last_heartbeat, record.expect_from)
+        if gap < record.hb_mean * 0.1:
+            return  # Part of a burst (e.g. an ACK right after a heartbeat)
+        diff = gap - record.hb_mean
+        increment = self.alpha * diff
+        record.hb_mean += increment
+        record.hb_var = (1 - self.alpha) * (record.hb_var + diff * increment)
+
+    def phi(self, record, now: float) -> float:
+        """Suspicion level of a node: 0 while on time, rising with silence"""
+        silence = now - max(record.last_heartbeat, record.expect_from)
+        mean = record.hb_mean + self.acceptable_pause
+        if silence <= mean:
+            return 0.0
+        std = max(math.sqrt(record.hb_var), self.min_std)
+        later = 0.5 * math.erfc((silence - mean) / (std * math.sqrt(2)))
+        return -math.log10(later) if later > 0 else math.inf
+
+    def suspected(self, record, now: float) -> bool:
+        if now - max(record.last_heartbeat, record.expect_from) <= record.hb_mean + self.acceptable_pause:
+            return False  # Common case, without the maths
+        return self.phi(record, now) > self.threshold
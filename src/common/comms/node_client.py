@@ -1,74 +1,311 @@
 from zeroconf import ServiceBrowser, ServiceStateChange, Zeroconf
-import socket
 import json
-from common.comms.protocol import AlarmEvent, EventType
+import random
+import threading
+from common.clock import SYSTEM_CLOCK
+from common.comms.keepalive import enable_keepalive
+from common.comms.protocol import DEFAULT_TENANT, AlarmEvent, EventType
+from common.comms.transport import TcpTransport
+from common.log import get_logger
+
+log = get_logger("NODE")
 
 class AlarmNode:
-    def __init__(self):
-        self.zeroconf = Zeroconf()
+    CONNECT_TIMEOUT = 2  # Seconds before giving up on an unreachable host
+    HEARTBEAT_INTERVAL = 10            # Used until the host grants an interval
+    REQUESTED_HEARTBEAT_INTERVAL = 300  # Asked for; the host clamps it
+    RINGING_HEARTBEAT_INTERVAL = 1      # While an alarm rings, so the host notices a dead node fast
+
+    def __init__(self, service_filter=None, keepalive=True, clock=SYSTEM_CLOCK, transport=None,
+                 tenant=DEFAULT_TENANT):
+        """
+        Args:
+            service_filter: Optional function taking (name, properties) that
+                            returns False for advertised services this node
+                            must not connect to (e.g. a relay's own service).
+                            Properties are decoded to a str -> str dict.
+            keepalive: Let TCP keepalive watch the host connection so
+                       application heartbeats can be sent far less often
+            clock: Time source for heartbeat and back-off bookkeeping
+            transport: How to reach the host (see transport.py); defaults to
+                       TCP to a host found through Zeroconf. Other transports
+                       connect straight to their fixed address.
+            tenant: Mesh to join on a host serving several
+        """
+        self.clock = clock
+        self.tenant = tenant
+        self.transport = transport or TcpTransport()
+        self.zeroconf = Zeroconf() if self.transport.discoverable else None
         self.browser = None
+        self.host_name = None
         self.host_ip = None
         self.host_port = None
+        self.host_role = None
+        self.host_depth = 0  # Hops from the root host (0 = connected to the host itself)
+        self.services = {}   # {service name: (ip, port, properties)} seen via Zeroconf
+        self.retry_at = 0    # Don't connect before this time (host asked us to back off)
+        self.keepalive = keepalive
+        self.keepalive_active = False
+        self.heartbeat_interval = self.HEARTBEAT_INTERVAL
+        self.last_sent = 0
+        self.last_received = 0
+        self.state_epoch = None  # Host state lineage and version this node is at
+        self.state_version = 0
+        self.lock = threading.Lock()
+        self.service_filter = service_filter
         self.socket = None
         self.connected = False
+        self.connected_event = threading.Event()  # Set while connected
         self.alarm_triggered = False  # Track if alarm is currently triggered
         self.event_handler = None  # Callback for handling received events
-        print("[NODE] Initialized")
+        self.wakeup = threading.Event()  # Set when the node's owner should look at it again
+        log.info("Initialized")
 
     def start_discovery(self):
         """Start discovering the host via Zeroconf"""
+        if not self.transport.discoverable:
+            # Nothing to discover: the one known host is what reconnect() retries
+            service = (None, None, {"role": "host"})
+            with self.lock:
+                self.services[str(self.transport)] = service
+            log.info("Connecting to host at %s", self.transport)
+            self._connect_to_service(str(self.transport), service)
+            return
         self.browser = ServiceBrowser(
             self.zeroconf,
             "_alarmhost._tcp.local.",
             handlers=[self._on_service_state_change]
         )
-        print("[NODE] Searching for host...")
+        log.info("Searching for host...")
 
     def _on_service_state_change(self, zeroconf, service_type, name, state_change):
-        print(f"[DEBUG] Zeroconf change: {name} -> {state_change}")
+        log.debug("Zeroconf change: %s -> %s", name, state_change)
 
-        # Host appeared
+        # Host (or relay) appeared
         if state_change == ServiceStateChange.Added:
             info = zeroconf.get_service_info(service_type, name)
-            if info:
-                self.host_ip = self._decode_ip(info)
-                self.host_port = info.port
-                print(f"[NODE] Found host at {self.host_ip}:{self.host_port}")
-                self._connect_to_host()
+            if not info:
+                return
+            properties = self._decode_properties(info)
+            if properties.get("role") == "standby":
+                return  # Standby hosts aren't serving nodes
+            if self.service_filter and not self.service_filter(name, properties):
+                log.debug("Skipping service %s", name)
+                return
+            service = (self._decode_ip(info), info.port, properties)
+            with self.lock:
+                self.services[name] = service
+                # A newly announced host replaces one we're attached to: it
+                # was elected after the previous host failed.
+                superseded = (self.connected and name != self.host_name
+                              and properties.get("role") == "host"
+                              and self.host_role == "host")
+                if self.connected and not superseded:
+                    return  # Already attached to the mesh
+            if superseded:
+                log.warning("New host %s announced, switching over", name)
+                self.disconnect()
+            log.info("Found host at %s:%s", service[0], service[1])
+            self._connect_to_service(name, service)
 
         # Host disappeared
         elif state_change == ServiceStateChange.Removed:
-            print("[NODE] Host disappeared.")
-            self.host_ip = None
-            self.host_port = None
-            self.connected = False
+            with self.lock:
+                self.services.pop(name, None)
+            if name != self.host_name:
+                return  # Some other host or relay went away
+            # A live connection outlasts the advertisement, e.g. while a new
+            # host process takes it over during an upgrade. If the host
+            # really went away, the reader sees the socket close or time out.
+            log.warning("Host stopped advertising; keeping the connection while it lasts")
 
     def _decode_ip(self, info):
         return ".".join(str(b) for b in info.addresses[0])
 
+    def _decode_properties(self, info) -> dict:
+        return {
+            k.decode(): (v.decode() if v is not None else "")
+            for k, v in (info.properties or {}).items()
+        }
+
+    def _connect_to_service(self, name, service) -> bool:
+        ip, port, properties = service
+        with self.lock:
+            if self.connected:
+                return True
+            if self.clock.time() < self.retry_at:
+                return False
+            self.host_name = name
+            self.host_ip = ip
+            self.host_port = port
+            self.host_role = properties.get("role", "host")
+            self.host_depth = int(properties.get("depth", 0))
+            self._connect_to_host()
+            return self.connected
+
     def _connect_to_host(self):
-        """Connect to the host via TCP"""
+        """Connect to the host over the node's transport"""
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host_ip, self.host_port))
+            self.socket = self.transport.connect((self.host_ip, self.host_port),
+                                                 timeout=self.CONNECT_TIMEOUT)
+            # Takes on TCP and Unix sockets; otherwise application heartbeats stay frequent
+            self.keepalive_active = self.keepalive and enable_keepalive(
+                self.socket, idle=30, interval=10, count=3, user_timeout=30
+            )
+            self.heartbeat_interval = self.HEARTBEAT_INTERVAL
+            self.last_sent = self.last_received = self.clock.time()
             self.connected = True
-            print(f"[NODE] Connected to host at {self.host_ip}:{self.host_port}")
+            self.connected_event.set()
+            log.info("Connected to host at %s", f"{self.host_ip}:{self.host_port}"
+                     if self.transport.discoverable else self.transport)
         except Exception as e:
-            print(f"[NODE] Failed to connect to host: {e}")
+            log.error("Failed to connect to host: %s", e)
             self.connected = False
+            self.connected_event.clear()
+
+    def wait_connected(self, timeout=None) -> bool:
+        """Block until connected to a host (or the timeout passes)"""
+        return self.connected_event.wait(timeout)
+
+    def reconnect(self) -> bool:
+        """
+        Try every known host or relay, the root host first, until one accepts.
+
+        Returns:
+            True if the node is connected afterwards
+        """
+        with self.lock:
+            if self.connected:
+                return True
+            candidates = sorted(
+                self.services.items(),
+                key=lambda item: (item[1][2].get("role") != "host",
+                                  int(item[1][2].get("depth", 0)))
+            )
+        for name, service in candidates:
+            if self._connect_to_service(name, service):
+                return True
+        return False
+
+    def defer_reconnect(self, seconds: float):
+        """
+        Back off after the host answered with RETRY_AFTER.
+
+        Adds up to 20% random jitter so nodes told the same delay don't
+        all come back in the same instant.
+        """
+        self.retry_at = self.clock.time() + seconds * (1 + random.uniform(0, 0.2))
+        log.info("Host busy, retrying in %.1fs", seconds)
+        self.disconnect()
+
+    def disconnect(self, sock=None):
+        """
+        Drop the connection to the host.
+
+        Args:
+            sock: If given, only disconnect if this is still the current
+                  socket, so a reader that noticed its socket die can't
+                  tear down a newer connection.
+        """
+        with self.lock:
+            if sock is not None and sock is not self.socket:
+                return
+            self.connected = False
+            self.connected_event.clear()
+            self.wakeup.set()
+            if self.socket:
+                try:
+                    self.socket.close()
+                except:
+                    pass
 
     def send(self, event: AlarmEvent):
         """Send an alarm event to the host"""
         if not self.connected or self.socket is None:
-            print("[NODE] Not connected to host, cannot send event")
+            log.warning("Not connected to host, cannot send event")
             return
+        sock = self.socket
         try:
             message = event.to_json()
-            self.socket.sendall((message + "\n").encode())
-            print(f"[NODE] Sent event: {event.type.name}")
+            sock.sendall((message + "\n").encode())
+            self.last_sent = self.clock.time()
+            log.debug("Sent event: %s", event.type.name)
         except Exception as e:
-            print(f"[NODE] Failed to send event: {e}")
-            self.connected = False
+            log.error("Failed to send event: %s", e)
+            self.disconnect(sock)
+
+    def mark_received(self):
+        """Record that data just arrived from the host"""
+        self.last_received = self.clock.time()
+
+    def heartbeat_request(self) -> dict:
+        """
+        Heartbeat fields asking the host for a heartbeat interval, and
+        telling it how often heartbeats come while an alarm rings
+        """
+        return {
+            "heartbeat_interval": self.REQUESTED_HEARTBEAT_INTERVAL,
+            "ringing_heartbeat_interval": self.RINGING_HEARTBEAT_INTERVAL,
+            "keepalive": self.keepalive_active,
+        }
+
+    def apply_heartbeat_grant(self, grant: dict):
+        """Adopt the heartbeat interval from the host's ACK"""
+        self.heartbeat_interval = grant["heartbeat_interval"]
+        log.debug("Heartbeat interval %ss (keepalive: %s)",
+                  self.heartbeat_interval, grant.get("keepalive"))
+
+    def heartbeat_wait(self) -> float:
+        """
+        Seconds until a heartbeat is due; 0 or less if it is due now.
+
+        Counted from the last frame sent, since any frame proves to the host
+        that the node is alive. While an alarm rings the host's snooze
+        quorum depends on knowing who is still there, so heartbeats go out
+        every RINGING_HEARTBEAT_INTERVAL seconds.
+        """
+        interval = self.RINGING_HEARTBEAT_INTERVAL if self.alarm_triggered else self.heartbeat_interval
+        return self.last_sent + interval - self.clock.time()
+
+    def heartbeat_due(self) -> bool:
+        """Whether a heartbeat should be sent now"""
+        return self.heartbeat_wait() <= 0
+
+    def accept_state_event(self, event: AlarmEvent) -> bool:
+        """
+        Track the host's state version and filter out stale events.
+
+        Events carry the "epoch" and "version" of the host state they produce.
+        Within an epoch, an event at or below the version already applied is
+        a duplicate (e.g. a broadcast that raced the catch-up sent on
+        connect) and is dropped. Snapshots are applied unless they are older
+        than what the node already has; a new epoch always starts over.
+        State events of another tenant are dropped too.
+
+        Returns:
+            False if the event should be ignored
+        """
+        data = event.data or {}
+        if "version" not in data:
+            return True
+        if data.get("tenant", DEFAULT_TENANT) != self.tenant:
+            return False  # State of another mesh
+        if data.get("epoch") == self.state_epoch:
+            if data.get("snapshot"):
+                if data["version"] < self.state_version:
+                    return False
+            elif data["version"] <= self.state_version:
+                return False
+        self.state_epoch = data.get("epoch")
+        self.state_version = data["version"]
+        return True
+
+    def sync_request(self) -> dict:
+        """Hello fields telling the host which mesh this node is in and which state it already has"""
+        request = {"epoch": self.state_epoch, "version": self.state_version}
+        if self.tenant != DEFAULT_TENANT:
+            request["tenant"] = self.tenant
+        return request
 
     def set_event_handler(self, handler):
         """Set callback for handling received events"""
@@ -90,4 +327,5 @@ class AlarmNode:
         if self.zeroconf:
             self.zeroconf.close()
         self.connected = False
-        print("[NODE] Stopped")
+        self.connected_event.clear()
+        log.info("Stopped")
@@ -2,7 +2,9 @@ from dataclasses import dataclass, asdict, field
 import json
 import time
 from enum import Enum, auto
-from typing import Any
+from typing import Any, Optional
+
+DEFAULT_TENANT = "default"  # Mesh of nodes that don't name one; events of other meshes carry data["tenant"]
 
 class EventType(Enum):
     ALARM_SET = auto()
@@ -11,6 +13,9 @@ class EventType(Enum):
     HEARTBEAT = auto()
     SNOOZE_PRESSED = auto()
     ACK = auto()
+    STATE_SYNC = auto()  # Full AlarmManager state, sent from the active host to standbys
+    RETRY_AFTER = auto()  # Host is busy admitting nodes; reconnect after data["retry_after"] seconds
+    ALARM_PREPARE = auto()  # Alarm fires at data["fire_at"]; nodes arm their outputs and ACK "prepared"
 
 @dataclass
 class Alarm:
@@ -18,6 +23,7 @@ class Alarm:
     hours: int  # 1-12
     minutes: int  # 0-59
     is_pm: bool = False  # True for PM, False for AM
+    zone: Optional[str] = None  # Only nodes in this zone ring; None rings everyone
 
     def __post_init__(self):
         """Validate alarm time"""
@@ -27,16 +33,24 @@ class Alarm:
             raise ValueError(f"Minutes must be 0-59, got {self.minutes}")
 
     def to_dict(self) -> dict:
-        return {"hours": self.hours, "minutes": self.minutes, "is_pm": self.is_pm}
+        return {"hours": self.hours, "minutes": self.minutes, "is_pm": self.is_pm, "zone": self.zone}
 
     @staticmethod
     def from_dict(data: dict) -> "Alarm":
         return Alarm(
             hours=data["hours"],
             minutes=data["minutes"],
-            is_pm=data.get("is_pm", False)
+            is_pm=data.get("is_pm", False),
+            zone=data.get("zone")
         )
 
+    @staticmethod
+    def from_24hr(hour: int, minute: int, zone: Optional[str] = None) -> "Alarm":
+        """Build an alarm from a 24-hour time (0-23, 0-59)"""
+        if not (0 <= hour <= 23):
+            raise ValueError(f"Hour must be 0-23, got {hour}")
+        return Alarm(hours=hour % 12 or 12, minutes=minute, is_pm=hour >= 12, zone=zone)
+
     def get_24hr_time(self) -> tuple[int, int]:
         """Convert 12-hour format to 24-hour format. Returns (hour_24, minutes)"""
         # 12:xx AM = 00:xx (midnight hour)
@@ -92,6 +106,10 @@ class AlarmEvent:
         payload["type"] = self.type.value
         return json.dumps(payload)
 
+    def to_frame(self) -> bytes:
+        """Encode as a newline-terminated wire frame"""
+        return (self.to_json() + "\n").encode()
+
     @staticmethod
     def from_json(data: str) -> "AlarmEvent":
         raw = json.loads(data)
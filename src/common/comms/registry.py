@@ -0,0 +1,169 @@
+import threading
+from common.comms.protocol import DEFAULT_TENANT
+
+NO_ZONES = (None,)  # Zones of a node that declared none: it receives every zone
+
+
+class Connection:
+    """One node connection registered on the host"""
+
+    __slots__ = ("sock", "addr", "last_heartbeat", "timeout", "weight", "role", "node_id", "zones",
+                 "interval", "ringing_interval", "hb_mean", "hb_var", "expect_from", "tenant", "prepared",
+                 "zone_weights")
+
+    DEFAULT_INTERVAL = 10  # Heartbeat interval nodes use until one is granted
+
+    def __init__(self, sock, addr, now, timeout):
+        self.sock = sock
+        self.addr = addr
+        self.last_heartbeat = now  # When anything was last received
+        self.timeout = timeout     # Silence allowed before the node is dropped
+        self.interval = self.DEFAULT_INTERVAL  # Granted heartbeat interval
+        self.ringing_interval = None  # Interval while an alarm rings; None if the node keeps its own
+        # Gap statistics for the failure detector (see liveness.py)
+        self.hb_mean = self.interval
+        self.hb_var = (self.interval / 4) ** 2
+        self.expect_from = now     # Gaps are measured from no earlier than this
+        self.weight = 1            # Devices counted in the snooze quorum
+        self.role = "node"         # "node" or "standby"
+        self.node_id = f"{addr[0]}:{addr[1]}"  # What the node calls itself, once it says
+        self.zones = NO_ZONES
+        self.tenant = DEFAULT_TENANT  # Mesh the node belongs to, once it says
+        self.prepared = None  # Fire time the node last armed for; None if it can't prepare
+        # Relays only: {zone: devices below that ring for it}, None for any
+        # zone not listed. Without it, weight counts in every zone.
+        self.zone_weights = None
+
+    def weight_in(self, zone) -> int:
+        """Devices behind this connection that ring for a zone (None: the whole tenant)"""
+        if zone is None or self.zone_weights is None:
+            return self.weight
+        return self.zone_weights.get(zone, self.zone_weights[None])
+
+
+class ConnectionRegistry:
+    """
+    addr -> Connection map with copy-on-write snapshots.
+
+    Writers (admission, removal, zone and tenant changes) take the lock,
+    build new dicts and publish them with a single assignment; published
+    dicts are never mutated. Readers such as broadcasts and quorum counts use
+    whatever snapshot is current without locking, so they never wait on a
+    writer. Per-connection fields like last_heartbeat and weight are updated
+    in place on the Connection, which needs no copy.
+
+    Connections are indexed by tenant, and within a tenant by zone, so a
+    broadcast or quorum count for one mesh only touches that mesh's nodes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()  # Serializes writers only
+        # (connections, zones, tenants): {addr: Connection},
+        # {(tenant, zone): frozenset of addrs} with zone None for nodes in
+        # every zone, and {tenant: frozenset of addrs}
+        self._state = ({}, {}, {})
+
+    # ------------------------------
+    # Readers (lock-free)
+    # ------------------------------
+    def snapshot(self) -> dict:
+        return self._state[0]
+
+    def get(self, addr):
+        return self._state[0].get(addr)
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def tenants(self) -> list:
+        """Tenants with at least one connection"""
+        return list(self._state[2])
+
+    def members(self, zone=None, tenant=None) -> list:
+        """
+        Connections that receive events for a zone of a tenant.
+
+        Args:
+            zone: Zone of the event; None for the whole tenant
+            tenant: Tenant of the event; None with no zone for every
+                    connection, None with a zone for DEFAULT_TENANT
+        """
+        connections, zones, tenants = self._state
+        if tenant is None:
+            if zone is None:
+                return list(connections.values())
+            tenant = DEFAULT_TENANT
+        if zone is None:
+            addrs = tenants.get(tenant, frozenset())
+        else:
+            addrs = zones.get((tenant, zone), frozenset()) | zones.get((tenant, None), frozenset())
+        return [connections[addr] for addr in addrs if addr in connections]
+
+    def weight(self, zone=None, tenant=None) -> int:
+        """Devices behind the connections that receive events for a zone"""
+        if zone is None and tenant is None:
+            return sum(record.weight for record in self._state[0].values())
+        return sum(record.weight_in(zone) for record in self.members(zone, tenant))
+
+    # ------------------------------
+    # Writers
+    # ------------------------------
+    @staticmethod
+    def _index(zones, tenants, record, add: bool):
+        """Add a record to (or drop it from) copies of the zone and tenant indexes"""
+        keys = [(zones, (record.tenant, zone)) for zone in record.zones]
+        keys.append((tenants, record.tenant))
+        for index, key in keys:
+            members = index.get(key, frozenset())
+            members = members | {record.addr} if add else members - {record.addr}
+            if members:
+                index[key] = members
+            else:
+                index.pop(key, None)
+
+    def add_many(self, records):
+        with self.lock:
+            connections, zones, tenants = self._state
+            connections, zones, tenants = dict(connections), dict(zones), dict(tenants)
+            for record in records:
+                connections[record.addr] = record
+                self._index(zones, tenants, record, add=True)
+            self._state = (connections, zones, tenants)
+
+    def remove_many(self, addrs) -> list:
+        """Unregister connections; returns the records that were registered"""
+        with self.lock:
+            connections, zones, tenants = self._state
+            removed = [connections[addr] for addr in addrs if addr in connections]
+            if not removed:
+                return []
+            connections, zones, tenants = dict(connections), dict(zones), dict(tenants)
+            for record in removed:
+                del connections[record.addr]
+                self._index(zones, tenants, record, add=False)
+            self._state = (connections, zones, tenants)
+            return removed
+
+    def set_zones(self, addr, new_zones: tuple):
+        """Move a connection to the given zones (NO_ZONES for every zone)"""
+        self._move(addr, zones=new_zones)
+
+    def set_tenant(self, addr, tenant):
+        """Move a connection to another tenant, keeping its zones"""
+        self._move(addr, tenant=tenant)
+
+    def _move(self, addr, zones=None, tenant=None):
+        with self.lock:
+            connections, zone_index, tenants = self._state
+            record = connections.get(addr)
+            if record is None:
+                return
+            zones = zones if zones is not None else record.zones
+            tenant = tenant if tenant is not None else record.tenant
+            if (zones, tenant) == (record.zones, record.tenant):
+                return
+            zone_index, tenants = dict(zone_index), dict(tenants)
+            self._index(zone_index, tenants, record, add=False)
+            record.zones, record.tenant = zones, tenant
+            self._index(zone_index, tenants, record, add=True)
+            self._state = (connections, zone_index, tenants)
@@ -0,0 +1,230 @@
+import socket
+import threading
+from common.clock import SYSTEM_CLOCK
+from common.comms.host_server import AlarmHost
+from common.comms.node_client import AlarmNode
+from common.comms.protocol import DEFAULT_TENANT, AlarmEvent, EventType
+from common.log import get_logger
+
+log = get_logger("RELAY")
+
+
+class AlarmRelay:
+    """
+    Lets a node also serve as a host for downstream nodes.
+
+    Alarm events received from upstream are forwarded down the tree, while
+    downstream snoozes and liveness are folded into summaries sent upstream:
+    snoozes are batched into one SNOOZE_PRESSED with a "count", and the
+    relay's own heartbeats report how many devices sit below it, per zone.
+    The upstream host therefore keeps one connection per relay instead of
+    one per node, and counts each device only in its own zones' quorum.
+
+    A relay only advertises itself once it is attached upstream, and drops
+    its downstream nodes if it loses that link, so the tree can't form cycles.
+    """
+
+    SERVICE_NAME_FORMAT = "AlarmRelay-{}._alarmhost._tcp.local."
+    SUMMARY_INTERVAL = 0.2  # Seconds to batch downstream snoozes before sending upstream
+    MAX_DEPTH = 4           # Don't attach below a relay this deep in the tree
+
+    FORWARDED_EVENTS = (EventType.ALARM_SET, EventType.ALARM_PREPARE, EventType.ALARM_TRIGGERED,
+                        EventType.ALARM_CLEARED)
+
+    def __init__(self, port=5002, relay_id=None, upstream=None, tenant=DEFAULT_TENANT,
+                 clock=SYSTEM_CLOCK, stations=(), zones=()):
+        """
+        Args:
+            port: Port to serve downstream nodes on
+            relay_id: Name of this relay; defaults to the hostname
+            upstream: Transport to reach the upstream host; Zeroconf if None
+            tenant: Tenant this relay and its downstream nodes belong to
+            clock: Time source for the relay, its upstream link and downstream host
+            stations: IDs of the relay's own stations, reported in every heartbeat
+            zones: Zones the relay's own stations ring for; empty for every zone
+        """
+        self.port = port
+        self.clock = clock
+        self.relay_id = relay_id or socket.gethostname()
+        self.stations = list(stations)
+        self.zones = list(zones)
+        self.service_name = self.SERVICE_NAME_FORMAT.format(self.relay_id)
+        self.node = AlarmNode(service_filter=self._accept_upstream, transport=upstream,
+                              tenant=tenant, clock=clock)
+        self.downstream = self._make_downstream()
+        self.lock = threading.Lock()
+        self.pending_snoozes = 0
+        self.pending_origins = []  # [node_id, station] of each pending snooze, for the host's history
+        self.snoozed = set()  # (addr, station) already counted for the ringing alarm
+        self.reported = None  # Membership last reported upstream
+        self.last_alarm_set = None   # Last ALARM_SET seen from upstream, replayed to joiners
+        self.alarm_triggered = False
+        self.running = False
+
+    def _make_downstream(self) -> AlarmHost:
+        return AlarmHost(
+            port=self.port,
+            event_handler=self._on_downstream_event,
+            on_node_connected=self._on_downstream_connected,
+            service_name=self.service_name,
+            clock=self.clock,
+            accept_tenant=lambda tenant: tenant == self.node.tenant,
+        )
+
+    def _accept_upstream(self, name, properties) -> bool:
+        if name == self.service_name:
+            return False
+        return int(properties.get("depth", 0)) < self.MAX_DEPTH
+
+    # ------------------------------
+    # Upstream -> downstream
+    # ------------------------------
+    def forward(self, event: AlarmEvent):
+        """Forward an event received from upstream to every downstream node"""
+        if event.type not in self.FORWARDED_EVENTS:
+            return
+        with self.lock:
+            if event.type == EventType.ALARM_SET:
+                self.last_alarm_set = event
+                self.alarm_triggered = False
+            elif event.type == EventType.ALARM_TRIGGERED:
+                self.alarm_triggered = True
+                self.pending_snoozes = 0
+                self.pending_origins = []
+                self.snoozed.clear()
+            elif event.type == EventType.ALARM_CLEARED:
+                self.last_alarm_set = None
+                self.alarm_triggered = False
+                self.pending_snoozes = 0
+                self.pending_origins = []
+        if not self.downstream.running:
+            return
+        if event.type == EventType.ALARM_PREPARE:
+            self.downstream.prepare(event, tenant=self.node.tenant)  # Only to nodes that know it
+        else:
+            self.downstream.broadcast(event, tenant=self.node.tenant)
+
+    def _on_downstream_connected(self, addr, conn):
+        """Bring a newly attached node up to date with the upstream state"""
+        with self.lock:
+            alarm_set = self.last_alarm_set
+            triggered = self.alarm_triggered
+        # Marked as a snapshot so the node applies it whatever it saw before
+        data = {"epoch": self.node.state_epoch, "version": self.node.state_version, "snapshot": True}
+        if self.node.tenant != DEFAULT_TENANT:
+            data["tenant"] = self.node.tenant
+        try:
+            if alarm_set:
+                data["alarm"] = alarm_set.data.get("alarm")
+                data["zone"] = alarm_set.data.get("zone")  # Nodes in other zones ignore it
+                frame = AlarmEvent(EventType.ALARM_SET, data).to_frame()
+                if triggered:
+                    frame += AlarmEvent(EventType.ALARM_TRIGGERED, data).to_frame()
+            else:
+                frame = AlarmEvent(EventType.ALARM_CLEARED, data).to_frame()
+            conn.sendall(frame)
+        except Exception as e:
+            log.error("Failed to sync downstream node %s: %s", addr, e)
+
+    # ------------------------------
+    # Downstream -> upstream
+    # ------------------------------
+    def _on_downstream_event(self, event: AlarmEvent, addr):
+        if event.type == EventType.SNOOZE_PRESSED:
+            data = event.data or {}
+            with self.lock:
+                if not self.alarm_triggered:
+                    return
+                if "count" not in data:
+                    # A single device counts once per alarm, however often it presses
+                    key = (addr, data.get("station"))
+                    if key in self.snoozed:
+                        return
+                    self.snoozed.add(key)
+                    record = self.downstream.registry.get(addr)
+                    node_id = data.get("node_id") or (record.node_id if record else str(addr))
+                    self.pending_origins.append([node_id, data.get("station")])
+                else:
+                    self.pending_origins.extend(data.get("origins", ()))  # A relay below us
+                self.pending_snoozes += data.get("count", 1)
+
+    def _membership(self) -> dict:
+        """
+        The devices this relay speaks for: the total below it, and per zone
+        its own stations plus the downstream devices that ring for it. The
+        relay joins every zone it has devices in, or every zone if any of
+        its devices ring for all of them.
+        """
+        own = len(self.stations) or 1
+        below, elsewhere = self.downstream.zone_weights(tenant=self.node.tenant)
+        weights = dict(below)
+        for zone in self.zones:
+            weights[zone] = weights.get(zone, elsewhere) + own
+        if not self.zones:
+            weights = {zone: weight + own for zone, weight in weights.items()}
+            elsewhere += own
+        return {
+            "downstream": self.downstream.get_connected_nodes_count(tenant=self.node.tenant),
+            "zones": [] if elsewhere else sorted(weights),
+            "zone_weights": weights,
+            "zone_weight_default": elsewhere,
+        }
+
+    def heartbeat_data(self) -> dict:
+        """Data for this relay's upstream heartbeat"""
+        membership = self._membership()
+        with self.lock:
+            self.reported = membership
+        # The host recomputes the relay's weight from every heartbeat, so
+        # its own stations go in each one, not just the hello
+        return {"node_id": self.relay_id, "stations": self.stations, **membership}
+
+    def _summary_loop(self):
+        while self.running:
+            self.clock.sleep(self.SUMMARY_INTERVAL)
+
+            if not self.node.connected:
+                if self.downstream.running:
+                    log.warning("Lost upstream link, detaching downstream nodes")
+                    self.downstream.stop()
+                continue
+            if not self.downstream.running:
+                log.info("Upstream link restored, serving downstream nodes again")
+                self._start_downstream()
+                continue
+
+            with self.lock:
+                snoozes, self.pending_snoozes = self.pending_snoozes, 0
+                origins, self.pending_origins = self.pending_origins, []
+                reported = self.reported
+            if snoozes:
+                self.node.send(AlarmEvent(
+                    EventType.SNOOZE_PRESSED,
+                    {"node": self.relay_id, "count": snoozes, "origins": origins}
+                ))
+            # Report membership changes right away so the quorum stays accurate
+            if self._membership() != reported:
+                self.node.send(AlarmEvent(EventType.HEARTBEAT, self.heartbeat_data()))
+
+    # ------------------------------
+    # Control
+    # ------------------------------
+    def _start_downstream(self):
+        if self.downstream.service_info is not None:
+            self.downstream = self._make_downstream()  # A stopped host can't be restarted
+        self.downstream.properties = {"role": "relay", "depth": str(self.node.host_depth + 1)}
+        self.downstream.start()
+        log.info("Relay %s serving downstream nodes at depth %d",
+                 self.relay_id, self.node.host_depth + 1)
+
+    def start(self):
+        """Start serving downstream nodes. Call once self.node is connected."""
+        self.running = True
+        self._start_downstream()
+        threading.Thread(target=self._summary_loop, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        if self.downstream.running:
+            self.downstream.stop()
+        self.node.stop()
@@ -0,0 +1,279 @@
+import errno
+import itertools
+import os
+import socket
+import threading
+from collections import deque
+
+
+class Transport:
+    """
+    How hosts and nodes reach each other.
+
+    A transport makes listeners for AlarmHost and connections for AlarmNode.
+    Listeners have accept() -> (conn, addr), fileno(), shutdown() and close();
+    connections behave like connected stream sockets (recv, recv_into,
+    sendall, close). Only discoverable transports are advertised and found
+    through Zeroconf; the others have a fixed address both sides are given.
+    """
+
+    discoverable = False  # Advertised and found through Zeroconf
+    handoff = True        # Sockets can be passed to another process
+
+    def listen(self, backlog):
+        raise NotImplementedError
+
+    def adopt(self, sock):
+        """Listener for a listening socket handed over by another process"""
+        raise NotImplementedError
+
+    def connect(self, address=None, timeout=None):
+        """
+        Args:
+            address: (ip, port) for discoverable transports, found via
+                     Zeroconf; ignored by the others
+            timeout: Seconds to wait for the connection
+        """
+        raise NotImplementedError
+
+
+class _SocketListener:
+    """Listening socket, optionally naming accepted peers that have no address"""
+
+    def __init__(self, sock, name_peer=None):
+        self.sock = sock
+        self.name_peer = name_peer
+
+    def accept(self):
+        conn, addr = self.sock.accept()
+        return conn, self.name_peer() if self.name_peer else addr
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def shutdown(self, how):
+        self.sock.shutdown(how)
+
+    def close(self):
+        self.sock.close()
+
+
+# ------------------------------
+# TCP
+# ------------------------------
+class TcpTransport(Transport):
+    """TCP over IPv4, advertised through Zeroconf"""
+
+    discoverable = True
+
+    def __init__(self, port=5001):
+        self.port = port
+
+    def listen(self, backlog):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("", self.port))
+        sock.listen(backlog)
+        return _SocketListener(sock)
+
+    def adopt(self, sock):
+        return _SocketListener(sock)
+
+    def connect(self, address=None, timeout=None):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(address)
+        except Exception:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return sock
+
+    def __str__(self):
+        return f"tcp:{self.port}"
+
+
+# ------------------------------
+# Unix-domain sockets
+# ------------------------------
+class UnixTransport(Transport):
+    """Unix-domain stream socket at a path, for nodes on the same machine"""
+
+    def __init__(self, path):
+        self.path = path
+        self.peers = itertools.count(1)
+
+    def _name_peer(self):
+        # Unix peers have no address; the pid keeps names unique across a handoff
+        return (self.path, f"{os.getpid()}-{next(self.peers)}")
+
+    def listen(self, backlog):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.listen(backlog)
+        return _SocketListener(sock, self._name_peer)
+
+    def adopt(self, sock):
+        return _SocketListener(sock, self._name_peer)
+
+    def connect(self, address=None, timeout=None):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.path)
+        except Exception:
+            sock.close()
+            raise
+        sock.settimeout(None)
+        return sock
+
+    def __str__(self):
+        return f"unix:{self.path}"
+
+
+# ------------------------------
+# In-process
+# ------------------------------
+class _Stream:
+    """One direction of an in-process connection"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = False
+        self.cond = threading.Condition()
+
+
+class InProcSocket:
+    """
+    One end of an in-process connection.
+
+    Has the subset of the socket API the host and nodes use. There is no
+    file descriptor behind it, so it can't be polled or handed to another
+    process; thousands fit in one process without touching fd limits.
+    """
+
+    def __init__(self, inbox: _Stream, outbox: _Stream):
+        self.inbox = inbox
+        self.outbox = outbox
+
+    def recv_into(self, buffer, nbytes=0) -> int:
+        nbytes = nbytes or len(buffer)
+        with self.inbox.cond:
+            while not self.inbox.data and not self.inbox.closed:
+                self.inbox.cond.wait()
+            n = min(nbytes, len(self.inbox.data))
+            buffer[:n] = self.inbox.data[:n]
+            del self.inbox.data[:n]
+            return n
+
+    def recv(self, bufsize) -> bytes:
+        buffer = bytearray(bufsize)
+        return bytes(buffer[:self.recv_into(buffer)])
+
+    def sendall(self, data):
+        with self.outbox.cond:
+            if self.outbox.closed:
+                raise BrokenPipeError(errno.EPIPE, "in-process peer closed")
+            self.outbox.data += data
+            self.outbox.cond.notify()
+
+    def close(self):
+        for stream in (self.inbox, self.outbox):
+            with stream.cond:
+                stream.closed = True
+                stream.cond.notify_all()
+
+    def shutdown(self, how):
+        self.close()
+
+    def fileno(self):
+        return -1
+
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, *args):
+        # An in-process peer can't vanish without closing its end, so asking
+        # for keepalive probing succeeds: long heartbeat intervals are safe
+        pass
+
+
+class _InProcListener:
+    """Queue of connections waiting to be accepted; a pipe makes it pollable"""
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.pending = deque()
+        self.peers = itertools.count(1)
+        self.ready_r, self.ready_w = os.pipe()  # One byte per pending connection
+        self.lock = threading.Lock()
+
+    def connect(self) -> InProcSocket:
+        to_host, to_node = _Stream(), _Stream()
+        with self.lock:
+            if self.ready_w is None:
+                raise ConnectionRefusedError(errno.ECONNREFUSED, "in-process host closed")
+            addr = (self.transport.name, next(self.peers))
+            self.pending.append((InProcSocket(to_host, to_node), addr))
+            os.write(self.ready_w, b"x")
+        return InProcSocket(to_node, to_host)
+
+    def accept(self):
+        if not os.read(self.ready_r, 1):
+            os.close(self.ready_r)
+            raise OSError(errno.EBADF, "in-process listener closed")
+        with self.lock:
+            return self.pending.popleft()
+
+    def fileno(self):
+        return self.ready_r
+
+    def shutdown(self, how):
+        self.close()
+
+    def close(self):
+        with self.lock:
+            if self.ready_w is None:
+                return
+            os.close(self.ready_w)  # accept() sees EOF
+            self.ready_w = None
+            for conn, _ in self.pending:
+                conn.close()
+            self.pending.clear()
+        InProcTransport.listeners.pop(self.transport.name, None)
+
+
+class InProcTransport(Transport):
+    """
+    Connections between a host and nodes in the same process, through
+    in-memory buffers instead of the network stack. Used by tests and
+    benchmarks to run many nodes at once.
+    """
+
+    handoff = False
+    listeners = {}  # Name -> listening _InProcListener
+
+    def __init__(self, name="alarm-host"):
+        self.name = name
+
+    def listen(self, backlog):
+        listener = _InProcListener(self)
+        InProcTransport.listeners[self.name] = listener
+        return listener
+
+    def adopt(self, sock):
+        raise NotImplementedError("in-process connections can't be handed off")
+
+    def connect(self, address=None, timeout=None):
+        listener = InProcTransport.listeners.get(self.name)
+        if listener is None:
+            raise ConnectionRefusedError(errno.ECONNREFUSED, f"no in-process host {self.name!r}")
+        return listener.connect()
+
+    def __str__(self):
+        return f"inproc:{self.name}"
@@ -64,8 +64,37 @@ class SnoozeButton:
                 return False
             time.sleep(0.01)
     
+    def on_press(self, callback) -> bool:
+        """
+        Call callback() on every press, from RPi.GPIO's edge thread.
+        
+        The kernel reports the falling edge, so nothing runs while the
+        button is untouched; a press still has to be held for hold_time.
+        
+        Args:
+            callback: Function taking no arguments
+        
+        Returns:
+            False if edge detection isn't available (poll is_pressed() instead)
+        """
+        def _edge(channel):
+            time.sleep(self.hold_time)  # Debounce
+            if self.is_pressed():
+                callback()
+        
+        try:
+            GPIO.add_event_detect(self.pin, GPIO.FALLING, callback=_edge,
+                                  bouncetime=max(1, int(self.hold_time * 1000)))
+            return True
+        except Exception:
+            return False
+    
     def close(self):
         """Clean up GPIO resources"""
+        try:
+            GPIO.remove_event_detect(self.pin)
+        except Exception:
+            pass
         try:
             GPIO.cleanup(self.pin)
         except Exception:
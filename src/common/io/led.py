@@ -27,6 +27,8 @@ class LedController:
         self.pin = pin
         self._blinking = False
         self._blink_thread = None
+        self._go = None      # Set to start an armed blink
+        self._armed = None   # (on_time, off_time) of the armed blink
 
     def on(self):
         self.stop_blink()
@@ -42,12 +44,28 @@ class LedController:
         except Exception:
             pass
 
+    def arm(self, on_time=0.5, off_time=0.5):
+        """Start the blink thread now, held until blink() so blinking starts at once."""
+        self._start_blink(on_time, off_time, armed=True)
+
     def blink(self, on_time=0.5, off_time=0.5):
         """Start blinking in a background thread."""
+        if self._armed == (on_time, off_time) and self._blinking:
+            self._armed = None
+            self._go.set()  # Already running: just let it go
+            return
+        self._start_blink(on_time, off_time, armed=False)
+
+    def _start_blink(self, on_time, off_time, armed):
         self.stop_blink()
         self._blinking = True
+        self._armed = (on_time, off_time) if armed else None
+        go = self._go = threading.Event()
+        if not armed:
+            go.set()
 
         def _blink_loop():
+            go.wait()
             while self._blinking:
                 try:
                     GPIO.output(self.pin, GPIO.HIGH)
@@ -73,6 +91,8 @@ class LedController:
     def stop_blink(self):
         if self._blinking:
             self._blinking = False
+            self._armed = None
+            self._go.set()  # Release an armed thread that never started
             if self._blink_thread:
                 self._blink_thread.join(timeout=0.2)
                 self._blink_thread = None
@@ -0,0 +1,130 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+LOG_LEVEL_ENV = "ALARM_LOG_LEVEL"
+ROOT_LOGGER = "alarm_mesh"
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def get_logger(tag: str) -> logging.Logger:
+    """Get a logger whose records are printed with a "[TAG]" prefix"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{tag}")
+
+
+def kv(**fields) -> dict:
+    """Build the `extra` argument for a structured log call.
+
+    Example: log.debug("Received %s", name, extra=kv(addr=addr))
+    """
+    return {"fields": fields}
+
+
+class _TagFormatter(logging.Formatter):
+    """Formats records as "[TAG] message key=value ..." """
+
+    def format(self, record):
+        record.tag = record.name.split(".", 1)[-1]
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class RateLimitFilter(logging.Filter):
+    """Limits how many records each call site may emit per time window.
+
+    Records are grouped by logger name and unformatted message, so a busy
+    call site (e.g. one line per received frame) can't flood the output. The
+    first record let through after a quiet window reports how many were
+    suppressed in between.
+    """
+
+    def __init__(self, rate=20, per=1.0):
+        super().__init__()
+        self.rate = rate
+        self.per = per
+        self._windows = {}  # {(name, msg): [window_start, count, suppressed]}
+        self._lock = threading.Lock()
+
+    def filter(self, record) -> bool:
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.per:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.msg = f"{record.msg} ({suppressed} similar suppressed)"
+                return True
+            if window[1] < self.rate:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(level=None, rate=20, per=1.0, max_queue=10000):
+    """
+    Route all alarm_mesh loggers through a background queue.
+
+    Callers only pay for a level check and a queue put; formatting and the
+    actual write to stdout happen on a listener thread, so a slow terminal or
+    journal never blocks network threads. Safe to call more than once.
+
+    Args:
+        level: Log level name or number. Defaults to $ALARM_LOG_LEVEL or INFO.
+        rate: Records allowed per call site per `per` seconds
+        per: Rate limit window in seconds
+        max_queue: Records buffered before new ones are dropped
+    """
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+
+        if level is None:
+            level = os.environ.get(LOG_LEVEL_ENV, "INFO")
+        if isinstance(level, str):
+            level = logging.getLevelName(level.upper())
+            if not isinstance(level, int):
+                level = logging.INFO
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(_TagFormatter("[%(tag)s] %(message)s"))
+
+        log_queue = queue.Queue(maxsize=max_queue)
+        queue_handler = _DroppingQueueHandler(log_queue)
+        queue_handler.addFilter(RateLimitFilter(rate=rate, per=per))
+
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(level)
+        root.addHandler(queue_handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+        _listener.start()
+        atexit.register(_listener.stop)
@@ -0,0 +1,85 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from common.log import get_logger
+
+log = get_logger("STARTUP")
+
+
+class Readiness:
+    """
+    Startup phases, their timings, and whether the process is ready yet.
+
+    Phases are timed from when they start; independent ones (hardware that
+    takes a while to initialize) can run in parallel with start_parallel()
+    and be waited for later.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = {}  # {name: {"start": s, "seconds": s, "ok": bool, "error": str}}
+        self.ready_at = None
+        self.lock = threading.Lock()
+        self.executor = None
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block of startup work; exceptions are recorded and re-raised"""
+        start = time.monotonic()
+        entry = {"start": round(start - self.started, 3)}
+        with self.lock:
+            self.phases[name] = entry
+        try:
+            yield
+            entry["ok"] = True
+        except Exception as e:
+            entry["ok"] = False
+            entry["error"] = str(e)
+            raise
+        finally:
+            entry["seconds"] = round(time.monotonic() - start, 3)
+
+    def start_parallel(self, tasks: dict) -> dict:
+        """
+        Run independent initializations on a thread pool.
+
+        Args:
+            tasks: {phase name: function returning the initialized object}
+
+        Returns:
+            {phase name: Future}; a failed task's future resolves to None
+            after the error is logged and recorded
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=max(4, len(tasks)),
+                                               thread_name_prefix="startup")
+        return {name: self.executor.submit(self._run, name, task) for name, task in tasks.items()}
+
+    def _run(self, name, task):
+        try:
+            with self.phase(name):
+                result = task()
+            log.info("%s initialized in %.2fs", name, self.phases[name]["seconds"])
+            return result
+        except Exception as e:
+            log.error("Failed to initialize %s: %s", name, e)
+            return None
+
+    def mark_ready(self):
+        self.ready_at = time.monotonic()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        log.info("Ready in %.2fs", self.ready_at - self.started)
+
+    def is_ready(self) -> bool:
+        return self.ready_at is not None
+
+    def report(self) -> dict:
+        with self.lock:
+            phases = {name: dict(entry) for name, entry in self.phases.items()}
+        return {
+            "ready": self.is_ready(),
+            "seconds_to_ready": round(self.ready_at - self.started, 3) if self.ready_at else None,
+            "phases": phases,
+        }
@@ -0,0 +1,83 @@
+import threading
+import uuid
+from collections import deque
+from common.clock import SYSTEM_CLOCK
+
+
+class TraceRecorder:
+    """
+    Bounded in-memory ring of timestamped spans, grouped by trace ID.
+
+    Every trigger gets a trace ID that travels with the alarm events. The
+    host records spans for the scheduler firing, the manager trigger, each
+    per-node send and each snooze; nodes report their own spans (receive,
+    LED on, snooze press) back in an ACK. Once the ring is full the oldest
+    spans are dropped.
+
+    Node spans are stamped with the node's clock, so the gap between a host
+    send and a node receive is only as accurate as the clocks' sync. Gaps
+    between two spans from the same device are exact.
+    """
+
+    def __init__(self, max_spans=10000, clock=SYSTEM_CLOCK):
+        self.clock = clock
+        self.spans = deque(maxlen=max_spans)  # [(trace_id, ts, name, node, fields)]
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def new_trace_id() -> str:
+        return uuid.uuid4().hex[:16]
+
+    def record(self, trace_id, name, node="host", ts=None, **fields):
+        """
+        Add a span to the ring.
+
+        Args:
+            trace_id: Trace the span belongs to; ignored if None
+            name: What happened, e.g. "host.send" or "node.led"
+            node: Device the span was recorded for
+            ts: Unix timestamp (default: now)
+            fields: Extra details to keep with the span
+        """
+        if trace_id is None:
+            return
+        span = (trace_id, ts if ts is not None else self.clock.time(), name, node, fields)
+        with self.lock:
+            self.spans.append(span)
+
+    def trace_ids(self) -> list:
+        """Trace IDs still in the ring, most recent first"""
+        with self.lock:
+            spans = list(self.spans)
+        seen = {}
+        for trace_id, ts, _, _, _ in spans:
+            seen[trace_id] = max(ts, seen.get(trace_id, ts))
+        return sorted(seen, key=seen.get, reverse=True)
+
+    def get_trace(self, trace_id) -> list:
+        """Spans of one trace as dicts, in time order"""
+        with self.lock:
+            spans = [span for span in self.spans if span[0] == trace_id]
+        spans.sort(key=lambda span: span[1])
+        return [
+            {"ts": ts, "name": name, "node": node, **fields}
+            for _, ts, name, node, fields in spans
+        ]
+
+    def breakdown(self, trace_id) -> dict:
+        """
+        Per-device latency breakdown of a trace.
+
+        Returns:
+            {node: {span name: milliseconds since the first span of the trace}}
+            keeping the first occurrence of each span name per device
+        """
+        spans = self.get_trace(trace_id)
+        if not spans:
+            return {}
+        start = spans[0]["ts"]
+        result = {}
+        for span in spans:
+            offsets = result.setdefault(span["node"], {})
+            offsets.setdefault(span["name"], round((span["ts"] - start) * 1000, 1))
+        return result
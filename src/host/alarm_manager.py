@@ -1,77 +1,338 @@
 import threading
-from common.comms.protocol import Alarm, AlarmEvent, EventType
+from collections import deque
+from common.clock import SYSTEM_CLOCK
+from common.comms.protocol import DEFAULT_TENANT, Alarm, AlarmEvent, EventType
+from common.log import get_logger
+
+log = get_logger("ALARM")
 
 
 class AlarmManager:
     """Manages alarm state and handles alarm-related events"""
-    
-    def __init__(self, event_callback):
+
+    DELTA_LOG_SIZE = 64  # Node-visible events kept for reconnecting nodes
+
+    def __init__(self, event_callback, tracer=None, clock=SYSTEM_CLOCK, tenant=DEFAULT_TENANT):
         """
         Initialize the alarm manager.
-        
+
         Args:
             event_callback: Function to call when broadcasting events.
-                           Takes (event: AlarmEvent) as argument.
+                           Takes (event: AlarmEvent) as argument. It is called
+                           while the manager lock is held, so events reach it
+                           in state-transition order; it must not block (hand
+                           the event to an EventDispatcher instead of doing
+                           I/O directly).
+            tracer: Optional TraceRecorder for trigger and clear spans
+            clock: Time source (a VirtualClock in simulations)
+            tenant: Mesh this manager holds the alarm of; events of any but
+                    DEFAULT_TENANT carry it as data["tenant"]
         """
+        self.tenant = tenant
+        self.stamp = {} if tenant == DEFAULT_TENANT else {"tenant": tenant}
         self.current_alarm = None  # Single Alarm object scheduled
         self.alarm_active = False  # Is an alarm currently triggered?
         self.snooze_count = 0      # Number of devices that have snoozed
+        self.trace_id = None       # Trace of the active alarm, if it was traced
+        self.trigger_version = None  # Version the ringing alarm was triggered at
+        self.version = 0           # Bumped on every state change
+        self.clock = clock
+        self.epoch = int(clock.time() * 1000)  # Names this version sequence; kept across failover
+        self.deltas = deque(maxlen=self.DELTA_LOG_SIZE)  # [(version, frame)] of emitted events
+        self.delta_floor = 0       # Deltas are kept for every version above this
+        self.snapshot_frame = b""  # Pre-encoded frames describing the current state
         self.lock = threading.Lock()
         self.event_callback = event_callback
+        self.tracer = tracer
+        self._rebuild_snapshot()
+
+    def _emit(self, event: AlarmEvent = None):
+        """
+        Record a state change. Must be called with the lock held.
+
+        Bumps the version, stamps it on the event (if any) and passes the
+        event on, followed by a STATE_SYNC carrying the full state for
+        standby hosts.
+        """
+        self.version += 1
+        if event is not None:
+            event.data["version"] = self.version
+            event.data["epoch"] = self.epoch
+            event.data.update(self.stamp)
+            if len(self.deltas) == self.deltas.maxlen:
+                self.delta_floor = self.deltas[0][0]
+            self.deltas.append((self.version, event.to_frame()))
+            self.event_callback(event)
+        self._rebuild_snapshot()
+        self.event_callback(AlarmEvent(EventType.STATE_SYNC, self._state()))
+
+    def _snapshot_events(self) -> list:
+        """Events that bring a node from any state to the current one"""
+        data = {"version": self.version, "epoch": self.epoch, "snapshot": True, **self.stamp}
+        if not self.current_alarm:
+            return [AlarmEvent(EventType.ALARM_CLEARED, dict(data, zone=None))]
+        events = []
+        if self.current_alarm.zone:
+            # Nodes outside the zone ignore the rest, so clear them first
+            events.append(AlarmEvent(EventType.ALARM_CLEARED, dict(data, zone=None)))
+        data["alarm"] = self.current_alarm.to_dict()
+        data["zone"] = self.current_alarm.zone
+        events.append(AlarmEvent(EventType.ALARM_SET, dict(data)))
+        if self.alarm_active:
+            events.append(AlarmEvent(EventType.ALARM_TRIGGERED, self._traced(dict(data), self.trace_id)))
+        return events
+
+    @staticmethod
+    def _traced(data: dict, trace_id) -> dict:
+        if trace_id:
+            data["trace_id"] = trace_id
+        return data
+
+    def _rebuild_snapshot(self):
+        self.snapshot_frame = b"".join(event.to_frame() for event in self._snapshot_events())
+
+    def get_sync_frame(self, epoch=None, since_version=None) -> bytes:
+        """
+        Get the bytes that bring a node up to date, ready for a single write.
+
+        A node that reports the epoch and version it last saw gets just the
+        events it missed, if they are still in the delta log (possibly none).
+        Anyone else gets the pre-encoded snapshot.
+        """
+        with self.lock:
+            if (epoch != self.epoch or since_version is None
+                    or since_version <= self.delta_floor or since_version > self.version):
+                return self.snapshot_frame
+            return b"".join(frame for version, frame in self.deltas if version > since_version)
+
+    def _state(self) -> dict:
+        return {
+            "epoch": self.epoch,
+            "version": self.version,
+            "alarm": self.current_alarm.to_dict() if self.current_alarm else None,
+            "alarm_active": self.alarm_active,
+            "snooze_count": self.snooze_count,
+            "trace_id": self.trace_id,
+            "trigger_version": self.trigger_version,
+            **self.stamp,
+        }
+
+    def get_state(self) -> dict:
+        """Get a serializable copy of the full alarm state"""
+        with self.lock:
+            return self._state()
+
+    def load_state(self, state: dict) -> bool:
+        """
+        Replace the alarm state with one replicated from the active host.
+
+        No events are emitted. States older than the current one are ignored.
+
+        Returns:
+            True if the state was applied
+        """
+        with self.lock:
+            if state["epoch"] == self.epoch and state["version"] < self.version:
+                return False
+            self.epoch = state["epoch"]
+            self.version = state["version"]
+            self.current_alarm = Alarm.from_dict(state["alarm"]) if state["alarm"] else None
+            self.alarm_active = state["alarm_active"]
+            self.snooze_count = state["snooze_count"]
+            self.trace_id = state.get("trace_id")
+            self.trigger_version = state.get("trigger_version")
+            # Nodes that reconnect after a failover get a snapshot
+            self.deltas.clear()
+            self.delta_floor = self.version
+            self._rebuild_snapshot()
+            return True
+
+    def announce_state(self):
+        """Re-emit events describing the current state (e.g. after taking over as host)"""
+        with self.lock:
+            for event in self._snapshot_events():
+                self.event_callback(event)
 
     def set_alarm(self, alarm: Alarm):
         """Set the alarm to be scheduled"""
+        # Broadcast alarm set to nodes so they can update indicators
+        event = AlarmEvent(EventType.ALARM_SET, {"alarm": alarm.to_dict(), "zone": alarm.zone})
         with self.lock:
+            previous = self.current_alarm
+            if previous and previous.zone != alarm.zone:
+                # Moving to another zone: stand down the old one
+                self._emit(AlarmEvent(EventType.ALARM_CLEARED, {"zone": previous.zone}))
             self.current_alarm = alarm
             self.alarm_active = False
+            self.trigger_version = None
             self.snooze_count = 0
-        print(f"[ALARM] Alarm set for {alarm}")
-        # Broadcast alarm set to nodes so they can update indicators
-        event = AlarmEvent(EventType.ALARM_SET, {"alarm": alarm.to_dict()})
-        self.event_callback(event)
+            self._emit(event)
+        log.info("Alarm set for %s", alarm)
 
     def remove_alarm(self):
         """Remove the currently scheduled alarm"""
         with self.lock:
+            zone = self.current_alarm.zone if self.current_alarm else None
+            event = AlarmEvent(EventType.ALARM_CLEARED, {"zone": zone})
             self.current_alarm = None
             self.alarm_active = False
+            self.trigger_version = None
             self.snooze_count = 0
-        print("[ALARM] Alarm removed")
-        event = AlarmEvent(EventType.ALARM_CLEARED, {})
-        self.event_callback(event)
+            self._emit(event)
+        log.info("Alarm removed")
+
+    def apply_batch(self, operations: list) -> dict:
+        """
+        Apply several alarm changes atomically, announcing only the result.
+
+        Operations run in order under a single lock acquisition. Nodes, the
+        display and standby hosts get one event describing the final state
+        (ALARM_SET or ALARM_CLEARED) at one new version, or nothing if the
+        batch leaves the alarm as it was. Nodes outside the final alarm's
+        zone take its ALARM_SET as the end of whatever alarm they had.
+
+        Args:
+            operations: List of ("set", Alarm) or ("remove", None)
+
+        Returns:
+            {"applied": n, "changed": bool, "version": v, "alarm": dict or None}
+
+        Raises:
+            ValueError: An operation is invalid; nothing is applied
+        """
+        for op, alarm in operations:
+            if op not in ("set", "remove") or (op == "set") != isinstance(alarm, Alarm):
+                raise ValueError(f"Invalid operation {op!r}")
 
-    def trigger_alarm(self, alarm: Alarm):
-        """Trigger an alarm and broadcast to all nodes"""
         with self.lock:
-            if self.alarm_active:
-                print("[ALARM] Alarm already active, ignoring trigger")
-                return
-            self.alarm_active = True
-            self.snooze_count = 0
-        
-        print(f"[ALARM] ALARM TRIGGERED for {alarm}")
-        event = AlarmEvent(EventType.ALARM_TRIGGERED, {"alarm": alarm.to_dict()})
-        self.event_callback(event)
+            before = (self.current_alarm, self.alarm_active)
+            for op, alarm in operations:
+                self.current_alarm = alarm if op == "set" else None
+                self.alarm_active = False
+                self.trigger_version = None
+                self.snooze_count = 0
+            changed = (self.current_alarm, self.alarm_active) != before
+            if changed and self.current_alarm:
+                self._emit(AlarmEvent(EventType.ALARM_SET, {
+                    "alarm": self.current_alarm.to_dict(), "zone": self.current_alarm.zone
+                }))
+            elif changed:
+                self._emit(AlarmEvent(EventType.ALARM_CLEARED, {"zone": None}))
+            final = self.current_alarm
+            version = self.version
+        log.info("Applied %d alarm operation(s); alarm now %s", len(operations), final or "unset")
+        return {
+            "applied": len(operations),
+            "changed": changed,
+            "version": version,
+            "alarm": final.to_dict() if final else None,
+        }
+
+    def trigger_alarm(self, alarm: Alarm, trace_id=None):
+        """
+        Trigger an alarm and broadcast to all nodes.
+
+        Args:
+            alarm: The alarm that fired
+            trace_id: Optional trace ID carried by the events of this alarm
+        """
+        event = AlarmEvent(EventType.ALARM_TRIGGERED,
+                           self._traced({"alarm": alarm.to_dict(), "zone": alarm.zone}, trace_id))
+        with self.lock:
+            already_active = self.alarm_active
+            if not already_active:
+                self.alarm_active = True
+                self.snooze_count = 0
+                self.trace_id = trace_id
+                # The version this event gets, so the STATE_SYNC sent with it
+                # names the ringing alarm
+                self.trigger_version = self.version + 1
+                if self.tracer:
+                    self.tracer.record(trace_id, "manager.trigger")
+                self._emit(event)
+
+        if already_active:
+            log.info("Alarm already active, ignoring trigger")
+        else:
+            log.warning("ALARM TRIGGERED for %s", alarm)
+
+    def handle_snooze(self, connected_nodes_count: int, source="node", count=1, snoozed=None):
+        """
+        Handle snooze from either node or host.
 
-    def handle_snooze(self, connected_nodes_count: int, source="node"):
-        """Handle snooze from either node or host"""
+        Args:
+            connected_nodes_count: Devices connected to the host in the alarm's
+                                   zone, relays included
+            source: Description of who snoozed, for logging
+            count: Number of snoozes represented (relays send summaries)
+            snoozed: Snoozes that still count towards the quorum, leaving out
+                     devices that dropped out of it; every snooze if None
+        """
+        total_devices = connected_nodes_count + 1  # host + nodes
         with self.lock:
             if not self.alarm_active:
                 return
 
-            self.snooze_count += 1
-            total_devices = connected_nodes_count + 1  # host + nodes
+            self.snooze_count += count
+            snooze_count = self.snooze_count if snoozed is None else snoozed
+            cleared = snooze_count >= total_devices
+            if cleared:
+                self._clear()
+            else:
+                self._emit()  # Replicate snooze progress
 
-            print(f"[ALARM] Snooze from {source}. "
-                f"{self.snooze_count}/{total_devices} devices snoozed.")
+        log.info("Snooze from %s. %d/%d devices snoozed.",
+                 source, snooze_count, total_devices)
+        if cleared:
+            log.info("All %d devices snoozed. Clearing alarm.", total_devices)
 
-            if self.snooze_count >= total_devices:
-                print(f"[ALARM] All {total_devices} devices snoozed. Clearing alarm.")
-                self.alarm_active = False
-                self.current_alarm = None
-                self.snooze_count = 0
-                event = AlarmEvent(EventType.ALARM_CLEARED, {})
-                self.event_callback(event)
+    def check_quorum(self, connected_nodes_count: int, snoozed=None) -> bool:
+        """
+        Clear the ringing alarm if the snoozes already received are now
+        enough, e.g. because unresponsive nodes dropped out of the quorum.
+
+        Args:
+            connected_nodes_count: Devices currently counted in the alarm's zone
+            snoozed: Snoozes from devices still counted, since those that
+                     dropped out may have snoozed before they did; every
+                     snooze if None
+
+        Returns:
+            True if the alarm was cleared
+        """
+        total_devices = connected_nodes_count + 1  # host + nodes
+        with self.lock:
+            if snoozed is None:
+                snoozed = self.snooze_count
+            if not self.alarm_active or snoozed < total_devices:
+                return False
+            self._clear()
+        log.info("Quorum shrank to %d devices and all %d have snoozed. Clearing alarm.",
+                 total_devices, snoozed)
+        return True
+
+    def _clear(self):
+        """End the ringing alarm once the quorum snoozed. Must be called with the lock held."""
+        zone = self.current_alarm.zone if self.current_alarm else None
+        if self.tracer:
+            self.tracer.record(self.trace_id, "manager.clear", snoozes=self.snooze_count)
+        self.alarm_active = False
+        self.current_alarm = None
+        self.snooze_count = 0
+        self._emit(AlarmEvent(EventType.ALARM_CLEARED, self._traced({"zone": zone}, self.trace_id)))
+        self.trace_id = None
+        self.trigger_version = None
+
+    def alarm_instance(self):
+        """
+        Identify the ringing alarm without taking the lock, e.g. to drop
+        duplicate snoozes cheaply.
+
+        Returns:
+            (epoch, version it was triggered at), or None if nothing is ringing
+        """
+        version = self.trigger_version
+        return (self.epoch, version) if version is not None else None
 
     def is_alarm_active(self) -> bool:
         """Check if an alarm is currently active"""
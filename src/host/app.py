@@ -1,151 +1,412 @@
+from common.comms.capture import FrameCapture
+from common.comms.handoff import HANDOFF_PATH, request_handoff, send_handoff, serve_handoff
 from common.comms.host_server import AlarmHost
+from common.comms.transport import TcpTransport, UnixTransport
 from host.alarm_manager import AlarmManager
-from common.comms.protocol import Alarm, AlarmEvent, EventType
+from host.event_dispatcher import EventDispatcher
+from host.failover import StandbyHost
+from host.history import SNOOZED, AlarmHistory
+from host.scheduler import AlarmScheduler
+from host.snooze_filter import SnoozeCoalescer
+from host.tenants import Tenant, TenantRegistry
+from common.comms.protocol import DEFAULT_TENANT, Alarm, AlarmEvent, EventType
 from common.io.lcd import LCD
 from common.io.time_display import TimeDisplay
 from common.io.buzzer import BuzzerController
 from common.io.button import SnoozeButton
+from common.clock import SYSTEM_CLOCK
+from common.log import configure_logging, get_logger
+from common.startup import Readiness
+from common.trace import TraceRecorder
 
-from flask import Flask, render_template, redirect, url_for
+from flask import Flask, render_template, redirect, jsonify, abort, request
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField
 from wtforms.validators import InputRequired
 from wtforms_components import TimeField
-from datetime import datetime
 
-import time
+import argparse
+import os
 import threading
 
+log = get_logger("HOST APP")
+log_host = get_logger("HOST")
+
 host = None
-alarm_manager = None
+tenants = None        # TenantRegistry; every alarm mesh this host serves
+alarm_manager = None  # The default tenant's, which the buzzer, LCD and button follow
+dispatcher = None
+snoozes = None
+history = None
+capture = None  # FrameCapture when started with --capture
+scheduler_thread = None
+handed_off = threading.Event()  # Set once a new host process has taken over
+readiness = Readiness()
 lcd = None
 buzzer = None
 button = None
+prepare_lead = 30  # Seconds before an alarm fires that nodes are told to arm (0: never)
+clock = SYSTEM_CLOCK
+tracer = TraceRecorder(clock=clock)
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = "secretkey"
 
 class AlarmTime(FlaskForm):
     time = TimeField('Time', validators = [InputRequired()])
+    zone = StringField('Zone (leave empty for everyone)')
     submit = SubmitField("Set Alarm")
 
-@app.route("/", methods = ["GET", "POST"])
-def index():
+def route_tenant(name) -> Tenant:
+    """Tenant a page is for. Pages don't create tenants; a node's hello does."""
+    tenant = tenants.get(name) if tenants else None
+    if tenant is None:
+        abort(404)
+    return tenant
+
+
+def base_path(name) -> str:
+    """Where a tenant's pages live: / for the default tenant, /t/<name>/ for the others"""
+    return "/" if name == DEFAULT_TENANT else f"/t/{name}/"
+
+
+@app.route("/", defaults={"name": DEFAULT_TENANT}, methods = ["GET", "POST"])
+@app.route("/t/<name>/", methods = ["GET", "POST"])
+def index(name):
     form = AlarmTime()
+    if host and host.frozen:
+        abort(503)  # Handing off to a new host process
+    base = base_path(name)
     if form.validate_on_submit():
         t = form.time.data
-        # Convert the submitted time (a datetime.time) to our Alarm (12-hour format)
-        hour24 = t.hour
-        minute = t.minute
-        # Convert 24-hour to 12-hour + is_pm flag
-        if hour24 == 0:
-            hour12 = 12
-            is_pm = False
-        elif 1 <= hour24 < 12:
-            hour12 = hour24
-            is_pm = False
-        elif hour24 == 12:
-            hour12 = 12
-            is_pm = True
-        else:
-            hour12 = hour24 - 12
-            is_pm = True
-
-        alarm = Alarm(hours=hour12, minutes=minute, is_pm=is_pm)
-        if alarm_manager:
-            alarm_manager.set_alarm(alarm)
+        zone = (form.zone.data or "").strip() or None
+        alarm = Alarm.from_24hr(t.hour, t.minute, zone=zone)
+        if tenants:
+            capture_local(name, "set", alarm=alarm.to_dict())
+            route_tenant(name).manager.set_alarm(alarm)
             msg = f"Alarm set for {alarm}"
-            # Update LCD immediately so display doesn't wait for the next minute tick
-            try:
-                if lcd:
-                    display_now = TimeDisplay(current_time=datetime.now(), alarm=alarm)
-                    lcd.write(display_now.get_time_line(), display_now.get_alarm_line())
-            except Exception as e:
-                print(f"[HOST APP] Failed to update LCD after setting alarm: {e}")
         else:
             msg = f"Alarm created (server not running): {alarm}"
 
-        return render_template("index.html", form=form, message=msg, current_alarm=alarm)
+        return render_template("index.html", form=form, message=msg, current_alarm=alarm, base=base)
     
-    # On GET request, fetch the current alarm from alarm_manager
-    current_alarm = alarm_manager.get_current_alarm() if alarm_manager else None
-    return render_template("index.html", form=form, current_alarm=current_alarm)
-
-
-@app.route("/remove", methods = ["POST"])
-def remove_alarm():
-    """Remove the currently scheduled alarm"""
-    if alarm_manager:
-        alarm_manager.remove_alarm()
-        # Update LCD to clear alarm display
-        try:
-            if lcd:
-                display_now = TimeDisplay(current_time=datetime.now(), alarm=None)
-                lcd.write(display_now.get_time_line(), display_now.get_alarm_line())
-        except Exception as e:
-            print(f"[HOST APP] Failed to update LCD after removing alarm: {e}")
-    return redirect(url_for('index'))
+    # On GET request, fetch the tenant's current alarm
+    current_alarm = route_tenant(name).manager.get_current_alarm() if tenants else None
+    return render_template("index.html", form=form, current_alarm=current_alarm, base=base)
+
+
+@app.route("/remove", defaults={"name": DEFAULT_TENANT}, methods = ["POST"])
+@app.route("/t/<name>/remove", methods = ["POST"])
+def remove_alarm(name):
+    """Remove the tenant's currently scheduled alarm"""
+    if host and host.frozen:
+        abort(503)
+    if tenants:
+        capture_local(name, "remove")
+        route_tenant(name).manager.remove_alarm()
+    return redirect(base_path(name))
+
+
+@app.route("/alarms/bulk", defaults={"name": DEFAULT_TENANT}, methods=["POST"])
+@app.route("/t/<name>/alarms/bulk", methods=["POST"])
+def bulk_alarms(name):
+    """
+    Apply many alarm changes at once, e.g.
+
+        {"operations": [{"op": "set", "time": "07:30", "zone": "kitchen"},
+                        {"op": "remove"}]}
+
+    All are validated first and applied under one lock; nodes and the
+    display get a single update with the result.
+    """
+    if not tenants or (host and host.frozen):
+        abort(503)
+    manager = route_tenant(name).manager
+    body = request.get_json(silent=True)
+    try:
+        if not isinstance(body, dict) or not isinstance(body.get("operations", []), list):
+            raise TypeError('expected {"operations": [...]}')
+        operations = []
+        for item in body.get("operations", []):
+            if not isinstance(item, dict):
+                raise TypeError(f"operation {item!r} is not an object")
+            alarm = None
+            if item.get("op") == "set":
+                if not isinstance(item.get("time"), str):
+                    raise TypeError('"time" must be a string like "07:30"')
+                zone = item.get("zone")
+                if zone is not None and not isinstance(zone, str):
+                    raise TypeError('"zone" must be a string')
+                hour, minute = (int(part) for part in item["time"].split(":"))
+                alarm = Alarm.from_24hr(hour, minute, zone=(zone or "").strip() or None)
+            operations.append((item.get("op"), alarm))
+        capture_local(name, "batch", operations=[[op, alarm.to_dict() if alarm else None]
+                                           for op, alarm in operations])
+        return jsonify(manager.apply_batch(operations))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"{type(e).__name__}: {e}"}), 400
+
+
+@app.route("/traces")
+def list_traces():
+    """Recent alarm trace IDs, most recent first"""
+    return jsonify(tracer.trace_ids())
+
+
+@app.route("/traces/<trace_id>")
+def get_trace(trace_id):
+    """Spans of one alarm and the per-device latency breakdown in ms"""
+    spans = tracer.get_trace(trace_id)
+    if not spans:
+        abort(404)
+    return jsonify({"trace_id": trace_id, "spans": spans, "breakdown": tracer.breakdown(trace_id)})
+
+
+@app.route("/ready")
+def ready():
+    """Startup state with per-phase timings; 503 until the host is ready"""
+    return jsonify(readiness.report()), (200 if readiness.is_ready() else 503)
+
+
+@app.route("/history/time-to-clear")
+def time_to_clear():
+    """Mean time from fire to clear, and to each node's snooze, over ?days=N (default 30)"""
+    if not history:
+        abort(503)
+    return jsonify(history.time_to_clear(days=request.args.get("days", 30, type=float)))
+
+
+@app.route("/nodes")
+def nodes():
+    """Connected nodes of every tenant with their failure-detector suspicion level (phi)"""
+    return jsonify(host.suspicion() if host else [])
+
+
+@app.route("/t/<name>/nodes")
+def tenant_nodes(name):
+    """Connected nodes of one tenant with their suspicion level"""
+    if not tenants or not tenants.get(name):
+        abort(404)
+    return jsonify(host.suspicion(tenant=name))
+
+
+@app.route("/tenants")
+def list_tenants():
+    """Tenants served, with their node count and current alarm"""
+    if not tenants:
+        return jsonify([])
+    listing = []
+    for tenant in tenants:
+        alarm = tenant.manager.get_current_alarm()
+        listing.append({
+            "tenant": tenant.name,
+            "nodes": host.get_connected_nodes_count(tenant=tenant.name),
+            "alarm": alarm.to_dict() if alarm else None,
+            "ringing": tenant.manager.is_alarm_active(),
+        })
+    return jsonify(listing)
+
+
+@app.route("/stats/snooze")
+def snooze_stats():
+    """Snoozes accepted and suppressed before reaching the alarm manager"""
+    return jsonify(snoozes.stats() if snoozes else {})
 
 
 def handle_event(event: AlarmEvent, addr):
-    if event.type == EventType.SNOOZE_PRESSED:
-        alarm_manager.handle_snooze(
-            connected_nodes_count=host.get_connected_nodes_count(),
-            source=str(addr)
-        )
-
-
-
-def on_node_connected(addr, conn):
-    """Called when a new node connects - send current alarm state"""
-    try:
-        alarm = alarm_manager.get_current_alarm()
-        if alarm:
-            try:
-                # Send the current alarm to the newly connected node
-                event = AlarmEvent(EventType.ALARM_SET, {"alarm": alarm.to_dict()})
-                msg = event.to_json() + "\n"
-                conn.sendall(msg.encode())
-                print(f"[HOST APP] Sent ALARM_SET to node {addr}")
-            except Exception as e:
-                print(f"[HOST APP] Failed to send ALARM_SET to node {addr}: {e}")
-                return
-            
-            # If alarm is currently active, also send TRIGGERED event
-            try:
-                if alarm_manager.is_alarm_active():
-                    triggered_event = AlarmEvent(EventType.ALARM_TRIGGERED, {"alarm": alarm.to_dict()})
-                    msg = triggered_event.to_json() + "\n"
-                    conn.sendall(msg.encode())
-                    print(f"[HOST APP] Sent ALARM_TRIGGERED to node {addr}")
-            except Exception as e:
-                print(f"[HOST APP] Failed to send ALARM_TRIGGERED to node {addr}: {e}")
-    except Exception as e:
-        print(f"[HOST APP] Error in on_node_connected for {addr}: {e}")
+    tenant = tenants.get(host.tenant_of(addr))
+    if tenant is None:
+        return
+    if event.type == EventType.HEARTBEAT and (event.data or {}).get("role") == "standby":
+        # Answer standby heartbeats with the full state so they stay in sync
+        # and can tell this host is still alive
+        host.send_to(addr, AlarmEvent(EventType.STATE_SYNC, replicated_state(alarm_manager.get_state())))
+    elif event.type == EventType.HEARTBEAT and "version" in (event.data or {}):
+        # A node's hello: catch it up from the version it reports
+        frame = tenant.manager.get_sync_frame(event.data.get("epoch"), event.data["version"])
+        prepare = tenant.prepare
+        if prepare and event.data.get("prepare"):
+            frame += prepare.to_frame()  # Joined while the alarm is about to fire
+        host.send_raw(addr, frame)
+        log.debug("Synced node %s (%d bytes)", addr, len(frame))
+    elif event.type == EventType.ACK and "spans" in (event.data or {}):
+        # A node reporting how it handled a traced alarm
+        for name, ts in event.data["spans"]:
+            tracer.record(event.data.get("trace_id"), name, node=event.data.get("node_id"), ts=ts)
+    elif event.type == EventType.SNOOZE_PRESSED:
+        data = event.data or {}
+        # Relay summaries stand for distinct devices; anything else is one
+        # device that only counts once per alarm. Devices are named by node
+        # ID, which outlives the connection and a failover.
+        record = host.registry.get(addr)
+        node_id = record.node_id if record else str(addr)
+        key = None if "count" in data else (node_id, data.get("station"))
+        if not tenant.snoozes.submit(key, tenant.manager.alarm_instance(), count=data.get("count", 1),
+                                     source=node_id):
+            return
+        if history and tenant.name == DEFAULT_TENANT:
+            record_snoozes(addr, data)
+        if "trace_id" in data:
+            node_id = data.get("node_id", str(addr))
+            tracer.record(data["trace_id"], "node.snooze", node=node_id, ts=data.get("pressed_at"))
+            tracer.record(data["trace_id"], "host.snooze", node=node_id)
+
+
+
+def record_snoozes(addr, data: dict):
+    """
+    Add a snooze to the history under the device that pressed. A relay's
+    summary names the node and station behind each of its snoozes.
+    """
+    record = host.registry.get(addr)
+    sender = data.get("node_id") or (record.node_id if record else str(addr))
+    origins = data.get("origins", ()) if "count" in data else [[sender, data.get("station")]]
+    for node, station in origins:
+        history.record(SNOOZED, node=f"{node}/{station}" if station and station != node else node)
+    for _ in range(data.get("count", 1) - len(origins)):
+        history.record(SNOOZED, node=sender)  # Summaries from relays that don't name them
+
+
+def capture_local(tenant_name, op, **data):
+    """
+    Record a change made on the host itself, so a replay can make it too.
+    Replays cover the default tenant only.
+    """
+    if capture and tenant_name == DEFAULT_TENANT:
+        capture.local(dict(data, op=op))
+
+
+def counted_snoozes(tenant: Tenant) -> int:
+    """Snoozes of the ringing alarm from the host and devices still in its quorum"""
+    alarm = tenant.manager.get_current_alarm()
+    live = {record.node_id for record in host.quorum_members(zone=alarm.zone if alarm else None,
+                                                            tenant=tenant.name)}
+    return tenant.snoozes.counted(tenant.manager.alarm_instance(),
+                                  lambda node_id: node_id == "host" or node_id in live)
+
+
+def apply_snoozes(tenant: Tenant, count: int):
+    """Hand a batch of deduplicated snoozes to the tenant's alarm manager"""
+    tenant.manager.handle_snooze(
+        connected_nodes_count=quorum_devices(tenant),
+        source=f"{count} device(s)",
+        count=count,
+        snoozed=counted_snoozes(tenant)
+    )
+
+
+def quorum_devices(tenant: Tenant) -> int:
+    """Connected devices that must snooze: the tenant's, in the alarm's zone"""
+    alarm = tenant.manager.get_current_alarm()
+    return host.get_connected_nodes_count(zone=alarm.zone if alarm else None, tenant=tenant.name)
+
+
+def make_tenant(name, state=None) -> Tenant:
+    """New tenant with its own alarm manager, snooze coalescer and scheduler"""
+    manager = AlarmManager(event_callback=dispatcher.dispatch, tracer=tracer, clock=clock, tenant=name)
+    tenant_snoozes = SnoozeCoalescer(flush=lambda count: apply_snoozes(tenant, count))
+    if state:
+        manager.load_state(state["alarm"])
+        tenant_snoozes.load(state["snoozes"])
+    scheduler = AlarmScheduler(manager, clock=clock, tracer=tracer,
+                               on_fire=lambda alarm: capture_local(name, "trigger"),
+                               on_prepare=(lambda alarm, fire_at: prepare_alarm(tenant, alarm, fire_at))
+                               if prepare_lead else None,
+                               prepare_lead=prepare_lead)
+    tenant = Tenant(name, manager, tenant_snoozes, scheduler)
+    return tenant
+
+
+def prepare_alarm(tenant: Tenant, alarm: Alarm, fire_at: float):
+    """
+    Scheduler callback - announce that the tenant's alarm fires soon. The
+    broadcast dispatcher consumer sends it (see send_prepare), so the
+    scheduler thread never waits on a node's socket.
+    """
+    capture_local(tenant.name, "prepare", fire_at=fire_at)
+    event = AlarmEvent(EventType.ALARM_PREPARE, {
+        "alarm": alarm.to_dict(), "zone": alarm.zone, "fire_at": fire_at, **tenant.manager.stamp
+    })
+    tenant.prepare = event
+    dispatcher.dispatch(event)
+
+
+def send_prepare(tenant: Tenant, event: AlarmEvent):
+    """
+    Tell the tenant's nodes the alarm fires soon, so they arm their outputs
+    and confirm over their connection. Halfway to the fire time, nodes that
+    haven't confirmed are reconnected.
+    """
+    if tenant.prepare is not event:
+        return  # Fired, changed or cleared before it went out
+    sent = host.prepare(event, zone=event.data["zone"], tenant=tenant.name)
+    log.info("Asked %d node(s) of tenant %s to prepare for %s", sent, tenant.name,
+             Alarm.from_dict(event.data["alarm"]))
+    delay = max(0.0, event.data["fire_at"] - clock.time()) / 2
+    timer = threading.Timer(delay, check_prepared, args=(tenant, event))
+    timer.daemon = True
+    timer.start()
+
+
+def check_prepared(tenant: Tenant, event: AlarmEvent):
+    """Reconnect nodes that haven't confirmed an ALARM_PREPARE; their hello gets it again"""
+    if tenant.prepare is not event or host.frozen:
+        return  # Fired, changed or cleared meanwhile
+    for record in host.unprepared(event.data["fire_at"], zone=event.data["zone"], tenant=tenant.name):
+        log_host.warning("Node %s of tenant %s isn't ready for the alarm; reconnecting it",
+                         record.node_id, tenant.name)
+        host.drop(record.addr)
+
+
+def liveness_monitor():
+    """
+    While an alarm rings, clear it once every device still believed alive
+    has snoozed, without waiting for suspected-dead nodes to time out
+    """
+    suspected = {}  # tenant -> node IDs suspected while its alarm rings
+    while host and host.running:
+        clock.sleep(1)
+        if host.frozen:
+            suspected.clear()
+            continue
+        for tenant in tenants:
+            if not tenant.manager.is_alarm_active():
+                suspected.pop(tenant.name, None)
+                continue
+            now_suspected = {node["node_id"] for node in host.suspicion(tenant=tenant.name)
+                             if node["suspected"]}
+            for node_id in now_suspected - suspected.get(tenant.name, set()):
+                log_host.warning("Node %s of tenant %s stopped responding; leaving it out of "
+                                 "the snooze quorum", node_id, tenant.name)
+            suspected[tenant.name] = now_suspected
+            if now_suspected and tenant.manager.check_quorum(quorum_devices(tenant), counted_snoozes(tenant)):
+                capture_local(tenant.name, "quorum")
 
 
 def button_monitor():
     """Monitor button presses while alarm is active"""
     while host and host.running:
         try:
+            if host.frozen:
+                clock.sleep(0.05)
+                continue
             if alarm_manager.is_alarm_active() and button:
                 if button.is_pressed():
-                    alarm_manager.handle_snooze(
-                        connected_nodes_count=host.get_connected_nodes_count(),
-                        source="host"
-                    )
-                    time.sleep(0.5)
-            time.sleep(0.05)  # Poll every 50ms
+                    capture_local(DEFAULT_TENANT, "snooze")
+                    if snoozes.submit("host", alarm_manager.alarm_instance()) and history:
+                        history.record(SNOOZED)
+                    clock.sleep(0.5)
+            clock.sleep(0.05)  # Poll every 50ms
         except Exception as e:
-            print(f"[HOST] Error in button monitor: {e}")
-            time.sleep(0.05)
+            log_host.error("Error in button monitor: %s", e)
+            clock.sleep(0.05)
 
 
 def update_display():
     """Update LCD display every minute with current time and alarm status"""
     while host and host.running:
         try:
-            current_time = datetime.now()
+            current_time = clock.now()
             alarm = alarm_manager.get_current_alarm()
 
             # Create a TimeDisplay object with current time and alarm
@@ -154,142 +415,276 @@ def update_display():
             if lcd:
                 lcd.write(display.get_time_line(), display.get_alarm_line())
 
-            print(f"[HOST] Display updated: {display}")
+            log_host.debug("Display updated: %s", display)
 
             # Update every minute (60 seconds)
-            time.sleep(60)
+            clock.sleep(60)
         except Exception as e:
-            print(f"[HOST] Error updating display: {e}")
-            time.sleep(60)
+            log_host.error("Error updating display: %s", e)
+            clock.sleep(60)
+
+
+def is_default_tenant(event: AlarmEvent) -> bool:
+    """Whether an event is the default tenant's; only it has standbys and hardware"""
+    return (event.data or {}).get("tenant", DEFAULT_TENANT) == DEFAULT_TENANT
+
+
+def broadcast_consumer(event: AlarmEvent):
+    """Dispatch consumer - forwards alarm events to the tenant's nodes in their zone"""
+    tenant = event.data.get("tenant", DEFAULT_TENANT)
+    if event.type == EventType.ALARM_PREPARE:
+        # Queued with the other broadcasts, so it never overtakes the trigger
+        if tenants.get(tenant):
+            send_prepare(tenants.get(tenant), event)
+        return
+    if tenants.get(tenant):
+        tenants.get(tenant).prepare = None  # What was coming has fired, changed or gone
+    host.broadcast(event, zone=event.data.get("zone"), tenant=tenant)
+    if event.type == EventType.ALARM_TRIGGERED:
+        host.expect_heartbeats(True, zone=event.data.get("zone"), tenant=tenant)
+    elif event.type == EventType.ALARM_CLEARED:
+        host.expect_heartbeats(False, tenant=tenant)
 
 
-def alarm_scheduler():
-    """Monitor scheduled alarm and trigger it at the right time"""
-    last_logged_time = None  # Track last time we logged the countdown
-    while host and host.running:
-        time.sleep(1)  # Check every second
-        
-        if alarm_manager.is_alarm_active():
-            continue  # Skip if an alarm is already active
-        
-        alarm = alarm_manager.get_current_alarm()
-        if not alarm:
-            last_logged_time = None
-            continue  # Skip if no alarm set
-        
-        current_time = datetime.now()
-        hour_24, minute = alarm.get_24hr_time()
-        
-        # Create alarm time for today
-        alarm_time = current_time.replace(
-            hour=hour_24,
-            minute=minute,
-            second=0,
-            microsecond=0
-        )
-        
-        # If alarm time has passed today, schedule for tomorrow using timedelta
-        if alarm_time <= current_time:
-            from datetime import timedelta
-            alarm_time = alarm_time + timedelta(days=1)
-        
-        time_until_alarm = (alarm_time - current_time).total_seconds()
-        time_diff = (current_time - alarm_time).total_seconds()
-        
-        # Log countdown only when first set or when within 60 seconds
-        if last_logged_time is None or time_until_alarm < 60:
-            if last_logged_time is None:
-                print(f"[HOST SCHEDULER] Alarm set for {alarm} ({alarm_time.strftime('%H:%M:%S')}). Time until: {int(time_until_alarm)}s")
-            last_logged_time = current_time
-        
-        # Check if we're within 1 second of the alarm time
-        if -1 < time_diff < 1:
-            print(f"[HOST SCHEDULER] TRIGGERING ALARM! (time diff: {time_diff:.2f}s)")
-            alarm_manager.trigger_alarm(alarm)
-
-
-def alarm_event_callback(event: AlarmEvent):
-    """Callback for alarm events - broadcasts and updates hardware if needed"""
-    host.broadcast(event)
-    
-    if event.type == EventType.ALARM_TRIGGERED:
-        # Turn on buzzer
-        if buzzer:
-            buzzer.turn_on()
+def replicated_state(state: dict) -> dict:
+    """Alarm state for standbys, with who snoozed so a promoted standby keeps counting them"""
+    return dict(state, snoozes=snoozes.export())
 
-        # **Update LCD immediately**
-        try:
-            if lcd:
-                alarm = Alarm.from_dict(event.data["alarm"])
-                display = TimeDisplay(current_time=datetime.now(), alarm=alarm)
-                lcd.write(display.get_time_line(), "ALARM RINGING!")
-                print("[HOST APP] LCD updated - alarm triggered")
-        except Exception as e:
-            print(f"[HOST APP] Failed to update LCD on alarm trigger: {e}")
 
-    
+def replication_consumer(event: AlarmEvent):
+    """Dispatch consumer - pushes every state change to standby hosts"""
+    if is_default_tenant(event):
+        host.broadcast(AlarmEvent(EventType.STATE_SYNC, replicated_state(event.data)), role="standby")
+
+
+def buzzer_consumer(event: AlarmEvent):
+    """Dispatch consumer - turns the buzzer on when triggered and off when cleared or replaced"""
+    if not buzzer or not is_default_tenant(event):
+        return
+    if event.type == EventType.ALARM_TRIGGERED:
+        buzzer.turn_on()
+        tracer.record(event.data.get("trace_id"), "host.buzzer")
+    elif event.type in (EventType.ALARM_CLEARED, EventType.ALARM_SET):
+        buzzer.turn_off()
+        log.info("Buzzer deactivated")
+
+
+def history_consumer(event: AlarmEvent):
+    """Dispatch consumer - records alarms firing and clearing"""
+    if history and is_default_tenant(event):
+        history.consume(event)
+
+
+def lcd_consumer(event: AlarmEvent):
+    """Dispatch consumer - keeps the LCD in step with alarm state changes"""
+    if not lcd or not is_default_tenant(event):
+        return
+    if event.type == EventType.ALARM_SET:
+        # Update LCD immediately so display doesn't wait for the next minute tick
+        alarm = Alarm.from_dict(event.data["alarm"])
+        display = TimeDisplay(current_time=clock.now(), alarm=alarm)
+        lcd.write(display.get_time_line(), display.get_alarm_line())
+    elif event.type == EventType.ALARM_TRIGGERED:
+        alarm = Alarm.from_dict(event.data["alarm"])
+        display = TimeDisplay(current_time=clock.now(), alarm=alarm)
+        lcd.write(display.get_time_line(), "ALARM RINGING!")
+        log.info("LCD updated - alarm triggered")
     elif event.type == EventType.ALARM_CLEARED:
-        # Turn off the buzzer and update LCD when alarm is cleared
-        try:
-            if buzzer:
-                buzzer.turn_off()
-                print("[HOST APP] Buzzer deactivated")
-        except Exception as e:
-            print(f"[HOST APP] Failed to deactivate buzzer: {e}")
-        
-        try:
-            if lcd:
-                display_now = TimeDisplay(current_time=datetime.now(), alarm=None)
-                lcd.write(display_now.get_time_line(), display_now.get_alarm_line())
-                print("[HOST APP] LCD updated - alarm cleared")
-        except Exception as e:
-            print(f"[HOST APP] Failed to update LCD on alarm clear: {e}")
+        display_now = TimeDisplay(current_time=clock.now(), alarm=None)
+        lcd.write(display_now.get_time_line(), display_now.get_alarm_line())
+        log.info("LCD updated - alarm cleared")
 
 
-def main():
-    global host, alarm_manager, lcd, buzzer, button
-    host = AlarmHost(port=5001, event_handler=handle_event, on_node_connected=on_node_connected)
-    alarm_manager = AlarmManager(event_callback=alarm_event_callback)
-    
-    # Start Flask web server in a background thread so the form works
-    try:
-        flask_thread = threading.Thread(
-            target=lambda: app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False),
-            daemon=True,
-        )
-        flask_thread.start()
-        print("[HOST APP] Flask webserver started on port 5000")
-    except Exception as e:
-        print(f"[HOST APP] Failed to start Flask webserver: {e}")
+def run_schedulers():
+    """Check every tenant's alarm once a second, on one thread however many there are"""
+    while host.running and not host.frozen:
+        clock.sleep(AlarmScheduler.CHECK_INTERVAL)
+        for tenant in tenants:
+            try:
+                tenant.scheduler.tick()
+            except Exception as e:
+                log_host.error("Scheduler of tenant %s failed: %s", tenant.name, e)
 
-    # Initialize LCD and Buzzer
-    try:
-        lcd = LCD()
-        print("[HOST APP] LCD initialized")
-    except Exception as e:
-        print(f"[HOST APP] Failed to initialize LCD: {e}")
-    
+
+def start_scheduler():
+    global scheduler_thread
+    scheduler_thread = threading.Thread(target=run_schedulers, daemon=True)
+    scheduler_thread.start()
+
+
+def hand_off(channel) -> bool:
+    """
+    Give this host's connections and state to a new host process.
+
+    Everything that could change the state is stopped first, then the
+    sockets and state are sent. If the new process doesn't confirm, this
+    host carries on as before.
+
+    Returns:
+        True once the new process has taken over
+    """
+    log.info("New host process asked to take over")
+    host.freeze()
+    scheduler_thread.join()
+    for tenant in tenants:
+        tenant.snoozes.drain()
+    dispatcher.stop()  # Broadcasts already queued go out first
+    state = {
+        "alarm": alarm_manager.get_state(),
+        "snoozes": snoozes.export(),
+        "tenants": tenants.export(),
+        "service_name": host.service_name,
+    }
     try:
-        buzzer = BuzzerController(buzzer_pin=4)  # Adjust pin as needed
-        print("[HOST APP] Buzzer initialized")
+        send_handoff(channel, host.export_listeners(), host.export_connections(), state)
     except Exception as e:
-        print(f"[HOST APP] Failed to initialize Buzzer: {e}")
-    
-    # Initialize button
+        log.error("Handoff failed, carrying on: %s", e)
+        dispatcher.start()
+        host.resume()
+        start_scheduler()
+        return False
+
+    # The new process waits for this one to exit before it uses the
+    # hardware and the web port
+    host.release()
+    history.close()
+    if capture:
+        capture.close()
+    if lcd:
+        lcd.close()
+    if buzzer:
+        buzzer.turn_off()
+    if button:
+        button.close()
+    handed_off.set()
+    return True
+
+
+def main():
+    global host, tenants, alarm_manager, dispatcher, snoozes, history, capture, lcd, buzzer, button
+    global prepare_lead
+    parser = argparse.ArgumentParser(description="Alarm mesh host")
+    parser.add_argument("--standby", action="store_true",
+                        help="Replicate state from the active host and take over if it fails")
+    parser.add_argument("--priority", type=int, default=1,
+                        help="Election rank as a standby; lower takes over first")
+    parser.add_argument("--takeover", action="store_true",
+                        help="Take over the connections of the host running on this machine")
+    parser.add_argument("--handoff-socket", default=HANDOFF_PATH,
+                        help="Unix socket used to hand connections to a new host process")
+    parser.add_argument("--unix-socket", default="/tmp/alarm-host.sock",
+                        help="Unix socket for nodes on this machine ('' to disable)")
+    parser.add_argument("--history-dir", default=os.path.expanduser("~/.alarm-host/history"),
+                        help="Where alarm history is stored")
+    parser.add_argument("--capture", metavar="PATH",
+                        help="Record every frame in and out to this file, for host.replay")
+    parser.add_argument("--prepare-lead", type=float, default=prepare_lead,
+                        help="Seconds before an alarm fires that nodes arm their outputs (0 disables)")
+    parser.add_argument("--max-tenants", type=int, default=64,
+                        help="Most alarm meshes (tenants) served at once, the default one included")
+    args = parser.parse_args()
+    prepare_lead = args.prepare_lead
+
+    configure_logging()
+    transports = [TcpTransport(5001)]
+    if args.unix_socket:
+        transports.append(UnixTransport(args.unix_socket))
+    # Nodes join the tenant they name in their hello; unknown tenants are
+    # created on first use, up to --max-tenants
+    host = AlarmHost(event_handler=handle_event, tracer=tracer, clock=clock, transports=transports,
+                     accept_tenant=lambda name: tenants.get_or_create(name) is not None)
+
+    # State changes are applied under the manager lock; broadcast, buzzer and
+    # LCD updates run afterwards on their own dispatcher threads
+    dispatcher = EventDispatcher()
+    dispatcher.add_consumer("broadcast", broadcast_consumer,
+                            event_types=[EventType.ALARM_SET, EventType.ALARM_TRIGGERED,
+                                         EventType.ALARM_CLEARED, EventType.ALARM_PREPARE])
+    dispatcher.add_consumer("replication", replication_consumer,
+                            event_types=[EventType.STATE_SYNC])
+    dispatcher.add_consumer("buzzer", buzzer_consumer,
+                            event_types=[EventType.ALARM_SET, EventType.ALARM_TRIGGERED,
+                                         EventType.ALARM_CLEARED])
+    dispatcher.add_consumer("lcd", lcd_consumer)
+    dispatcher.add_consumer("history", history_consumer,
+                            event_types=[EventType.ALARM_TRIGGERED, EventType.STATE_SYNC])
+    tenants = TenantRegistry(make_tenant, max_tenants=args.max_tenants)
+    default = tenants.default()
+    alarm_manager, snoozes = default.manager, default.snoozes
+
+    if args.takeover:
+        # Serve the running host's connections, then wait for it to exit
+        # and free the hardware and web port
+        with readiness.phase("takeover"):
+            handoff = request_handoff(args.handoff_socket)
+            alarm_manager.load_state(handoff.state["alarm"])
+            snoozes.load(handoff.state["snoozes"])
+            tenants.load(handoff.state.get("tenants", {}))
+            host.service_name = handoff.state["service_name"]
+            host.adopt(handoff.listeners, handoff.connections)
+            start_scheduler()  # The old scheduler stopped before the handoff
+            handoff.complete()
+
+    # Opened after a takeover, once the old process has closed it
+    history = AlarmHistory(args.history_dir, clock=clock)
+
+    # Hardware initializes in the background while the network side starts
+    hardware = readiness.start_parallel({
+        "lcd": LCD,
+        "buzzer": lambda: BuzzerController(buzzer_pin=4),  # Adjust pin as needed
+        "button": lambda: SnoozeButton(button_pin=10),     # Adjust pin as needed
+    })
+
+    if args.standby:
+        standby = StandbyHost(alarm_manager, port=host.port, priority=args.priority, clock=clock,
+                              snoozes=snoozes)
+        try:
+            with readiness.phase("standby"):
+                standby.run_until_promoted()
+        except KeyboardInterrupt:
+            log.info("Stopping standby")
+            standby.stop()
+            return
+        host.service_name = standby.host_service_name
+
+    if args.capture:
+        # Starts from the state this host serves from, so a replay can too
+        capture = FrameCapture(args.capture, state=alarm_manager.get_state(), clock=clock)
+        host.capture = capture
+        log.info("Capturing traffic to %s", args.capture)
+
+    # Start Flask web server in a background thread so the form works
     try:
-        button = SnoozeButton(button_pin=10)  # Adjust pin as needed
-        print("[HOST APP] Button initialized")
+        with readiness.phase("web"):
+            flask_thread = threading.Thread(
+                target=lambda: app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False),
+                daemon=True,
+            )
+            flask_thread.start()
+        log.info("Flask webserver started on port 5000")
     except Exception as e:
-        print(f"[HOST APP] Failed to initialize Button: {e}")
-    
-    host.start()
+        log.error("Failed to start Flask webserver: %s", e)
+
+    with readiness.phase("host"):
+        if args.takeover:
+            host.start_advertising()
+        else:
+            host.start()
+
+    # The buzzer and LCD consumers need their hardware before events flow
+    lcd = hardware["lcd"].result()
+    buzzer = hardware["buzzer"].result()
+    button = hardware["button"].result()
+    dispatcher.start()
+    if args.standby or args.takeover:
+        # Bring the buzzer and LCD in line with the replicated state
+        alarm_manager.announce_state()
 
-    print("[HOST APP] Host is running.")
-    time.sleep(2)
+    log.info("Host is running.")
 
     # Start the alarm scheduler thread
-    scheduler_thread = threading.Thread(target=alarm_scheduler, daemon=True)
-    scheduler_thread.start()
+    if scheduler_thread is None:
+        start_scheduler()
 
     # Start the display update thread
     display_thread = threading.Thread(target=update_display, daemon=True)
@@ -299,19 +694,29 @@ def main():
     button_thread = threading.Thread(target=button_monitor, daemon=True)
     button_thread.start()
 
-    # Keep alive forever
+    # Start the thread that drops dead nodes from a ringing alarm's quorum
+    threading.Thread(target=liveness_monitor, daemon=True).start()
+    serve_handoff(hand_off, args.handoff_socket)
+    readiness.mark_ready()
+
+    # Keep alive until stopped or replaced by a new host process
     try:
-        while True:
-            time.sleep(1)
+        while not handed_off.wait(1):
+            pass
+        log.info("Handed off to the new host process, exiting")
     except KeyboardInterrupt:
-        print("[HOST APP] Stopping")
+        log.info("Stopping")
         if lcd:
             lcd.close()
         if buzzer:
             buzzer.turn_off()
         if button:
             button.close()
+        dispatcher.stop()
         host.stop()
+        history.close()
+        if capture:
+            capture.close()
 
 if __name__ == "__main__":
     main()
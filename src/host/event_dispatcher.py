@@ -0,0 +1,91 @@
+import queue
+import threading
+from common.comms.protocol import AlarmEvent
+from common.log import get_logger
+
+log = get_logger("DISPATCH")
+
+_STOP = object()
+
+
+class _Consumer:
+    """A named side-effect handler with its own queue and worker thread"""
+
+    def __init__(self, name, handler, event_types=None):
+        self.name = name
+        self.handler = handler
+        self.event_types = set(event_types) if event_types else None
+        self.queue = queue.SimpleQueue()
+        self.thread = None
+
+    def wants(self, event: AlarmEvent) -> bool:
+        return self.event_types is None or event.type in self.event_types
+
+    def run(self):
+        while True:
+            event = self.queue.get()
+            if event is _STOP:
+                return
+            try:
+                self.handler(event)
+            except Exception as e:
+                log.error("Consumer %s failed on %s: %s", self.name, event.type.name, e)
+
+
+class EventDispatcher:
+    """
+    Ordered, non-blocking fan-out of alarm events to side-effect consumers.
+
+    AlarmManager calls dispatch() while holding its lock, so dispatch() only
+    appends to each interested consumer's queue and returns. Every consumer
+    (network broadcast, buzzer, LCD, ...) drains its own queue on its own
+    thread, so a slow LCD write never delays a broadcast, and each consumer
+    sees events in the order the manager produced them.
+    """
+
+    def __init__(self):
+        self.consumers = []
+        self.running = False
+
+    def add_consumer(self, name, handler, event_types=None):
+        """
+        Register a consumer. Must be called before start().
+
+        Args:
+            name: Name used in log messages and as the worker thread name
+            handler: Function taking (event: AlarmEvent)
+            event_types: Optional iterable of EventType to receive; None for all
+        """
+        self.consumers.append(_Consumer(name, handler, event_types))
+
+    def dispatch(self, event: AlarmEvent):
+        """Queue an event for every interested consumer. Never blocks."""
+        for consumer in self.consumers:
+            if consumer.wants(event):
+                consumer.queue.put(event)
+
+    def start(self):
+        """
+        Start a worker per consumer. Does nothing if already running; after
+        stop(), waits for each old worker to drain to its stop marker first,
+        so no consumer ever has two workers.
+        """
+        if self.running:
+            return
+        self.running = True
+        for consumer in self.consumers:
+            if consumer.thread and consumer.thread.is_alive():
+                consumer.thread.join()
+            consumer.thread = threading.Thread(
+                target=consumer.run, name=f"dispatch-{consumer.name}", daemon=True
+            )
+            consumer.thread.start()
+
+    def stop(self, timeout=1.0):
+        """Stop all consumers after they drain the events already queued"""
+        self.running = False
+        for consumer in self.consumers:
+            consumer.queue.put(_STOP)
+        for consumer in self.consumers:
+            if consumer.thread:
+                consumer.thread.join(timeout=timeout)
@@ -0,0 +1,152 @@
+import socket
+from zeroconf import ServiceInfo
+from common.clock import SYSTEM_CLOCK
+from common.comms.host_server import AlarmHost, get_lan_ip
+from common.comms.node_client import AlarmNode
+from common.comms.protocol import AlarmEvent, EventType
+from host.alarm_manager import AlarmManager
+from common.log import get_logger
+
+log = get_logger("STANDBY")
+
+
+class StandbyHost:
+    """
+    Follows the active host and takes over if it fails.
+
+    The standby connects to the active host like a node, announcing itself
+    with role "standby" in its heartbeats, and applies every STATE_SYNC it
+    receives to a local AlarmManager. The devices that snoozed the ringing
+    alarm go to a local SnoozeCoalescer, so they still count once the
+    standby is promoted. It also advertises itself on the
+    `_alarmhost._tcp.local.` service with role "standby" (nodes ignore those).
+
+    If the active host closes the connection or goes silent for
+    FAILOVER_TIMEOUT seconds, an election starts: each standby waits
+    `priority * ELECTION_STEP` seconds, so the lowest priority number goes
+    first. If by then no other host has been announced (or can be reached),
+    the standby promotes itself. Higher-numbered standbys see the new host
+    announced and start following it instead.
+    """
+
+    HEARTBEAT_INTERVAL = 2  # Seconds between heartbeats to the active host
+    FAILOVER_TIMEOUT = 6    # Silence from the active host before it is presumed dead
+    ELECTION_STEP = 1.5     # Seconds of election back-off per priority rank
+    STARTUP_GRACE = 5       # Seconds to look for an active host before the first election
+
+    STANDBY_NAME_FORMAT = "AlarmHostStandby-{}._alarmhost._tcp.local."
+    HOST_NAME_FORMAT = "AlarmHostService-{}._alarmhost._tcp.local."
+
+    def __init__(self, alarm_manager: AlarmManager, port=5001, priority=1, standby_id=None,
+                 clock=SYSTEM_CLOCK, snoozes=None):
+        self.alarm_manager = alarm_manager
+        self.snoozes = snoozes  # SnoozeCoalescer to keep in step, so snooze progress survives promotion
+        self.clock = clock
+        self.port = port
+        self.priority = priority
+        self.standby_id = standby_id or socket.gethostname()
+        self.node = AlarmNode(service_filter=lambda name, props: props.get("role") == "host",
+                              clock=clock)
+        self.service_info = None
+
+    @property
+    def host_service_name(self) -> str:
+        """Zeroconf name to advertise under once promoted"""
+        return self.HOST_NAME_FORMAT.format(self.standby_id)
+
+    def _advertise(self):
+        self.service_info = ServiceInfo(
+            type_=AlarmHost.SERVICE_TYPE,
+            name=self.STANDBY_NAME_FORMAT.format(self.standby_id),
+            addresses=[socket.inet_aton(get_lan_ip())],
+            port=self.port,
+            properties={"role": "standby", "priority": str(self.priority)}
+        )
+        self.node.zeroconf.register_service(self.service_info)
+
+    def _follow_active(self) -> bool:
+        """
+        Replicate state from the active host until the link is lost.
+
+        Returns:
+            True if the host asked us to reconnect later rather than failing
+        """
+        sock = self.node.socket
+        sock.settimeout(self.HEARTBEAT_INTERVAL)
+        heartbeat = AlarmEvent(EventType.HEARTBEAT, {"role": "standby", "node_id": self.standby_id})
+        buffer = ""
+        last_received = self.clock.time()
+        last_heartbeat = 0
+
+        while self.node.connected and sock is self.node.socket:
+            now = self.clock.time()
+            if now - last_heartbeat >= self.HEARTBEAT_INTERVAL:
+                heartbeat.timestamp = now
+                self.node.send(heartbeat)
+                last_heartbeat = now
+            if now - last_received > self.FAILOVER_TIMEOUT:
+                log.warning("No word from active host in %ds", self.FAILOVER_TIMEOUT)
+                break
+
+            try:
+                data = sock.recv(4096).decode()
+            except socket.timeout:
+                continue
+            except Exception:
+                break
+            if not data:
+                break
+            last_received = self.clock.time()
+            buffer += data
+
+            while "\n" in buffer:
+                packet, buffer = buffer.split("\n", 1)
+                event = AlarmEvent.from_json(packet)
+                if event.type == EventType.STATE_SYNC:
+                    if self.alarm_manager.load_state(event.data):
+                        if self.snoozes and "snoozes" in event.data:
+                            self.snoozes.load(event.data["snoozes"])
+                        log.debug("Replicated state version %d", event.data["version"])
+                elif event.type == EventType.RETRY_AFTER:
+                    # The host is alive, just busy admitting nodes
+                    self.node.defer_reconnect(event.data["retry_after"])
+                    return True
+
+        self.node.disconnect(sock)
+        return False
+
+    def run_until_promoted(self):
+        """Block while following the active host; return once this standby is elected"""
+        self._advertise()
+        self.node.start_discovery()
+        log.info("Standby %s (priority %d) looking for the active host",
+                 self.standby_id, self.priority)
+
+        wait = self.STARTUP_GRACE
+        while True:
+            # Give the active host (or a faster standby) a chance to show up
+            deadline = max(self.clock.time() + wait, self.node.retry_at)
+            while self.clock.time() < deadline and not self.node.connected:
+                self.clock.sleep(0.1)
+
+            if self.node.connected or self.node.reconnect():
+                log.info("Following active host %s", self.node.host_name)
+                if self._follow_active():
+                    wait = 0
+                    continue
+                log.warning("Lost active host, starting election")
+                wait = self.priority * self.ELECTION_STEP
+                continue
+
+            log.warning("No active host found, taking over (state version %d)",
+                        self.alarm_manager.get_state()["version"])
+            self.stop()
+            return
+
+    def stop(self):
+        try:
+            if self.service_info:
+                self.node.zeroconf.unregister_service(self.service_info)
+        except Exception:
+            pass
+        self.node.stop()
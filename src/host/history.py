@@ -0,0 +1,242 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from common.clock import SYSTEM_CLOCK
+from common.comms.protocol import AlarmEvent, EventType
+from common.log import get_logger
+
+log = get_logger("HISTORY")
+
+# Record kinds
+FIRED = 1
+SNOOZED = 2
+CLEARED = 3
+
+RECORD = struct.Struct("<dIIB7x")  # ts, alarm number, node index, kind
+HEADER = struct.Struct("<4sIQ")    # magic, record size, records written
+MAGIC = b"AHIS"
+
+
+class _Segment:
+    """One preallocated, memory-mapped segment file of fixed-width records"""
+
+    def __init__(self, path, capacity):
+        size = HEADER.size + capacity * RECORD.size
+        exists = os.path.exists(path)
+        self.file = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        if exists:
+            magic, record_size, self.count = HEADER.unpack_from(self.map)
+            if magic != MAGIC or record_size != RECORD.size:
+                raise ValueError(f"{path} is not a history segment")
+        else:
+            self.count = 0
+            HEADER.pack_into(self.map, 0, MAGIC, RECORD.size, 0)
+        self.capacity = (len(self.map) - HEADER.size) // RECORD.size
+
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    def append(self, ts, alarm, node, kind):
+        RECORD.pack_into(self.map, HEADER.size + self.count * RECORD.size, ts, alarm, node, kind)
+        self.count += 1
+        # The count goes last, so a crash never exposes a half-written record
+        HEADER.pack_into(self.map, 0, MAGIC, RECORD.size, self.count)
+
+    def ts(self, i) -> float:
+        return struct.unpack_from("<d", self.map, HEADER.size + i * RECORD.size)[0]
+
+    def first_at_or_after(self, since) -> int:
+        """Index of the first record at or after `since` (records are in time order)"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts(mid) < since:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def records(self, start=0):
+        """Iterate (ts, alarm, node, kind) straight off the mapped file"""
+        view = memoryview(self.map)[HEADER.size + start * RECORD.size:
+                                    HEADER.size + self.count * RECORD.size]
+        try:
+            yield from RECORD.iter_unpack(view)
+        finally:
+            view.release()
+
+    def close(self):
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+
+class AlarmHistory:
+    """
+    Append-only history of alarm fires, snoozes and clears.
+
+    Records are 24 bytes each (timestamp, alarm number, node, kind) in
+    memory-mapped segment files of SEGMENT_RECORDS records. When a segment
+    fills up the store rolls over to a new one, and beyond MAX_SEGMENTS the
+    oldest is deleted, so the store is a ring of bounded size. Node names are
+    kept once in nodes.json and referenced by index.
+
+    Queries binary-search to the start of their window and unpack records
+    straight from the mapped files; nothing is loaded up front.
+    """
+
+    SEGMENT_RECORDS = 1 << 16  # 1.5MB per segment
+    MAX_SEGMENTS = 64          # ~4 million records before the oldest go
+
+    def __init__(self, directory, clock=SYSTEM_CLOCK,
+                 segment_records=SEGMENT_RECORDS, max_segments=MAX_SEGMENTS):
+        """
+        Args:
+            directory: Where segment files and the node table live
+            clock: Time source for record timestamps and query windows
+            segment_records: Records per segment file
+            max_segments: Segments kept before the oldest is deleted
+        """
+        self.directory = directory
+        self.clock = clock
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        self.nodes_path = os.path.join(directory, "nodes.json")
+        self.nodes = ["host"]
+        if os.path.exists(self.nodes_path):
+            with open(self.nodes_path) as f:
+                self.nodes = json.load(f)
+        self.node_index = {name: i for i, name in enumerate(self.nodes)}
+
+        self.segments = [_Segment(os.path.join(directory, name), segment_records)
+                         for name in sorted(os.listdir(directory)) if name.endswith(".seg")]
+        if not self.segments:
+            self._roll_over()
+        self.alarm = 0  # Number of the latest fire; snoozes and clears refer to it
+        self.ringing = False  # Fired and not cleared yet
+        for segment in reversed(self.segments):
+            if segment.count:
+                *_, last = segment.records(segment.count - 1)
+                self.alarm = last[1]
+                self.ringing = last[3] != CLEARED
+                break
+
+    def _roll_over(self):
+        number = int(os.path.basename(self.segments[-1].file.name)[:-4]) + 1 if self.segments else 0
+        path = os.path.join(self.directory, f"{number:08d}.seg")
+        self.segments.append(_Segment(path, self.segment_records))
+        while len(self.segments) > self.max_segments:
+            oldest = self.segments.pop(0)
+            oldest.close()
+            os.unlink(oldest.file.name)
+        log.debug("Rolled over to %s", path)
+
+    def _node(self, name) -> int:
+        index = self.node_index.get(name)
+        if index is None:
+            index = self.node_index[name] = len(self.nodes)
+            self.nodes.append(name)
+            with open(self.nodes_path + ".tmp", "w") as f:
+                json.dump(self.nodes, f)
+            os.replace(self.nodes_path + ".tmp", self.nodes_path)
+        return index
+
+    # ------------------------------
+    # Recording
+    # ------------------------------
+    def record(self, kind, node="host", ts=None):
+        """
+        Append a record.
+
+        Args:
+            kind: FIRED, SNOOZED or CLEARED
+            node: Device the record is about
+            ts: Unix timestamp (default: now)
+        """
+        with self.lock:
+            self._append(kind, node, ts)
+
+    def _append(self, kind, node="host", ts=None):
+        # Called with the lock held: snoozes arrive on receive threads while
+        # fires and clears come from the dispatcher, and segment appends
+        # must not interleave
+        if kind == FIRED:
+            self.alarm += 1
+        if self.segments[-1].full():
+            self._roll_over()
+        self.segments[-1].append(ts if ts is not None else self.clock.time(),
+                                 self.alarm, self._node(node), kind)
+
+    def consume(self, event: AlarmEvent):
+        """
+        Dispatch consumer - records alarms firing and stopping.
+
+        Takes ALARM_TRIGGERED and STATE_SYNC: the alarm stopped (snoozed,
+        removed or replaced) when the replicated state stops being active.
+        """
+        with self.lock:
+            if event.type == EventType.ALARM_TRIGGERED and not event.data.get("snapshot"):
+                self.ringing = True
+                self._append(FIRED)
+            elif event.type == EventType.STATE_SYNC and self.ringing and not event.data["alarm_active"]:
+                self.ringing = False
+                self._append(CLEARED)
+
+    # ------------------------------
+    # Queries
+    # ------------------------------
+    def _records_since(self, since):
+        """Records at or after `since`, oldest first, under the lock"""
+        for segment in self.segments:
+            if not segment.count or segment.ts(segment.count - 1) < since:
+                continue
+            yield from segment.records(segment.first_at_or_after(since))
+
+    def time_to_clear(self, days=30) -> dict:
+        """
+        How long alarms rang over the last `days` days.
+
+        Returns:
+            {"alarms": n, "mean_clear_s": mean seconds from fire to clear,
+             "nodes": {node: {"snoozes": n, "mean_snooze_s": mean seconds
+             from fire to that node's snooze}}}
+        """
+        since = self.clock.time() - days * 86400
+        fired = {}    # alarm number -> fire time
+        clears = [0, 0.0]
+        per_node = {}  # node index -> [count, total seconds]
+        with self.lock:
+            for ts, alarm, node, kind in self._records_since(since):
+                if kind == FIRED:
+                    fired[alarm] = ts
+                    continue
+                start = fired.get(alarm)
+                if start is None:
+                    continue  # Fired before the window
+                if kind == SNOOZED:
+                    totals = per_node.setdefault(node, [0, 0.0])
+                    totals[0] += 1
+                    totals[1] += ts - start
+                elif kind == CLEARED:
+                    clears[0] += 1
+                    clears[1] += ts - start
+            names = list(self.nodes)
+        return {
+            "alarms": len(fired),
+            "mean_clear_s": round(clears[1] / clears[0], 3) if clears[0] else None,
+            "nodes": {names[node]: {"snoozes": count, "mean_snooze_s": round(total / count, 3)}
+                      for node, (count, total) in per_node.items()},
+        }
+
+    def close(self):
+        with self.lock:
+            for segment in self.segments:
+                segment.close()
@@ -0,0 +1,315 @@
+"""
+Replays a captured host session against a fresh AlarmHost and AlarmManager.
+
+Reads a capture recorded with `python -m host.app --capture PATH`, starts a
+host in this process from the captured initial state, and plays every node
+connection, frame and local change (alarm set or removed, host button,
+scheduler fire) back at the recorded pace, sped up by --speed. The frames the
+new host sends are compared with the recorded ones, connection by connection,
+and response latencies of both are reported.
+
+Run from src/:  python -m host.replay capture.bin --speed 50
+"""
+import argparse
+import difflib
+import io
+import itertools
+import json
+import time
+from common.clock import Clock, VirtualClock
+from common.comms.capture import (BROADCAST, CLOSE, IN, LOCAL, OPEN, OUT, STANDBY_BROADCAST,
+                                  FrameCapture, read_capture)
+from common.comms.host_server import AlarmHost
+from common.comms.protocol import Alarm, AlarmEvent, EventType
+from common.comms.transport import InProcTransport
+from common.log import configure_logging, get_logger
+from host.alarm_manager import AlarmManager
+from host.event_dispatcher import EventDispatcher
+from host.snooze_filter import SnoozeCoalescer
+
+log = get_logger("REPLAY")
+
+VOLATILE = ("timestamp", "trace_id", "spans")  # Differ on every run; not compared
+NAMES = {BROADCAST: "broadcast", STANDBY_BROADCAST: "standby broadcast"}
+MAX_SPEED = 100
+_replays = itertools.count(1)
+
+
+class _Stopwatch(Clock):
+    """Timestamps the replay's own capture with a monotonic high-resolution clock"""
+
+    def time(self) -> float:
+        return time.perf_counter()
+
+
+class Replay:
+    """
+    One captured session played against a fresh host.
+
+    The host runs on a VirtualClock that follows the captured timestamps, so
+    heartbeat timeouts and the failure detector see the same times they did
+    live; nodes connect over the in-process transport. Handling of node
+    frames mirrors host.app: hellos are caught up, standby heartbeats get
+    the state, snoozes go through a SnoozeCoalescer.
+    """
+
+    def __init__(self, source, speed=1.0):
+        """
+        Args:
+            source: Capture file path or readable binary file
+            speed: Playback speed, 1 (as recorded) to MAX_SPEED
+        """
+        if not 0 < speed <= MAX_SPEED:
+            raise ValueError(f"speed must be above 0 and at most {MAX_SPEED}")
+        self.speed = speed
+        self.state, self.records = read_capture(source)
+        start = self.records[0][0] if self.records else 0.0
+        self.clock = VirtualClock(start)
+        self.output = io.BytesIO()
+        self.capture = FrameCapture(self.output, state=self.state, clock=_Stopwatch())
+        self.transport = InProcTransport(f"replay-{next(_replays)}")
+
+        self.dispatcher = EventDispatcher()
+        self.dispatcher.add_consumer("broadcast", self._broadcast,
+                                     event_types=[EventType.ALARM_SET, EventType.ALARM_TRIGGERED,
+                                                  EventType.ALARM_CLEARED])
+        self.dispatcher.add_consumer("replication", self._replicate,
+                                     event_types=[EventType.STATE_SYNC])
+        self.manager = AlarmManager(event_callback=self.dispatcher.dispatch, clock=self.clock)
+        if self.state:
+            self.manager.load_state(self.state)
+        self.snoozes = SnoozeCoalescer(flush=self._apply_snoozes,
+                                       window=SnoozeCoalescer.WINDOW / speed)
+        self.host = AlarmHost(transports=[self.transport], event_handler=self._handle_event,
+                              accept_rate=1e9, accept_burst=1 << 30, clock=self.clock,
+                              capture=self.capture)
+        self.conns = {}       # Captured connection number -> node end of its replayed connection
+        self.inputs = []      # perf_counter time each input was played
+        self.errors = []
+
+    # ------------------------------
+    # Host side (as in host.app)
+    # ------------------------------
+    def _handle_event(self, event: AlarmEvent, addr):
+        data = event.data or {}
+        if event.type == EventType.HEARTBEAT and data.get("role") == "standby":
+            self.host.send_to(addr, AlarmEvent(EventType.STATE_SYNC,
+                                               dict(self.manager.get_state(), snoozes=self.snoozes.export())))
+        elif event.type == EventType.HEARTBEAT and "version" in data:
+            self.host.send_raw(addr, self.manager.get_sync_frame(data.get("epoch"), data["version"]))
+        elif event.type == EventType.SNOOZE_PRESSED:
+            record = self.host.registry.get(addr)
+            node_id = record.node_id if record else str(addr)
+            key = None if "count" in data else (node_id, data.get("station"))
+            self.snoozes.submit(key, self.manager.alarm_instance(), count=data.get("count", 1),
+                                source=node_id)
+
+    def _quorum_devices(self) -> int:
+        alarm = self.manager.get_current_alarm()
+        return self.host.get_connected_nodes_count(zone=alarm.zone if alarm else None)
+
+    def _counted_snoozes(self) -> int:
+        alarm = self.manager.get_current_alarm()
+        live = {record.node_id for record in self.host.quorum_members(zone=alarm.zone if alarm else None)}
+        return self.snoozes.counted(self.manager.alarm_instance(),
+                                    lambda node_id: node_id == "host" or node_id in live)
+
+    def _apply_snoozes(self, count: int):
+        self.manager.handle_snooze(connected_nodes_count=self._quorum_devices(),
+                                   source=f"{count} device(s)", count=count,
+                                   snoozed=self._counted_snoozes())
+
+    def _broadcast(self, event: AlarmEvent):
+        self.host.broadcast(event, zone=event.data.get("zone"))
+        if event.type == EventType.ALARM_TRIGGERED:
+            self.host.expect_heartbeats(True, zone=event.data.get("zone"))
+        elif event.type == EventType.ALARM_CLEARED:
+            self.host.expect_heartbeats(False)
+
+    def _replicate(self, event: AlarmEvent):
+        self.host.broadcast(event, role="standby")
+
+    def _apply_local(self, change: dict):
+        op = change["op"]
+        if op == "set":
+            self.manager.set_alarm(Alarm.from_dict(change["alarm"]))
+        elif op == "remove":
+            self.manager.remove_alarm()
+        elif op == "batch":
+            self.manager.apply_batch([(name, Alarm.from_dict(alarm) if alarm else None)
+                                      for name, alarm in change["operations"]])
+        elif op == "trigger":
+            alarm = self.manager.get_current_alarm()
+            if alarm:
+                self.manager.trigger_alarm(alarm)
+        elif op == "snooze":
+            self.snoozes.submit("host", self.manager.alarm_instance())
+        elif op == "prepare":
+            alarm = self.manager.get_current_alarm()
+            if alarm:
+                self.host.prepare(AlarmEvent(EventType.ALARM_PREPARE, {
+                    "alarm": alarm.to_dict(), "zone": alarm.zone, "fire_at": change["fire_at"]
+                }), zone=alarm.zone)
+        elif op == "quorum":
+            self.manager.check_quorum(self._quorum_devices(), self._counted_snoozes())
+        else:
+            raise ValueError(f"unknown local change {op!r}")
+
+    # ------------------------------
+    # Playback
+    # ------------------------------
+    def run(self, settle=0.5) -> dict:
+        """
+        Play the whole capture, then compare.
+
+        Args:
+            settle: Seconds to let the host finish answering after the last record
+
+        Returns:
+            Report from compare()
+        """
+        self.dispatcher.start()
+        self.host.running = True
+        self.host.start_server()
+        first = self.records[0][0] if self.records else 0.0
+        began = time.perf_counter()
+        for ts, kind, number, payload in self.records:
+            delay = began + (ts - first) / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.clock.advance_to(ts)
+            try:
+                self._play(kind, number, payload)
+            except Exception as e:
+                self.errors.append(f"{kind}/{number}: {type(e).__name__}: {e}")
+        played_s = time.perf_counter() - began
+        time.sleep(settle)
+        self.dispatcher.stop()
+        self.host.stop()
+        self.capture.file.flush()
+        report = self.compare()
+        report["played_s"] = round(played_s, 3)
+        report["captured_s"] = round(self.records[-1][0] - first, 3) if self.records else 0.0
+        return report
+
+    def _play(self, kind, number, payload):
+        if kind == OPEN:
+            self.conns[number] = self.transport.connect()
+        elif kind == IN:
+            conn = self.conns.get(number)
+            if conn is None:  # Adopted in a handoff before capture began
+                conn = self.conns[number] = self.transport.connect()
+            self.inputs.append(time.perf_counter())
+            conn.sendall(payload + b"\n")
+        elif kind == CLOSE:
+            conn = self.conns.pop(number, None)
+            if conn:
+                conn.close()
+        elif kind == LOCAL:
+            self.inputs.append(time.perf_counter())
+            self._apply_local(json.loads(payload))
+
+    # ------------------------------
+    # Comparison
+    # ------------------------------
+    @staticmethod
+    def _outputs(records) -> dict:
+        """Normalized events sent per connection number"""
+        sent = {}
+        for _, kind, number, payload in records:
+            if kind != OUT:
+                continue
+            for line in payload.split(b"\n"):
+                if not line:
+                    continue
+                message = json.loads(line)
+                message.pop("timestamp", None)
+                for key in VOLATILE:
+                    (message.get("data") or {}).pop(key, None)
+                sent.setdefault(number, []).append(json.dumps(message, sort_keys=True))
+        return sent
+
+    @staticmethod
+    def _latencies(records) -> list:
+        """
+        Seconds from each input to the first frame sent after it, for inputs
+        answered before the next one arrived.
+        """
+        latencies = []
+        pending = None
+        for ts, kind, _, _ in records:
+            if kind in (IN, LOCAL):
+                pending = ts
+            elif kind == OUT and pending is not None:
+                latencies.append(ts - pending)
+                pending = None
+        return latencies
+
+    @staticmethod
+    def _summary(latencies) -> dict:
+        if not latencies:
+            return {"responses": 0}
+        latencies = sorted(latencies)
+        return {
+            "responses": len(latencies),
+            "median_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 3),
+            "max_ms": round(latencies[-1] * 1000, 3),
+        }
+
+    def compare(self, examples=5) -> dict:
+        """
+        Compare what the replayed host sent with what was captured.
+
+        Returns:
+            {"divergences": n, "connections": {number: {"missing": n, "extra": n}},
+             "examples": [...], "latency": {"captured": {...}, "replay": {...}},
+             "errors": [...]}
+        """
+        _, replayed = read_capture(io.BytesIO(self.output.getvalue()))
+        expected, actual = self._outputs(self.records), self._outputs(replayed)
+        connections, shown = {}, []
+        for number in sorted(set(expected) | set(actual)):
+            want, got = expected.get(number, []), actual.get(number, [])
+            missing = extra = 0
+            matcher = difflib.SequenceMatcher(a=want, b=got, autojunk=False)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == "equal":
+                    continue
+                missing += i2 - i1
+                extra += j2 - j1
+                if len(shown) < examples:
+                    shown.append({"connection": NAMES.get(number, number),
+                                  "captured": want[i1:i2][:2], "replayed": got[j1:j2][:2]})
+            if missing or extra:
+                connections[number] = {"missing": missing, "extra": extra}
+
+        # The replay's inputs, at the times they were played, between its outputs
+        timeline = sorted([(t, IN, 0, b"") for t in self.inputs]
+                          + [record for record in replayed if record[1] == OUT],
+                          key=lambda record: record[0])
+        return {
+            "records": len(self.records),
+            "divergences": sum(c["missing"] + c["extra"] for c in connections.values()),
+            "connections": connections,
+            "examples": shown,
+            "latency": {
+                "captured": self._summary(self._latencies(self.records)),
+                "replay": self._summary(self._latencies(timeline)),
+            },
+            "errors": self.errors,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("capture", help="Capture file from host.app --capture")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help=f"Playback speed, 1 to {MAX_SPEED} (default: as recorded)")
+    args = parser.parse_args()
+    configure_logging(level="ERROR")
+    print(json.dumps(Replay(args.capture, speed=args.speed).run(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+from common.clock import SYSTEM_CLOCK
+from common.comms.protocol import Alarm
+from common.log import get_logger
+
+log = get_logger("HOST SCHEDULER")
+
+
+def next_fire_time(alarm: Alarm, now: datetime) -> datetime:
+    """Next local time the alarm goes off: today if still ahead, else tomorrow"""
+    hour_24, minute = alarm.get_24hr_time()
+    alarm_time = now.replace(hour=hour_24, minute=minute, second=0, microsecond=0)
+    if alarm_time <= now:
+        alarm_time = alarm_time + timedelta(days=1)
+    return alarm_time
+
+
+class AlarmScheduler:
+    """Watches the scheduled alarm and triggers it at the right time"""
+
+    CHECK_INTERVAL = 1  # Seconds between checks
+
+    def __init__(self, alarm_manager, clock=SYSTEM_CLOCK, tracer=None, on_fire=None,
+                 on_prepare=None, prepare_lead=30):
+        """
+        Args:
+            alarm_manager: AlarmManager holding the scheduled alarm
+            clock: Time source (a VirtualClock in simulations)
+            tracer: Optional TraceRecorder; each trigger starts a trace
+            on_fire: Optional callback taking the alarm, called just before
+                     it is triggered
+            on_prepare: Optional callback taking (alarm, fire time as a unix
+                        timestamp), called once per fire, prepare_lead
+                        seconds ahead of it
+            prepare_lead: Seconds before the fire time to call on_prepare
+        """
+        self.alarm_manager = alarm_manager
+        self.clock = clock
+        self.tracer = tracer
+        self.on_fire = on_fire
+        self.on_prepare = on_prepare
+        self.prepare_lead = prepare_lead
+        self.prepared_for = None  # Fire time on_prepare was last called for
+        self.last_logged_time = None  # Track last time we logged the countdown
+
+    def tick(self) -> bool:
+        """
+        Check the alarm once.
+
+        Returns:
+            True if the alarm was triggered
+        """
+        if self.alarm_manager.is_alarm_active():
+            return False  # Skip if an alarm is already active
+
+        alarm = self.alarm_manager.get_current_alarm()
+        if not alarm:
+            self.last_logged_time = None
+            return False  # Skip if no alarm set
+
+        current_time = self.clock.now()
+        alarm_time = next_fire_time(alarm, current_time)
+        time_until_alarm = (alarm_time - current_time).total_seconds()
+        time_diff = (current_time - alarm_time).total_seconds()
+
+        # Log countdown only when first set or when within 60 seconds
+        if self.last_logged_time is None or time_until_alarm < 60:
+            if self.last_logged_time is None:
+                log.info("Alarm set for %s (%s). Time until: %ds",
+                         alarm, alarm_time.strftime('%H:%M:%S'), time_until_alarm)
+            self.last_logged_time = current_time
+
+        if self.on_prepare and time_until_alarm <= self.prepare_lead and self.prepared_for != alarm_time:
+            self.prepared_for = alarm_time
+            self.on_prepare(alarm, alarm_time.timestamp())
+
+        # Check if we're within 1 second of the alarm time
+        if not -1 < time_diff < 1:
+            return False
+        log.warning("TRIGGERING ALARM! (time diff: %.2fs)", time_diff)
+        trace_id = None
+        if self.tracer:
+            trace_id = self.tracer.new_trace_id()
+            self.tracer.record(trace_id, "scheduler.fire", drift=round(time_diff, 3))
+        if self.on_fire:
+            self.on_fire(alarm)
+        self.alarm_manager.trigger_alarm(alarm, trace_id=trace_id)
+        return True
+
+    def run(self, running):
+        """
+        Check every CHECK_INTERVAL seconds while running() is true.
+
+        Args:
+            running: Function returning False once the scheduler should stop
+        """
+        while running():
+            self.clock.sleep(self.CHECK_INTERVAL)
+            self.tick()
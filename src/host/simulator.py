@@ -0,0 +1,215 @@
+"""
+Discrete-event simulator for the alarm scheduler and AlarmManager.
+
+Runs days or weeks of alarms, triggers, snoozes and node churn against the
+real AlarmScheduler and AlarmManager on a VirtualClock, jumping straight from
+one event to the next instead of waiting in real time. Every fire is checked
+against the alarm's wall-clock time, so DST changes can be exercised by
+picking a time zone and a start date near a transition.
+
+Run from src/:  python -m host.simulator --days 28 --nodes 20 --tz Europe/London
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from common.clock import VirtualClock
+from common.comms.protocol import Alarm, EventType
+from common.log import configure_logging
+from host.alarm_manager import AlarmManager
+from host.scheduler import AlarmScheduler, next_fire_time
+
+
+class Simulation:
+    """
+    One simulated mesh: a host with its scheduler and manager, plus nodes.
+
+    Each day the alarm is set, fires, and is snoozed by the host and every
+    connected node after a random delay until the quorum clears it; the
+    next alarm is set a minute later. Nodes drop off and come back at random.
+    """
+
+    def __init__(self, start: datetime, nodes=10, alarm_times=None, churn=0.5,
+                 mean_snooze_delay=30.0, seed=None):
+        """
+        Args:
+            start: Local time the simulation starts at
+            nodes: Number of nodes in the mesh
+            alarm_times: List of (hour_24, minute) tried in turn, one per day
+            churn: Expected disconnects per node per day
+            mean_snooze_delay: Mean seconds before a device snoozes
+            seed: Random seed, for reproducible runs
+        """
+        self.random = random.Random(seed)
+        self.clock = VirtualClock(start.timestamp())
+        self.manager = AlarmManager(event_callback=self._on_event, clock=self.clock)
+        self.scheduler = AlarmScheduler(self.manager, clock=self.clock)
+        self.alarm_times = alarm_times or [(7, 0)]
+        self.churn = churn
+        self.mean_snooze_delay = mean_snooze_delay
+        self.nodes = nodes
+        self.connected = set(range(nodes))
+        self.queue = []  # heap of (time, seq, action, args)
+        self.seq = 0
+        self.day = 0
+        self.triggered_at = None
+        self.snoozed = set()  # Devices that snoozed the ringing alarm, "host" included
+        self.stats = Counter()
+        self.clear_times = []  # Seconds from trigger to clear
+        self.problems = []
+
+    # ------------------------------
+    # Event queue
+    # ------------------------------
+    def at(self, t: float, action, *args):
+        self.seq += 1
+        heapq.heappush(self.queue, (t, self.seq, action, args))
+
+    def after(self, seconds: float, action, *args):
+        self.at(self.clock.time() + seconds, action, *args)
+
+    def run(self, until: float):
+        """Process events in time order up to the given timestamp"""
+        for node in range(self.nodes):
+            self._schedule_churn(node)
+        self.at(self.clock.time(), self._set_alarm)
+        while self.queue and self.queue[0][0] <= until:
+            t, _, action, args = heapq.heappop(self.queue)
+            self.clock.advance_to(t)
+            action(*args)
+            self.stats["sim_events"] += 1
+
+    # ------------------------------
+    # Host side
+    # ------------------------------
+    def _alarm_for_day(self) -> Alarm:
+        hour_24, minute = self.alarm_times[self.day % len(self.alarm_times)]
+        hours = hour_24 % 12 or 12
+        return Alarm(hours=hours, minutes=minute, is_pm=hour_24 >= 12)
+
+    def _set_alarm(self):
+        alarm = self._alarm_for_day()
+        self.day += 1
+        self.manager.set_alarm(alarm)
+        self._schedule_tick(alarm)
+
+    def _schedule_tick(self, alarm: Alarm):
+        # The real scheduler checks every second; checking half a second
+        # before the next fire time gives the same result in one step
+        fire = next_fire_time(alarm, self.clock.now())
+        self.at(fire.timestamp() - 0.5, self._tick, alarm, fire)
+
+    def _tick(self, alarm: Alarm, expected: datetime):
+        if self.manager.get_current_alarm() is not alarm:
+            return  # Superseded
+        self.stats["scheduler_ticks"] += 1
+        if self.scheduler.tick():
+            # The scheduler fires within the second before the alarm time
+            fired = self.clock.now()
+            if not 0 <= (expected - fired).total_seconds() < 1:
+                self.problems.append(f"{alarm} fired at {fired:%Y-%m-%d %H:%M:%S}")
+            return
+        # The wall-clock time never came (e.g. skipped by a DST change)
+        self.problems.append(f"{alarm} missed on {expected:%Y-%m-%d}")
+        self._schedule_tick(alarm)
+
+    def _on_event(self, event):
+        # Called under the manager lock, like the dispatcher would be
+        self.stats[event.type.name] += 1
+        if event.type == EventType.ALARM_TRIGGERED:
+            self.triggered_at = self.clock.time()
+            self.snoozed = set()
+            self.after(self.random.expovariate(1 / self.mean_snooze_delay), self._snooze, "host")
+            for node in self.connected:
+                self._schedule_snooze(node)
+        elif event.type == EventType.ALARM_CLEARED and self.triggered_at is not None:
+            self.clear_times.append(self.clock.time() - self.triggered_at)
+            self.triggered_at = None
+            self.after(60, self._set_alarm)
+
+    # ------------------------------
+    # Nodes
+    # ------------------------------
+    def _schedule_snooze(self, node):
+        self.after(self.random.expovariate(1 / self.mean_snooze_delay), self._snooze, node)
+
+    def _snooze(self, source):
+        if source != "host" and source not in self.connected:
+            return  # Dropped off before pressing
+        if source in self.snoozed:
+            # A node that reconnected while ringing presses again; the host
+            # counts each device once per alarm
+            self.stats["duplicate_snoozes"] += 1
+            return
+        self.snoozed.add(source)
+        self.stats["snoozes"] += 1
+        # Like the host, only devices still connected count towards the quorum
+        counted = sum(1 for device in self.snoozed if device == "host" or device in self.connected)
+        self.manager.handle_snooze(connected_nodes_count=len(self.connected), source=str(source),
+                                   snoozed=counted)
+        if self.manager.is_alarm_active() and self.manager.snooze_count != len(self.snoozed):
+            self.problems.append(f"manager counted {self.manager.snooze_count} snoozes "
+                                 f"from {len(self.snoozed)} devices")
+
+    def _schedule_churn(self, node):
+        if self.churn > 0:
+            self.after(self.random.expovariate(self.churn / 86400), self._toggle, node)
+
+    def _toggle(self, node):
+        if node in self.connected:
+            self.connected.discard(node)
+            self.stats["disconnects"] += 1
+            # Back after a few minutes
+            self.after(self.random.uniform(10, 600), self._toggle, node)
+            return
+        self.connected.add(node)
+        self.stats["reconnects"] += 1
+        if self.manager.is_alarm_active():
+            self._schedule_snooze(node)
+        self._schedule_churn(node)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate days of alarms on a virtual clock")
+    parser.add_argument("--days", type=float, default=28)
+    parser.add_argument("--nodes", type=int, default=10)
+    parser.add_argument("--start", default=None, help="Start date YYYY-MM-DD (default: today)")
+    parser.add_argument("--alarm", action="append", default=None,
+                        help="Alarm time HH:MM (24h); repeat to cycle through several")
+    parser.add_argument("--churn", type=float, default=0.5,
+                        help="Expected disconnects per node per day")
+    parser.add_argument("--tz", default=None, help="Time zone, e.g. Europe/London")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.tz:
+        os.environ["TZ"] = args.tz
+        time.tzset()
+    configure_logging(level=os.environ.get("ALARM_LOG_LEVEL", "ERROR"))
+
+    start = datetime.strptime(args.start, "%Y-%m-%d") if args.start else datetime.now()
+    alarm_times = [tuple(int(x) for x in a.split(":")) for a in args.alarm or ["07:00"]]
+    sim = Simulation(start, nodes=args.nodes, alarm_times=alarm_times,
+                     churn=args.churn, seed=args.seed)
+
+    began = time.perf_counter()
+    sim.run(until=(start + timedelta(days=args.days)).timestamp())
+    elapsed = time.perf_counter() - began
+
+    clears = sorted(sim.clear_times)
+    print(json.dumps({
+        "simulated_days": args.days,
+        "wall_ms": round(elapsed * 1000, 1),
+        "us_per_event": round(elapsed * 1e6 / max(1, sim.stats["sim_events"]), 1),
+        "stats": dict(sim.stats),
+        "median_time_to_clear_s": round(clears[len(clears) // 2], 1) if clears else None,
+        "problems": sim.problems,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import threading
+from common.log import get_logger
+
+log = get_logger("SNOOZE")
+
+
+class SnoozeCoalescer:
+    """
+    Drops duplicate snoozes and batches the rest before they reach AlarmManager.
+
+    A held button or a flapping contact sends SNOOZE_PRESSED over and over.
+    Each device (a node ID plus station) counts once per alarm
+    instance; repeats are dropped here with a dict lookup, as are snoozes
+    while no alarm is ringing, so neither ever takes the manager lock.
+    Accepted snoozes are held for up to `window` seconds and handed over as a
+    single handle_snooze(count=n) call.
+    """
+
+    WINDOW = 0.05  # Seconds accepted snoozes are held to be batched
+
+    def __init__(self, flush, window=WINDOW):
+        """
+        Args:
+            flush: Function taking the number of accepted snoozes to apply
+            window: Seconds to batch accepted snoozes for
+        """
+        self.flush = flush
+        self.window = window
+        self.instance = None   # Alarm instance the seen devices snoozed
+        self.seen = set()      # Devices that snoozed it
+        self.relayed = {}      # {relay node ID: snoozes it summarized for it}
+        self.pending = 0       # Accepted snoozes not yet flushed
+        self.timer = None
+        self.accepted = 0
+        self.duplicates = 0    # Same device again for the same alarm
+        self.inactive = 0      # No alarm ringing
+        self.flushes = 0
+        self.lock = threading.Lock()
+
+    def submit(self, key, instance, count=1, source=None) -> bool:
+        """
+        Offer a snooze.
+
+        Args:
+            key: Identifies the device, e.g. (node_id, station); None skips
+                 deduplication (relay summaries count distinct devices)
+            instance: Identifies the ringing alarm, or None if none is ringing
+            count: Number of snoozes represented
+            source: Node ID of the relay a summary (key None) came from,
+                    so its snoozes stop counting if the relay drops out
+
+        Returns:
+            True if the snooze was accepted
+        """
+        with self.lock:
+            if instance is None:
+                self.inactive += 1
+                return False
+            if instance != self.instance:
+                self.instance = instance
+                self.seen.clear()
+                self.relayed.clear()
+            if key is not None:
+                if key in self.seen:
+                    self.duplicates += 1
+                    return False
+                self.seen.add(key)
+            elif source is not None:
+                self.relayed[source] = self.relayed.get(source, 0) + count
+            self.accepted += count
+            self.pending += count
+            if self.timer is None:
+                self.timer = threading.Timer(self.window, self._flush)
+                self.timer.daemon = True
+                self.timer.start()
+        return True
+
+    def _flush(self):
+        with self.lock:
+            count, self.pending = self.pending, 0
+            self.timer = None
+            if not count:
+                return  # Already drained
+            self.flushes += 1
+        try:
+            self.flush(count)
+        except Exception as e:
+            log.error("Failed to apply %d snooze(s): %s", count, e)
+
+    def counted(self, instance, live):
+        """
+        Snoozes of an alarm instance from devices that still count.
+
+        Args:
+            instance: The ringing alarm instance
+            live: Function taking a node ID (the first item of a tuple key,
+                  or the key itself, e.g. "host") and returning whether its
+                  snoozes still count
+
+        Returns:
+            The number of snoozes, or None if no snooze of the instance
+            passed through here (e.g. they reached the host before it took over)
+        """
+        with self.lock:
+            if instance is None or instance != self.instance:
+                return None
+            devices = sum(1 for key in self.seen if live(key[0] if isinstance(key, tuple) else key))
+            return devices + sum(count for source, count in self.relayed.items() if live(source))
+
+    def drain(self):
+        """Apply accepted snoozes now instead of at the end of the window"""
+        with self.lock:
+            timer = self.timer
+        if timer is not None:
+            timer.cancel()
+        self._flush()
+
+    def export(self) -> dict:
+        """Which devices snoozed the current alarm, for a host taking over"""
+        with self.lock:
+            return {"instance": self.instance, "seen": list(self.seen),
+                    "relayed": list(self.relayed.items())}
+
+    def load(self, state: dict):
+        with self.lock:
+            self.instance = _tuples(state["instance"])
+            self.seen = {_tuples(key) for key in state["seen"]}
+            self.relayed = {_tuples(source): count for source, count in state.get("relayed", ())}
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "accepted": self.accepted,
+                "suppressed_duplicate": self.duplicates,
+                "suppressed_inactive": self.inactive,
+                "flushes": self.flushes,
+            }
+
+
+def _tuples(value):
+    """Undo JSON turning tuples into lists"""
+    if isinstance(value, list):
+        return tuple(_tuples(item) for item in value)
+    return value
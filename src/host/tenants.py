@@ -0,0 +1,94 @@
+import re
+import threading
+from common.comms.protocol import DEFAULT_TENANT
+from common.log import get_logger
+
+log = get_logger("TENANTS")
+
+
+class Tenant:
+    """One alarm mesh served by the host: its alarm state, snoozes and schedule"""
+
+    __slots__ = ("name", "manager", "snoozes", "scheduler", "prepare")
+
+    def __init__(self, name, manager, snoozes, scheduler):
+        self.name = name
+        self.manager = manager      # AlarmManager(tenant=name)
+        self.snoozes = snoozes      # SnoozeCoalescer feeding manager
+        self.scheduler = scheduler  # AlarmScheduler for manager
+        self.prepare = None         # ALARM_PREPARE of the coming fire, for nodes that reconnect
+
+    def export(self) -> dict:
+        return {"alarm": self.manager.get_state(), "snoozes": self.snoozes.export()}
+
+
+class TenantRegistry:
+    """
+    The tenants a host serves, created on first use.
+
+    Readers get the current dict without locking; creating a tenant copies
+    it, as ConnectionRegistry does, since tenants are added rarely and
+    looked up on every frame.
+    """
+
+    NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+    def __init__(self, make_tenant, max_tenants=64):
+        """
+        Args:
+            make_tenant: Function taking a name and an optional exported
+                         state (Tenant.export()) and returning a new Tenant
+            max_tenants: Tenants beyond this many are refused
+        """
+        self.make_tenant = make_tenant
+        self.max_tenants = max_tenants
+        self.tenants = {}
+        self.lock = threading.Lock()  # Serializes creation only
+
+    def __iter__(self):
+        return iter(list(self.tenants.values()))
+
+    def __len__(self):
+        return len(self.tenants)
+
+    def get(self, name) -> Tenant:
+        """The tenant, or None if it doesn't exist"""
+        return self.tenants.get(name)
+
+    def get_or_create(self, name, state=None) -> Tenant:
+        """
+        Args:
+            name: Tenant name; letters, digits, '-' and '_'
+            state: Exported state to start a new tenant from
+
+        Returns:
+            The tenant, or None if the name is invalid or the host is full
+        """
+        tenant = self.tenants.get(name)
+        if tenant is not None:
+            return tenant
+        if not isinstance(name, str) or not self.NAME.fullmatch(name):
+            return None
+        with self.lock:
+            tenant = self.tenants.get(name)
+            if tenant is not None:
+                return tenant
+            if len(self.tenants) >= self.max_tenants:
+                log.warning("Refusing tenant %s: already serving %d", name, self.max_tenants)
+                return None
+            tenant = self.make_tenant(name, state)
+            self.tenants = {**self.tenants, name: tenant}
+        log.info("Serving tenant %s", name)
+        return tenant
+
+    def default(self) -> Tenant:
+        return self.get_or_create(DEFAULT_TENANT)
+
+    def export(self) -> dict:
+        """States of every tenant but the default, for a handoff"""
+        return {tenant.name: tenant.export() for tenant in self if tenant.name != DEFAULT_TENANT}
+
+    def load(self, states: dict):
+        """Recreate tenants exported by another host process"""
+        for name, state in states.items():
+            self.get_or_create(name, state)
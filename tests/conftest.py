@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules are imported the way the apps run them, from src/
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
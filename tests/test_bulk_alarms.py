@@ -0,0 +1,28 @@
+from common.comms.protocol import Alarm, EventType
+from host.alarm_manager import AlarmManager
+
+
+def test_batch_emits_one_event_at_one_version():
+    events = []
+    manager = AlarmManager(event_callback=events.append)
+    manager.set_alarm(Alarm.from_24hr(6, 0, zone="hall"))
+    version = manager.version
+    events.clear()
+
+    result = manager.apply_batch([("remove", None), ("set", Alarm.from_24hr(7, 30, zone="kitchen"))])
+
+    node_events = [event for event in events if event.type != EventType.STATE_SYNC]
+    assert [event.type for event in node_events] == [EventType.ALARM_SET]
+    assert node_events[0].data["zone"] == "kitchen"
+    assert result["version"] == manager.version == version + 1
+
+
+def test_batch_back_to_start_emits_nothing():
+    events = []
+    manager = AlarmManager(event_callback=events.append)
+    alarm = Alarm.from_24hr(6, 0)
+    manager.set_alarm(alarm)
+    events.clear()
+
+    assert not manager.apply_batch([("remove", None), ("set", alarm)])["changed"]
+    assert events == []
@@ -0,0 +1,82 @@
+import json
+from common.comms.protocol import Alarm, EventType
+from host.alarm_manager import AlarmManager
+from host.snooze_filter import SnoozeCoalescer
+
+
+def replicated_trigger():
+    """The STATE_SYNC an active host replicates when its alarm fires"""
+    syncs = []
+    active = AlarmManager(event_callback=lambda event: event.type == EventType.STATE_SYNC
+                          and syncs.append(event))
+    active.set_alarm(Alarm.from_24hr(7, 30))
+    active.trigger_alarm(active.get_current_alarm())
+    return active, syncs[-1]
+
+
+def test_trigger_sync_names_the_ringing_alarm():
+    active, sync = replicated_trigger()
+    assert sync.data["alarm_active"]
+    assert sync.data["trigger_version"] == sync.data["version"]
+    assert active.alarm_instance() == (sync.data["epoch"], sync.data["trigger_version"])
+
+
+def test_promoted_standby_clears_at_quorum():
+    _, sync = replicated_trigger()
+    standby = AlarmManager(event_callback=lambda event: None)
+    assert standby.load_state(sync.data)
+    assert standby.is_alarm_active()
+    assert standby.alarm_instance() is not None
+
+    # Two nodes and the standby's own button make the quorum
+    snoozes = SnoozeCoalescer(flush=lambda count: standby.handle_snooze(2, count=count))
+    for key in [("node-a", "kitchen"), ("node-b", "hall"), "host"]:
+        assert snoozes.submit(key, standby.alarm_instance())
+    snoozes.drain()
+
+    assert not standby.is_alarm_active()
+
+
+def test_promoted_standby_keeps_snooze_progress():
+    syncs = []
+    active = AlarmManager(event_callback=lambda event: event.type == EventType.STATE_SYNC
+                          and syncs.append(event))
+    active.set_alarm(Alarm.from_24hr(7, 30))
+    active.trigger_alarm(active.get_current_alarm())
+    live = {"host", "node-a", "node-b"}.__contains__
+    active_snoozes = SnoozeCoalescer(flush=lambda count: active.handle_snooze(
+        2, count=count, snoozed=active_snoozes.counted(active.alarm_instance(), live)))
+    assert active_snoozes.submit(("node-a", "kitchen"), active.alarm_instance())
+    active_snoozes.drain()
+    # What the active host replicates after the snooze, as it arrives
+    state = json.loads(json.dumps(dict(syncs[-1].data, snoozes=active_snoozes.export())))
+
+    standby = AlarmManager(event_callback=lambda event: None)
+    standby_snoozes = SnoozeCoalescer(flush=lambda count: standby.handle_snooze(
+        2, count=count, snoozed=standby_snoozes.counted(standby.alarm_instance(), live)))
+    assert standby.load_state(state)
+    standby_snoozes.load(state["snoozes"])
+
+    # node-a pressing again after the failover is still a repeat
+    assert not standby_snoozes.submit(("node-a", "kitchen"), standby.alarm_instance())
+    assert standby_snoozes.counted(standby.alarm_instance(), live) == 1
+    for key in [("node-b", "hall"), "host"]:
+        assert standby_snoozes.submit(key, standby.alarm_instance())
+    standby_snoozes.drain()
+
+    assert not standby.is_alarm_active()
+
+
+def test_standby_without_snooze_records_counts_replicated_snoozes():
+    active, _ = replicated_trigger()
+    active.handle_snooze(1)
+    standby = AlarmManager(event_callback=lambda event: None)
+    assert standby.load_state(active.get_state())
+    snoozes = SnoozeCoalescer(flush=lambda count: None)
+
+    snoozed = snoozes.counted(standby.alarm_instance(), lambda node_id: True)
+    assert snoozed is None
+    # One node left, so the snooze already replicated plus the host's make the quorum
+    assert not standby.check_quorum(1, snoozed)
+    standby.handle_snooze(1, snoozed=snoozed)
+    assert not standby.is_alarm_active()